@@ -0,0 +1,115 @@
+#############################################################################
+# checkpoint.py
+#----------------------------------------------------------------------------
+# Keeps the save files used to recover a game after a crash.
+#############################################################################
+
+import os, re, logging
+
+#----------------------------------------------------------------------------
+
+#Directory holding a sub-directory of checkpoints for each game
+CHECKPOINT_DIR = "checkpoints"
+
+#How many of the most recent checkpoints are kept
+CHECKPOINTS_KEPT = 2
+
+#Checkpoint files are numbered so the latest can be found from the name
+CHECKPOINT_NAME = "checkpoint-%08d.qzl"
+
+CHECKPOINT_REGEX = re.compile ( r"checkpoint-(\d+)\.qzl$" )
+
+#----------------------------------------------------------------------------
+
+class CheckpointStore:
+    """
+    A directory of numbered Quetzal save files written by dfrotz.
+
+    A new file is used for every save so dfrotz never asks whether to
+    overwrite a file and a crash part way through a save cannot damage
+    the previous checkpoint.
+    """
+
+    def __init__ ( self, directory, keep = CHECKPOINTS_KEPT ):
+
+        assert keep > 0
+
+        #dfrotz may not share the bot's working directory
+        self.directory = os.path.abspath ( directory )
+
+        self.keep = keep
+
+        os.makedirs ( self.directory, exist_ok = True )
+
+    #------------------------------------------------------------------------
+
+    def _numbered ( self ):
+        """
+        Returns ( number, path ) for each checkpoint in ascending order.
+        """
+
+        found = []
+
+        for name in os.listdir ( self.directory ):
+
+            match = CHECKPOINT_REGEX.match ( name )
+
+            if match:
+
+                found.append ( ( int ( match.group ( 1 ) ),
+                                 os.path.join ( self.directory, name ) ) )
+
+        return sorted ( found )
+
+    #------------------------------------------------------------------------
+
+    def latest ( self ):
+        """
+        Returns the path of the most recent checkpoint or None if there
+        are no checkpoints.
+        """
+
+        numbered = self._numbered ()
+
+        if len ( numbered ) == 0:
+
+            return None
+
+        return numbered [ -1 ] [ 1 ]
+
+    #------------------------------------------------------------------------
+
+    def new_path ( self ):
+        """
+        Returns the path the next checkpoint should be saved to.
+        """
+
+        numbered = self._numbered ()
+
+        number = numbered [ -1 ] [ 0 ] + 1 if len ( numbered ) > 0 else 0
+
+        return os.path.join ( self.directory, CHECKPOINT_NAME % number )
+
+    #------------------------------------------------------------------------
+
+    def prune ( self ):
+        """
+        Deletes all but the most recent checkpoints.
+        """
+
+        for number, path in self._numbered () [ : -self.keep ]:
+
+            os.remove ( path )
+
+    #------------------------------------------------------------------------
+
+    def clear ( self ):
+        """
+        Deletes every checkpoint e.g. when a game ends normally.
+        """
+
+        for number, path in self._numbered ():
+
+            os.remove ( path )
+
+        logging.info ( "Cleared checkpoints in %s", self.directory )
@@ -0,0 +1,40 @@
+#############################################################################
+# checkpoint_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the checkpoint store.
+#############################################################################
+
+import os
+
+from checkpoint import *
+
+def test_checkpoint_store ( tmp_path ):
+
+    store = CheckpointStore ( str ( tmp_path ), keep = 2 )
+
+    assert ( store.latest () == None )
+
+    paths = []
+
+    for i in range ( 3 ):
+
+        path = store.new_path ()
+
+        open ( path, "w" ).close ()
+
+        paths.append ( path )
+
+        assert ( store.latest () == path )
+
+    store.prune ()
+
+    assert ( not os.path.exists ( paths [ 0 ] ) )
+    assert ( os.path.exists ( paths [ 1 ] ) )
+    assert ( store.latest () == paths [ 2 ] )
+
+    #numbering carries on after pruning
+    assert ( store.new_path () > paths [ 2 ] )
+
+    store.clear ()
+
+    assert ( store.latest () == None )
@@ -0,0 +1,130 @@
+# cmd_parser_bench.py
+#
+# Benchmark for parsing commands out of mention text.
+#
+# Compares tab.cmd_from_text with the line by line parser it replaced and
+# checks that both give the same commands.
+#
+# Usage: python3 cmd_parser_bench.py [mentions]
+
+import sys, time, random, logging, re
+
+import urlmarker
+
+import tab
+
+#Kinds of mention text seen by the bot
+TEXTS = [ "@tweetintfict cmd go north",
+          "@tweetintfict cmd take lamp\nthanks!",
+          "@tweetintfict this game is great",
+          "@tweetintfict @friend look at this",
+          "hey @tweetintfict\n\n  cmd  open   the DOOR \nlol #advent",
+          "@tweetintfict cmd read http://example.com",
+          "@tweetintfict cmd quit",
+          "@tweetintfict what do I do? see www.example.com",
+          "@tweetintfict CMD xyzzy!!" ]
+
+#----------------------------------------------------------------------------
+
+def legacy_cmd_from_text ( text, bannedCmds ):
+    """
+    The parser that cmd_from_text replaced.
+    """
+
+    logging.info ( "cmd_from_text:\n"+text )
+    
+    if len ( text ) < 5:
+        return None
+
+    cmd = None
+
+    for line in text.split ( "\n" ):
+
+        line = line.strip ()
+
+        if len( line ) > 0 and line [ 0 ] == "@":
+
+            line = line.split ( " ", 1 ) [ 1 ].strip ()
+
+        line = line.lower ()
+
+        if len ( line ) > 4 and line [ : 4 ] == "cmd ":
+
+            cmd = line [ 4 : ]
+
+            if len ( re.findall ( urlmarker.ANY_URL_REGEX, cmd ) ) > 0:
+
+                return None
+            
+            cmd = cmd.strip ()
+
+            allowed_chars = [ x for x in cmd if tab.char_allowed_in_cmd ( x ) ]
+
+            cmd = "".join ( allowed_chars )
+
+            firstWord = cmd.split ( " " ) [ 0 ]
+
+            for banned in bannedCmds:
+
+                if firstWord == banned:
+
+                    return None
+
+            break
+
+    return cmd 
+
+#----------------------------------------------------------------------------
+
+def make_mentions ( n ):
+
+    random.seed ( n )
+
+    return [ random.choice ( TEXTS ) for i in range ( n ) ]
+
+#----------------------------------------------------------------------------
+
+def bench ( parse, mentions, bannedCmds ):
+    """
+    Returns ( seconds, commands found ) for parsing the mentions.
+    """
+
+    start = time.perf_counter ()
+
+    found = sum ( 1 for text in mentions 
+                  if parse ( text, bannedCmds ) != None )
+
+    return time.perf_counter () - start, found
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    n = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else 1000000
+
+    #log at the bot's level but throw the messages away so the cost of
+    #the log calls is measured without the cost of printing them
+    logging.basicConfig ( level = logging.INFO, 
+                          handlers = [ logging.NullHandler () ] )
+
+    for text in TEXTS:
+
+        assert tab.cmd_from_text ( text, { "quit" } ) == \
+               legacy_cmd_from_text ( text, [ "quit" ] ), text
+
+    mentions = make_mentions ( n )
+
+    print ( "%10s %10s %10s %14s" % 
+            ( "parser", "commands", "s", "mentions/s" ) )
+
+    for name, parse, bannedCmds in \
+            [ ( "legacy", legacy_cmd_from_text, [ "quit" ] ),
+              ( "compiled", tab.cmd_from_text, { "quit" } ) ]:
+
+        elapsed, found = bench ( parse, mentions, bannedCmds )
+
+        print ( "%10s %10d %10.2f %14.0f" % 
+                ( name, found, elapsed, n / elapsed ) )
+
+if __name__ == "__main__":
+    sys.exit ( main () )
@@ -0,0 +1,299 @@
+#############################################################################
+# command_filter.py
+#----------------------------------------------------------------------------
+# Decides which commands from players are banned.  The banned commands
+# are loaded from a text file that can be edited while the bot runs.
+#############################################################################
+
+import os, time, logging, threading
+
+#----------------------------------------------------------------------------
+
+#Location of the banned commands file.  The file ships next to this module
+#so it is found whatever directory the bot is started from.
+BANNED_CMDS_PATH = os.path.join ( os.path.dirname ( 
+                                        os.path.abspath ( __file__ ) ),
+                                  "banned_cmds.txt" )
+
+#Entries used when the file can not be read
+DEFAULT_BANNED_CMDS = [ "^quit" ]
+
+#How often the file is checked for changes in seconds
+RELOAD_CHECK_INTERVAL = 5
+
+#----------------------------------------------------------------------------
+
+class CommandMatcher:
+    """
+    Matches commands against a list of banned words and phrases.
+
+    Commands and entries are compared word by word.  Each entry is either:
+
+    anchored - banned when the command starts with it e.g. '^quit' bans
+               'quit' and 'quit now' but not 'do not quit'
+
+    anywhere - banned when it appears anywhere in the command
+
+    Anchored entries are looked up in a set for each length of entry and
+    the other entries are found with an Aho-Corasick automaton built over
+    words.  The time taken to check a command depends on the length of
+    the command not the number of entries.
+    """
+
+    def __init__ ( self, anchored = (), anywhere = () ):
+
+        #word tuples of the anchored entries
+        self._anchored = set ()
+
+        for entry in anchored:
+
+            words = tuple ( entry.split () )
+
+            if len ( words ) > 0:
+
+                self._anchored.add ( words )
+
+        #lengths of the anchored entries - longest first
+        self._anchoredLengths = sorted (
+                set ( len ( words ) for words in self._anchored ),
+                reverse = True )
+
+        self._build_automaton ( anywhere )
+
+    #------------------------------------------------------------------------
+
+    @classmethod
+    def from_lines ( cls, lines ):
+        """
+        Creates a matcher from the lines of a banned commands file.
+
+        Blank lines and lines starting with '#' are skipped.  Lines
+        starting with '^' are anchored entries.  Entries are compared in
+        lower case.
+        """
+
+        anchored = []
+        anywhere = []
+
+        for line in lines:
+
+            line = line.strip ().lower ()
+
+            if line == "" or line [ 0 ] == "#":
+
+                continue
+
+            if line [ 0 ] == "^":
+
+                anchored.append ( line [ 1 : ] )
+
+            else:
+
+                anywhere.append ( line )
+
+        return cls ( anchored, anywhere )
+
+    #------------------------------------------------------------------------
+
+    def _build_automaton ( self, entries ):
+        """
+        Builds the word level automaton.  Node 0 is the root.
+        """
+
+        #node -> dict of word -> next node
+        self._goto = [ {} ]
+
+        #node -> node of the longest proper suffix in the automaton
+        self._fail = [ 0 ]
+
+        #node -> True if an entry ends at the node or at one of its
+        #suffixes
+        self._match = [ False ]
+
+        for entry in entries:
+
+            words = entry.split ()
+
+            if len ( words ) == 0:
+
+                continue
+
+            node = 0
+
+            for word in words:
+
+                nextNode = self._goto [ node ].get ( word )
+
+                if nextNode == None:
+
+                    nextNode = len ( self._goto )
+
+                    self._goto.append ( {} )
+                    self._fail.append ( 0 )
+                    self._match.append ( False )
+
+                    self._goto [ node ] [ word ] = nextNode
+
+                node = nextNode
+
+            self._match [ node ] = True
+
+        #set the fail links breadth first so a node's suffix is done
+        #before the node
+
+        queue = list ( self._goto [ 0 ].values () )
+
+        for node in queue:
+
+            for word, child in self._goto [ node ].items ():
+
+                fail = self._fail [ node ]
+
+                while fail != 0 and word not in self._goto [ fail ]:
+
+                    fail = self._fail [ fail ]
+
+                self._fail [ child ] = self._goto [ fail ].get ( word, 0 )
+
+                if self._match [ self._fail [ child ] ]:
+
+                    self._match [ child ] = True
+
+                queue.append ( child )
+
+    #------------------------------------------------------------------------
+
+    def banned ( self, cmd ):
+        """
+        Returns True if the command matches a banned entry.
+        """
+
+        words = cmd.split ()
+
+        for length in self._anchoredLengths:
+
+            if tuple ( words [ : length ] ) in self._anchored:
+
+                return True
+
+        goto = self._goto
+        fail = self._fail
+        match = self._match
+
+        node = 0
+
+        for word in words:
+
+            while node != 0 and word not in goto [ node ]:
+
+                node = fail [ node ]
+
+            node = goto [ node ].get ( word, 0 )
+
+            if match [ node ]:
+
+                return True
+
+        return False
+
+#----------------------------------------------------------------------------
+
+class BannedCommands:
+    """
+    Banned commands loaded from a file.  The file is loaded again when it
+    changes so entries can be added without restarting the bot.  If the
+    file can not be read the last entries loaded are kept.
+
+    See CommandMatcher.from_lines for the format of the file.
+    """
+
+    def __init__ ( self, path = BANNED_CMDS_PATH,
+                   checkInterval = RELOAD_CHECK_INTERVAL,
+                   clock = time.monotonic ):
+
+        self.path = path
+        self.checkInterval = checkInterval
+
+        self._clock = clock
+
+        self._lock = threading.Lock ()
+
+        self._mtime = None
+
+        self._lastCheck = None
+
+        self.matcher = CommandMatcher.from_lines ( DEFAULT_BANNED_CMDS )
+
+        self._reload ()
+
+    #------------------------------------------------------------------------
+
+    def _reload ( self ):
+        """
+        Loads the file if it has changed since it was last loaded.
+        """
+
+        self._lastCheck = self._clock ()
+
+        try:
+
+            mtime = os.stat ( self.path ).st_mtime_ns
+
+            if mtime == self._mtime:
+
+                return
+
+            with open ( self.path ) as bannedFile:
+
+                matcher = CommandMatcher.from_lines ( bannedFile )
+
+        except OSError:
+
+            if self._mtime != -1:
+
+                logging.warning ( "Could not load banned commands: %s",
+                                  self.path, exc_info = True )
+
+            #only warn once until the file can be read again
+            self._mtime = -1
+
+            return
+
+        logging.info ( "Loaded banned commands: %s", self.path )
+
+        self.matcher = matcher
+
+        self._mtime = mtime
+
+    #------------------------------------------------------------------------
+
+    def banned ( self, cmd ):
+        """
+        Returns True if the command is banned.
+        """
+
+        with self._lock:
+
+            if self._clock () - self._lastCheck >= self.checkInterval:
+
+                self._reload ()
+
+            matcher = self.matcher
+
+        return matcher.banned ( cmd )
+
+#----------------------------------------------------------------------------
+
+def cmd_is_banned ( cmd, bannedCmds ):
+    """
+    Returns True if a command is banned.
+
+    bannedCmds - a BannedCommands or CommandMatcher.  Any other container
+                 of words bans commands whose first word it holds.
+    """
+
+    if isinstance ( bannedCmds, ( BannedCommands, CommandMatcher ) ):
+
+        return bannedCmds.banned ( cmd )
+
+    return cmd.split ( " ", 1 ) [ 0 ] in bannedCmds
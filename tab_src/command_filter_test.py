@@ -0,0 +1,121 @@
+#############################################################################
+# command_filter_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the banned command matcher.
+#############################################################################
+
+import os
+
+from command_filter import *
+
+def test_command_matcher ():
+
+    matcher = CommandMatcher.from_lines ( [ "# comment",
+                                            "",
+                                            "^quit",
+                                            "^ go   home ",
+                                            "Bad Word",
+                                            "a b c",
+                                            "b d",
+                                            "rude" ] )
+
+    testCases = \
+    [
+        { "cmd" : "quit",                "out" : True  },
+        { "cmd" : "quit now",            "out" : True  },
+        { "cmd" : "do not quit",         "out" : False },
+        { "cmd" : "quite",               "out" : False },
+        { "cmd" : "go home",             "out" : True  },
+        { "cmd" : "go  home now",        "out" : True  },
+        { "cmd" : "go north",            "out" : False },
+        { "cmd" : "say bad word",        "out" : True  },
+        { "cmd" : "say bad",             "out" : False },
+        { "cmd" : "a b d",               "out" : True  },
+        { "cmd" : "a b c",               "out" : True  },
+        { "cmd" : "a b",                 "out" : False },
+        { "cmd" : "x a b x c",           "out" : False },
+        { "cmd" : "you are rude",        "out" : True  },
+        { "cmd" : "rudeness",            "out" : False },
+        { "cmd" : "",                    "out" : False }
+    ]
+
+    for tc in testCases:
+
+        assert ( matcher.banned ( tc [ "cmd" ] ) == tc [ "out" ] ), tc
+
+#----------------------------------------------------------------------------
+
+def test_cmd_is_banned ():
+
+    #containers of words ban by the first word
+
+    assert ( cmd_is_banned ( "quit now", [ "quit" ] ) )
+    assert ( not cmd_is_banned ( "do not quit", { "quit" } ) )
+
+    matcher = CommandMatcher ( anywhere = [ "quit" ] )
+
+    assert ( cmd_is_banned ( "do not quit", matcher ) )
+
+#----------------------------------------------------------------------------
+
+def test_banned_commands_reload ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "banned_cmds.txt" )
+
+    now = [ 0 ]
+
+    banned = BannedCommands ( path, 5, clock = lambda: now [ 0 ] )
+
+    #the defaults are used until the file exists
+    assert ( banned.banned ( "quit" ) )
+    assert ( not banned.banned ( "xyzzy" ) )
+
+    with open ( path, "w" ) as f:
+
+        f.write ( "^xyzzy\n" )
+
+    #changes are seen after the check interval
+    assert ( not banned.banned ( "xyzzy" ) )
+
+    now [ 0 ] = 5
+
+    assert ( banned.banned ( "xyzzy" ) )
+    assert ( not banned.banned ( "quit" ) )
+
+    with open ( path, "w" ) as f:
+
+        f.write ( "plugh\n" )
+
+    os.utime ( path, ns = ( 1, 1 ) )
+
+    now [ 0 ] = 10
+
+    assert ( banned.banned ( "say plugh" ) )
+    assert ( not banned.banned ( "xyzzy" ) )
+
+    #the last entries are kept if the file goes away
+    os.remove ( path )
+
+    now [ 0 ] = 15
+
+    assert ( banned.banned ( "say plugh" ) )
+
+#----------------------------------------------------------------------------
+
+def test_shipped_banned_cmds ():
+
+    bannedCmds = BannedCommands ()
+
+    assert ( os.path.isabs ( bannedCmds.path ) )
+
+    testCases = \
+    [
+        { "cmd" : "quit",                "out" : True  },
+        { "cmd" : "look then quit",      "out" : True  },
+        { "cmd" : "go north then look",  "out" : False },
+        { "cmd" : "do not quit",         "out" : False }
+    ]
+
+    for tc in testCases:
+
+        assert ( bannedCmds.banned ( tc [ "cmd" ] ) == tc [ "out" ] ), tc
@@ -0,0 +1,216 @@
+#############################################################################
+# command_votes.py
+#----------------------------------------------------------------------------
+# Counts the commands players send so the most popular one is played.
+#############################################################################
+
+import time, logging
+
+#----------------------------------------------------------------------------
+
+#How long votes are collected for after the first vote of a window
+VOTE_WINDOW = 60
+
+#The most distinct commands counted in a window.  When more commands are
+#sent the least popular is forgotten.
+MAX_TRACKED_COMMANDS = 64
+
+#The most players remembered in a window.  Votes from further players are
+#ignored until the window closes.
+MAX_VOTERS = 10000
+
+#----------------------------------------------------------------------------
+
+def normalize_cmd ( cmd ):
+    """
+    Returns the form of a command used for counting votes so that e.g.
+    'go  north' and 'go north' are counted together.
+    """
+
+    return " ".join ( cmd.lower ().split () )
+
+#----------------------------------------------------------------------------
+
+class CommandTally:
+    """
+    Counts votes for commands over a window of time.
+
+    Each player gets one vote per window - later votes from the same
+    player are ignored.  The command with the most votes wins and a tie
+    goes to the command that was voted for first.  Votes are ordered by
+    the ID of the tweet that held them and then by the order they were
+    added.  Votes without a tweet ID are ordered before those with one.
+
+    The counts use the 'space saving' method so memory stays fixed no
+    matter how many different commands are sent.  When a new command
+    arrives and the table is full a command is replaced and the new
+    command takes over its count as an error.  The winner is picked by
+    count minus error - the votes the command is certain to have had.
+
+    Unlike the usual method the command replaced is the one with the
+    fewest certain votes, not the smallest count including error.  In a
+    flood of one-off commands each newcomer inherits a larger error, so
+    ranking by count would soon replace a command with many real votes.
+    Ranking by certain votes keeps popular commands and only forgets
+    those that may have had a few uncounted votes.
+    """
+
+    def __init__ ( self, window = VOTE_WINDOW,
+                   maxCommands = MAX_TRACKED_COMMANDS,
+                   maxVoters = MAX_VOTERS, clock = time.monotonic ):
+
+        assert maxCommands > 0
+
+        self.window = window
+        self.maxCommands = maxCommands
+        self.maxVoters = maxVoters
+
+        self._clock = clock
+
+        self._reset ()
+
+    #------------------------------------------------------------------------
+
+    def _reset ( self ):
+
+        #normalized command -> 
+        #   [ certain votes, order of first vote, error, cmd, username,
+        #     trace ] where username and trace are from the first vote and
+        #   the order is ( tweet ID or 0, order added )
+        self._counts = {}
+
+        self._voters = set ()
+
+        self._order = 0
+
+        #time of the first vote in the window
+        self._opened = None
+
+    #------------------------------------------------------------------------
+
+    def add ( self, username, cmd, trace = None, statusID = None ):
+        """
+        Records a player's vote for a command.  Returns True if the vote
+        was counted.
+
+        trace    - optional tracing.SpanContext of the mention holding the
+                   vote.  The winner carries the trace of its first vote.
+
+        statusID - optional ID of the tweet holding the vote.  Tweet IDs
+                   increase over time so a lower ID is an earlier vote
+                   whatever order the mentions were fetched in.
+        """
+
+        if username in self._voters:
+
+            return False
+
+        if len ( self._voters ) >= self.maxVoters:
+
+            logging.warning ( "Too many voters - ignored vote from %s",
+                              username )
+
+            return False
+
+        self._voters.add ( username )
+
+        if self._opened == None:
+
+            self._opened = self._clock ()
+
+        self._order += 1
+
+        order = ( statusID or 0, self._order )
+
+        key = normalize_cmd ( cmd )
+
+        entry = self._counts.get ( key )
+
+        if entry != None:
+
+            entry [ 0 ] += 1
+
+            if order < entry [ 1 ]:
+
+                entry [ 1 ] = order
+                entry [ 4 ] = username
+                entry [ 5 ] = trace
+
+            return True
+
+        #votes the command may have had before it was last forgotten
+        error = 0
+
+        if len ( self._counts ) >= self.maxCommands:
+
+            evicted = self._counts.pop ( min ( self._counts, 
+                                               key = self._rank ) )
+
+            error = evicted [ 0 ] + evicted [ 2 ]
+
+        self._counts [ key ] = [ 1, order, error, key, username, trace ]
+
+        return True
+
+    #------------------------------------------------------------------------
+
+    def _rank ( self, key ):
+        """
+        Sort key that puts the winning command last.  Commands with the
+        same number of certain votes are ordered by their first vote so
+        the earliest wins and the latest is forgotten first.
+        """
+
+        votes, ( statusID, added ) = self._counts [ key ] [ : 2 ]
+
+        return ( votes, -statusID, -added )
+
+    #------------------------------------------------------------------------
+
+    def ready ( self ):
+        """
+        Returns True if the window has votes and has been open for long
+        enough to pick a winner.
+        """
+
+        return self._opened != None and \
+               self._clock () - self._opened >= self.window
+
+    #------------------------------------------------------------------------
+
+    def winner ( self ):
+        """
+        Returns the winning command as a dict of the form
+        { "cmd" : ..., "username" : ..., "votes" : ... } where username is
+        the first player who sent it.  Returns None if there are no votes.
+
+        If the first vote had a trace it is given as "trace".
+        """
+
+        if len ( self._counts ) == 0:
+
+            return None
+
+        votes, order, error, cmd, username, trace = \
+                self._counts [ max ( self._counts, key = self._rank ) ]
+
+        winner = { "cmd" : cmd, "username" : username, "votes" : votes }
+
+        if trace != None:
+
+            winner [ "trace" ] = trace
+
+        return winner
+
+    #------------------------------------------------------------------------
+
+    def close ( self ):
+        """
+        Returns the winner and starts a new window.
+        """
+
+        result = self.winner ()
+
+        self._reset ()
+
+        return result
@@ -0,0 +1,152 @@
+#############################################################################
+# command_votes_test.py
+#----------------------------------------------------------------------------
+# Unit tests for counting command votes.
+#############################################################################
+
+from command_votes import *
+
+def test_tally_winner ():
+
+    testCases = \
+    [
+        {
+            "votes" : [],
+            "out"   : None
+        },
+
+        {
+            "votes" : [ ( "a", "go north" ) ],
+            "out"   : { "cmd" : "go north", "username" : "a", "votes" : 1 }
+        },
+
+        {
+            "votes" : [ ( "a", "look" ), ( "b", "go  north" ), 
+                        ( "c", "go north" ) ],
+            "out"   : { "cmd" : "go north", "username" : "b", "votes" : 2 }
+        },
+
+        #ties go to the command voted for first
+        {
+            "votes" : [ ( "a", "look" ), ( "b", "take lamp" ) ],
+            "out"   : { "cmd" : "look", "username" : "a", "votes" : 1 }
+        },
+
+        #one vote per player
+        {
+            "votes" : [ ( "a", "look" ), ( "a", "take lamp" ), 
+                        ( "a", "take lamp" ), ( "b", "take lamp" ) ],
+            "out"   : { "cmd" : "look", "username" : "a", "votes" : 1 }
+        }
+    ]
+
+    for tc in testCases:
+
+        tally = CommandTally ( window = 0 )
+
+        for username, cmd in tc [ "votes" ]:
+
+            tally.add ( username, cmd )
+
+        assert ( tally.close () == tc [ "out" ] ), tc
+
+        assert ( tally.winner () == None )
+
+#----------------------------------------------------------------------------
+
+def test_tally_orders_by_status ():
+
+    #mentions arrive newest first so the tweet IDs decide which vote came
+    #first
+
+    testCases = \
+    [
+        {
+            "votes" : [ ( "b", "take lamp", 20 ), ( "a", "look", 10 ) ],
+            "out"   : { "cmd" : "look", "username" : "a", "votes" : 1 }
+        },
+
+        {
+            "votes" : [ ( "c", "look", 30 ), ( "b", "take lamp", 20 ),
+                        ( "a", "look", 10 ) ],
+            "out"   : { "cmd" : "look", "username" : "a", "votes" : 2 }
+        },
+
+        #votes without a tweet ID come before those with one
+        {
+            "votes" : [ ( "b", "take lamp", 20 ), ( "a", "look", None ),
+                        ( "c", "inventory", None ) ],
+            "out"   : { "cmd" : "look", "username" : "a", "votes" : 1 }
+        }
+    ]
+
+    for tc in testCases:
+
+        tally = CommandTally ( window = 0 )
+
+        for username, cmd, statusID in tc [ "votes" ]:
+
+            tally.add ( username, cmd, statusID = statusID )
+
+        assert ( tally.close () == tc [ "out" ] ), tc
+
+#----------------------------------------------------------------------------
+
+def test_tally_window ():
+
+    now = [ 0 ]
+
+    tally = CommandTally ( window = 60, clock = lambda: now [ 0 ] )
+
+    assert ( not tally.ready () )
+
+    now [ 0 ] = 100
+
+    tally.add ( "a", "look" )
+
+    now [ 0 ] = 159
+
+    assert ( not tally.ready () )
+
+    now [ 0 ] = 160
+
+    assert ( tally.ready () )
+
+    tally.close ()
+
+    assert ( not tally.ready () )
+
+#----------------------------------------------------------------------------
+
+def test_tally_is_bounded ():
+
+    tally = CommandTally ( window = 0, maxCommands = 4, maxVoters = 100 )
+
+    #a popular command survives a flood of one-off commands
+
+    for i in range ( 5 ):
+
+        tally.add ( "fan" + str ( i ), "xyzzy" )
+
+    for i in range ( 50 ):
+
+        tally.add ( "user" + str ( i ), "cmd" + str ( i ) )
+
+    assert ( len ( tally._counts ) == 4 )
+    assert ( tally.winner () [ "cmd" ] == "xyzzy" )
+
+    #a forgotten command sent again carries a large error but only its
+    #certain votes count so it does not push out the popular command
+
+    tally.add ( "again", "cmd0" )
+
+    assert ( "xyzzy" in tally._counts )
+    assert ( tally.winner () [ "cmd" ] == "xyzzy" )
+
+    #voters past the limit are ignored
+
+    for i in range ( 100 ):
+
+        tally.add ( "late" + str ( i ), "plugh" )
+
+    assert ( len ( tally._voters ) == 100 )
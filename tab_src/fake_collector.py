@@ -0,0 +1,195 @@
+#############################################################################
+# fake_collector.py
+#----------------------------------------------------------------------------
+# Local stand-in for an OTLP trace collector.  Receives the spans sent by
+# tracing.OTLPExporter and keeps them or writes them to a JSON lines file
+# so traces can be looked at without running a real collector.
+#
+# Usage: python3 fake_collector.py [port] [output path]
+#
+# Point the bot at it with "otlp_url" : "http://127.0.0.1:port" in the
+# tracing configuration.
+#############################################################################
+
+import sys, json, logging, threading
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+#----------------------------------------------------------------------------
+
+#Port OTLP/HTTP collectors listen on
+OTLP_PORT = 4318
+
+#----------------------------------------------------------------------------
+
+class _Server ( ThreadingMixIn, HTTPServer ):
+
+    daemon_threads = True
+
+#----------------------------------------------------------------------------
+
+class _Handler ( BaseHTTPRequestHandler ):
+
+    def do_POST ( self ):
+
+        length = int ( self.headers.get ( "Content-Length", 0 ) )
+
+        body = self.rfile.read ( length )
+
+        status = self.server.collector._receive ( self.path, body )
+
+        self.send_response ( status )
+        self.send_header ( "Content-Type", "application/json" )
+        self.send_header ( "Content-Length", "2" )
+        self.end_headers ()
+
+        self.wfile.write ( b"{}" )
+
+    def log_message ( self, format, *args ):
+
+        logging.debug ( "fake collector: " + format, *args )
+
+#----------------------------------------------------------------------------
+
+class FakeCollector:
+    """
+    HTTP server that accepts OTLP/HTTP JSON trace exports at /v1/traces.
+
+    spans - every span received in the order they arrived.  Each span is
+            the OTLP JSON of the span.
+
+    path  - if set each span is also appended to this file as a line of
+            JSON
+    """
+
+    def __init__ ( self, host = "127.0.0.1", port = 0, path = None ):
+
+        self.path = path
+
+        self.spans = []
+
+        self._lock = threading.Lock ()
+
+        self._server = _Server ( ( host, port ), _Handler )
+        self._server.collector = self
+
+        self._thread = None
+
+    #------------------------------------------------------------------------
+
+    @property
+    def url ( self ):
+
+        host, port = self._server.server_address [ : 2 ]
+
+        return "http://%s:%d" % ( host, port )
+
+    #------------------------------------------------------------------------
+
+    def start ( self ):
+
+        self._thread = threading.Thread ( target = self._server.serve_forever,
+                                          name = "fake-collector",
+                                          daemon = True )
+        self._thread.start ()
+
+        return self
+
+    def stop ( self ):
+
+        self._server.shutdown ()
+        self._server.server_close ()
+
+        if self._thread != None:
+
+            self._thread.join ()
+
+    def __enter__ ( self ):
+
+        return self.start ()
+
+    def __exit__ ( self, *args ):
+
+        self.stop ()
+
+    #------------------------------------------------------------------------
+
+    def traces ( self ):
+        """
+        Returns a dict of trace ID -> list of span names in the order the
+        spans ended.
+        """
+
+        with self._lock:
+
+            traces = {}
+
+            for span in self.spans:
+
+                traces.setdefault ( span [ "traceId" ], [] ).append (
+                        span [ "name" ] )
+
+            return traces
+
+    #------------------------------------------------------------------------
+
+    def _receive ( self, path, body ):
+
+        if path != "/v1/traces":
+
+            return 404
+
+        try:
+
+            request = json.loads ( body.decode ( "utf-8" ) )
+
+            spans = [ span for rs in request [ "resourceSpans" ]
+                           for ss in rs [ "scopeSpans" ]
+                           for span in ss [ "spans" ] ]
+
+        except ( ValueError, KeyError, TypeError ):
+
+            return 400
+
+        with self._lock:
+
+            self.spans.extend ( spans )
+
+            if self.path != None:
+
+                with open ( self.path, "a" ) as outFile:
+
+                    for span in spans:
+
+                        outFile.write ( json.dumps ( span ) + "\n" )
+
+        return 200
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    logging.basicConfig ( format='%(asctime)s - %(levelname)s - %(message)s',
+                          level=logging.INFO )
+
+    port = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else OTLP_PORT
+    path = sys.argv [ 2 ] if len ( sys.argv ) > 2 else "traces.jsonl"
+
+    collector = FakeCollector ( port = port, path = path )
+
+    logging.info ( "Fake OTLP collector at %s writing to %s",
+                   collector.url, path )
+
+    with collector:
+
+        try:
+
+            threading.Event ().wait ()
+
+        except KeyboardInterrupt:
+
+            pass
+
+if __name__ == "__main__":
+    sys.exit ( main () )
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+#############################################################################
+# fake_dfrotz.py
+#----------------------------------------------------------------------------
+# Stand-in for the dfrotz interpreter that plays back a scripted transcript
+# so the game runner can be tested and benchmarked without building frotz.
+#
+# Usage: python3 fake_dfrotz.py [options] [transcript]
+#
+#   --latency SECONDS     time taken by each turn
+#   --output-size BYTES   pad each turn's output to at least this size
+#   --crash-after TURNS   exit with code 1 after this many turns
+#
+# The transcript is a text file of the game's output with each command on
+# its own line starting with '>'.  The text before the first command is
+# printed when the game starts and the text after each command is printed
+# when that command is sent.  Commands that are not in the transcript get
+# a default response.  A transcript that is not a .txt file is ignored so
+# the story path used for dfrotz can be passed unchanged.
+#
+# 'save' and 'restore' ask for a filename the same way dfrotz does and
+# 'quit' ends the game.
+#############################################################################
+
+import sys, time, json
+
+#----------------------------------------------------------------------------
+
+#Transcript used when none is given
+DEFAULT_TRANSCRIPT = """\
+Welcome to Fake Adventure!
+
+You are standing at the end of a road before a small brick building.
+>look
+You are standing at the end of a road before a small brick building.
+Around you is a forest.
+>go north
+You are in open forest, with a deep valley to one side.
+>go south
+You are standing at the end of a road before a small brick building.
+"""
+
+#Response to commands that are not in the transcript
+DEFAULT_RESPONSE = "I don't know how to \"%s\"."
+
+#Sentence used to pad the output to the requested size.  Each one is
+#numbered so no two tweets posted by the bot are the same.
+FILLER = "Tree %d of the forest stretches up into the sky. "
+
+#----------------------------------------------------------------------------
+
+def parse_transcript ( text ):
+    """
+    Returns ( intro, list of ( command, response ) ) for a transcript.
+    """
+
+    intro = []
+    turns = []
+
+    for line in text.splitlines ( True ):
+
+        if line.startswith ( ">" ):
+
+            turns.append ( ( line [ 1 : ].strip ().lower (), [] ) )
+
+        elif len ( turns ) == 0:
+
+            intro.append ( line )
+
+        else:
+
+            turns [ -1 ] [ 1 ].append ( line )
+
+    return "".join ( intro ), [ ( c, "".join ( r ) ) for c, r in turns ]
+
+#----------------------------------------------------------------------------
+
+class FakeGame:
+    """
+    Plays back a transcript.  Commands sent in the order of the transcript
+    get the next response.  Any other command gets the first response
+    recorded for it or DEFAULT_RESPONSE.
+    """
+
+    def __init__ ( self, transcript, outputSize = 0 ):
+
+        self.intro, self.turns = parse_transcript ( transcript )
+
+        self.outputSize = outputSize
+
+        #command -> first response in the transcript
+        self.responses = {}
+
+        for cmd, response in self.turns:
+
+            self.responses.setdefault ( cmd, response )
+
+        #position in the transcript and turns played - saved by 'save'
+        self.position = 0
+        self.turnCount = 0
+
+        #filler sentences printed so far
+        self.fillerCount = 0
+
+    #------------------------------------------------------------------------
+
+    def respond ( self, cmd ):
+
+        self.turnCount += 1
+
+        if self.position < len ( self.turns ) and \
+           self.turns [ self.position ] [ 0 ] == cmd:
+
+            response = self.turns [ self.position ] [ 1 ]
+
+            self.position += 1
+
+        else:
+
+            response = self.responses.get ( cmd )
+
+            if response == None:
+
+                response = DEFAULT_RESPONSE % cmd + "\n"
+
+        return self.pad ( response )
+
+    #------------------------------------------------------------------------
+
+    def pad ( self, text ):
+
+        if len ( text ) >= self.outputSize:
+
+            return text
+
+        filler = []
+        size = len ( text )
+
+        while size < self.outputSize:
+
+            self.fillerCount += 1
+
+            filler.append ( FILLER % self.fillerCount )
+
+            size += len ( filler [ -1 ] )
+
+        return text + "".join ( filler ) + "\n"
+
+    #------------------------------------------------------------------------
+
+    def save ( self, path ):
+
+        with open ( path, "w" ) as saveFile:
+
+            json.dump ( [ self.position, self.turnCount ], saveFile )
+
+    def restore ( self, path ):
+
+        with open ( path ) as saveFile:
+
+            self.position, self.turnCount = json.load ( saveFile )
+
+#----------------------------------------------------------------------------
+
+def parse_args ( args ):
+    """
+    Returns a dict of the options and the transcript path or None.
+    """
+
+    options = { "latency" : 0.0, "output-size" : 0, "crash-after" : None }
+
+    path = None
+
+    i = 0
+
+    while i < len ( args ):
+
+        name = args [ i ] [ 2 : ]
+
+        if args [ i ].startswith ( "--" ) and name in options:
+
+            options [ name ] = float ( args [ i + 1 ] ) if name == "latency" \
+                               else int ( args [ i + 1 ] )
+
+            i += 2
+
+        else:
+
+            path = args [ i ]
+
+            i += 1
+
+    return options, path
+
+#----------------------------------------------------------------------------
+
+def interpreter_command ( latency = 0, outputSize = 0, crashAfter = None ):
+    """
+    Returns the command that runs fake_dfrotz with the given options.  Can
+    be passed to FrotzRunner as its interpreter.
+    """
+
+    cmd = [ sys.executable, __file__,
+            "--latency", str ( latency ),
+            "--output-size", str ( outputSize ) ]
+
+    if crashAfter != None:
+
+        cmd += [ "--crash-after", str ( crashAfter ) ]
+
+    return cmd
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    options, path = parse_args ( sys.argv [ 1 : ] )
+
+    transcript = DEFAULT_TRANSCRIPT
+
+    if path != None and path.endswith ( ".txt" ):
+
+        with open ( path ) as transcriptFile:
+
+            transcript = transcriptFile.read ()
+
+    game = FakeGame ( transcript, options [ "output-size" ] )
+
+    out = sys.stdout
+
+    out.write ( game.intro + "\n>" )
+    out.flush ()
+
+    while True:
+
+        line = sys.stdin.readline ()
+
+        if line == "":
+
+            return 0
+
+        cmd = line.strip ().lower ()
+
+        if options [ "latency" ] > 0:
+
+            time.sleep ( options [ "latency" ] )
+
+        if cmd == "quit":
+
+            out.write ( "Bye.\n" )
+            out.flush ()
+
+            return 0
+
+        if cmd in ( "save", "restore" ):
+
+            out.write ( "Please enter a filename [story.qzl]: " )
+            out.flush ()
+
+            filename = sys.stdin.readline ().strip ()
+
+            try:
+
+                if cmd == "save":
+
+                    game.save ( filename )
+
+                else:
+
+                    game.restore ( filename )
+
+                out.write ( "Ok.\n\n>" )
+
+            except ( OSError, ValueError ):
+
+                out.write ( "Failed.\n\n>" )
+
+            out.flush ()
+
+            continue
+
+        response = game.respond ( cmd )
+
+        if options [ "crash-after" ] != None and \
+           game.turnCount >= options [ "crash-after" ]:
+
+            out.write ( "Fatal error: crashed on purpose\n" )
+            out.flush ()
+
+            return 1
+
+        out.write ( response + "\n>" )
+        out.flush ()
+
+if __name__ == "__main__":
+    sys.exit ( main () )
@@ -0,0 +1,93 @@
+#############################################################################
+# fake_dfrotz_test.py
+#----------------------------------------------------------------------------
+# Tests the game runner against the scripted stand-in for dfrotz.
+#############################################################################
+
+import os
+
+from fake_dfrotz import *
+from frotz_runner import FrotzRunner
+
+TRANSCRIPT = "Intro\n>look\nA room.\n>take lamp\nTaken.\n"
+
+#----------------------------------------------------------------------------
+
+def test_fake_game ():
+
+    game = FakeGame ( TRANSCRIPT )
+
+    assert ( game.intro == "Intro\n" )
+
+    testCases = \
+    [
+        { "cmd" : "take lamp", "out" : "Taken.\n"                    },
+        { "cmd" : "look",      "out" : "A room.\n"                   },
+        { "cmd" : "take lamp", "out" : "Taken.\n"                    },
+        { "cmd" : "xyzzy",     "out" : DEFAULT_RESPONSE % "xyzzy" + "\n" }
+    ]
+
+    for tc in testCases:
+
+        assert ( game.respond ( tc [ "cmd" ] ) == tc [ "out" ] ), tc
+
+    game = FakeGame ( TRANSCRIPT, outputSize = 100 )
+
+    assert ( len ( game.respond ( "look" ) ) >= 100 )
+
+#----------------------------------------------------------------------------
+
+def test_runner_with_fake_dfrotz ( tmp_path ):
+
+    transcript = os.path.join ( str ( tmp_path ), "game.txt" )
+
+    with open ( transcript, "w" ) as f:
+
+        f.write ( TRANSCRIPT )
+
+    save = os.path.join ( str ( tmp_path ), "save.qzl" )
+
+    with FrotzRunner ( transcript, 
+                       interpreter = interpreter_command () ) as frotz:
+
+        assert ( frotz.read_output_block ( timeout = 5 ) == [ "Intro\n", 
+                                                               "\n" ] )
+
+        frotz.write_command ( "look\n" )
+
+        assert ( frotz.read_output_block ( timeout = 5 ) == [ "A room.\n", 
+                                                               "\n" ] )
+
+        assert ( frotz.save_game ( save ) )
+
+        frotz.write_command ( "take lamp\n" )
+        frotz.read_output_block ( timeout = 5 )
+
+        assert ( frotz.restore_game ( save ) )
+
+        #the transcript carries on from where it was saved
+        frotz.write_command ( "take lamp\n" )
+
+        assert ( frotz.read_output_block ( timeout = 5 ) == [ "Taken.\n", 
+                                                               "\n" ] )
+
+#----------------------------------------------------------------------------
+
+def test_fake_dfrotz_crash ():
+
+    interpreter = interpreter_command ( crashAfter = 2 )
+
+    with FrotzRunner ( "story.z8", interpreter = interpreter ) as frotz:
+
+        frotz.read_output_block ( timeout = 5 )
+
+        frotz.write_command ( "look\n" )
+        frotz.read_output_block ( timeout = 5 )
+
+        frotz.write_command ( "look\n" )
+
+        output = frotz.read_output_block ( timeout = 5 )
+
+        assert ( output == [ "Fatal error: crashed on purpose\n" ] )
+
+        assert ( frotz.poll () == 1 )
@@ -0,0 +1,408 @@
+#############################################################################
+# fake_twitter.py
+#----------------------------------------------------------------------------
+# Local stand-in for the parts of the twitter API used by the bot so that
+# posting and mention handling can be tested and measured offline.
+#
+# Usage: python3 fake_twitter.py [port] [latency] [error rate]
+#
+# Point the bot at it with "api_url" : "http://127.0.0.1:port" in the
+# twitter keys file.
+#############################################################################
+
+import sys, json, time, random, logging, threading
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+
+#----------------------------------------------------------------------------
+
+#Calls allowed in each rate limit window
+DEFAULT_RATE_LIMITS = { "statuses/update"             : 300,
+                        "statuses/mentions_timeline"  : 75 }
+
+#Length of a rate limit window in seconds
+RATE_LIMIT_WINDOW = 15*60
+
+#Screen name of the account the bot posts as
+BOT_NAME = "tab_bot"
+
+#Most mentions returned in one page
+MAX_PAGE_SIZE = 200
+
+#Fault that closes the connection without a response
+DROP_CONNECTION = "drop"
+
+#----------------------------------------------------------------------------
+
+class _Server ( ThreadingMixIn, HTTPServer ):
+
+    daemon_threads = True
+
+#----------------------------------------------------------------------------
+
+class _Handler ( BaseHTTPRequestHandler ):
+
+    def do_GET ( self ):
+
+        self.server.fake._handle ( self )
+
+    def do_POST ( self ):
+
+        self.server.fake._handle ( self )
+
+    def log_message ( self, format, *args ):
+
+        logging.debug ( "fake twitter: " + format, *args )
+
+#----------------------------------------------------------------------------
+
+class FakeTwitter:
+    """
+    HTTP server that answers statuses/update and statuses/mentions_timeline
+    calls the way twitter does.
+
+    rateLimits - dict of endpoint -> calls allowed in each window.  Calls
+                 over the limit get a 429 response.  Every response has
+                 the x-rate-limit headers.
+
+    window     - length of a rate limit window in seconds
+
+    latency    - seconds each request takes
+
+    errorRate  - fraction of requests that fail with a 503
+
+    Further faults can be queued with fail_next.
+    """
+
+    def __init__ ( self, host = "127.0.0.1", port = 0, rateLimits = None,
+                   window = RATE_LIMIT_WINDOW, latency = 0, errorRate = 0,
+                   seed = None ):
+
+        self.rateLimits = dict ( DEFAULT_RATE_LIMITS )
+        self.rateLimits.update ( rateLimits or {} )
+
+        self.window = window
+        self.latency = latency
+        self.errorRate = errorRate
+
+        self._random = random.Random ( seed )
+
+        self._lock = threading.Lock ()
+
+        #ids are given out in order to mentions and statuses alike
+        self._nextID = 1000
+
+        #statuses posted by the bot in order
+        self.statuses = []
+
+        #mentions of the bot in order
+        self.mentions = []
+
+        #endpoint -> [ calls made in window, window reset time ]
+        self._windows = {}
+
+        #endpoint -> number of requests received
+        self.requests = {}
+
+        #status codes or DROP_CONNECTION for the next requests
+        self._faults = []
+
+        self._server = _Server ( ( host, port ), _Handler )
+        self._server.fake = self
+
+        self._thread = None
+
+    #------------------------------------------------------------------------
+
+    @property
+    def url ( self ):
+
+        host, port = self._server.server_address [ : 2 ]
+
+        return "http://%s:%d" % ( host, port )
+
+    #------------------------------------------------------------------------
+
+    def start ( self ):
+
+        self._thread = threading.Thread ( target = self._server.serve_forever,
+                                          name = "fake-twitter",
+                                          daemon = True )
+        self._thread.start ()
+
+        return self
+
+    def stop ( self ):
+
+        self._server.shutdown ()
+        self._server.server_close ()
+
+        if self._thread != None:
+
+            self._thread.join ()
+
+    def __enter__ ( self ):
+
+        return self.start ()
+
+    def __exit__ ( self, *args ):
+
+        self.stop ()
+
+    #------------------------------------------------------------------------
+
+    def add_mention ( self, text, username = "player", replyTo = None ):
+        """
+        Adds a tweet mentioning the bot.  Returns its status ID.
+        """
+
+        with self._lock:
+
+            mention = self._new_status ( text, username, replyTo )
+
+            self.mentions.append ( mention )
+
+            return mention [ "id" ]
+
+    #------------------------------------------------------------------------
+
+    def fail_next ( self, count = 1, status = 503 ):
+        """
+        Makes the next count requests fail with the status code.  A status
+        of DROP_CONNECTION closes the connection without a response.
+        """
+
+        with self._lock:
+
+            self._faults += [ status ] * count
+
+    #------------------------------------------------------------------------
+
+    def _new_status ( self, text, username, replyTo ):
+
+        self._nextID += 1
+
+        return { "id"                    : self._nextID,
+                 "id_str"                : str ( self._nextID ),
+                 "text"                  : text,
+                 "in_reply_to_status_id" : replyTo,
+                 "user"                  : { "id"          : 1,
+                                             "id_str"      : "1",
+                                             "screen_name" : username } }
+
+    #------------------------------------------------------------------------
+
+    def _handle ( self, request ):
+
+        parts = urlsplit ( request.path )
+
+        #/1.1/statuses/update.json -> statuses/update
+        endpoint = parts.path
+
+        if endpoint.startswith ( "/1.1/" ):
+
+            endpoint = endpoint [ 5 : ]
+
+        if endpoint.endswith ( ".json" ):
+
+            endpoint = endpoint [ : -5 ]
+
+        params = { k : v [ 0 ] for k, v in parse_qs ( parts.query ).items () }
+
+        length = int ( request.headers.get ( "Content-Length", 0 ) )
+
+        if length > 0:
+
+            body = request.rfile.read ( length ).decode ( "utf-8" )
+
+            params.update ( { k : v [ 0 ]
+                              for k, v in parse_qs ( body ).items () } )
+
+        if self.latency > 0:
+
+            time.sleep ( self.latency )
+
+        with self._lock:
+
+            self.requests [ endpoint ] = self.requests.get ( endpoint, 0 ) + 1
+
+            fault = self._faults.pop ( 0 ) if len ( self._faults ) > 0 \
+                    else None
+
+            if fault == None and self.errorRate > 0 and \
+               self._random.random () < self.errorRate:
+
+                fault = 503
+
+            if fault == DROP_CONNECTION:
+
+                #close the connection without answering
+                request.close_connection = True
+
+                return
+
+            headers = self._rate_limit ( endpoint )
+
+            if fault != None:
+
+                status, body = fault, error_body ( 131, "Internal error" )
+
+            elif headers != None and \
+                 int ( headers [ "x-rate-limit-remaining" ] ) < 0:
+
+                headers [ "x-rate-limit-remaining" ] = "0"
+
+                status, body = 429, error_body ( 88, "Rate limit exceeded" )
+
+            elif endpoint == "statuses/update" and \
+                 request.command == "POST":
+
+                status, body = self._update ( params )
+
+            elif endpoint == "statuses/mentions_timeline":
+
+                status, body = self._mentions ( params )
+
+            else:
+
+                status, body = 404, error_body ( 34, "Page not found" )
+
+        data = json.dumps ( body ).encode ( "utf-8" )
+
+        request.send_response ( status )
+        request.send_header ( "Content-Type", "application/json" )
+        request.send_header ( "Content-Length", str ( len ( data ) ) )
+
+        for name, value in ( headers or {} ).items ():
+
+            request.send_header ( name, value )
+
+        request.end_headers ()
+
+        request.wfile.write ( data )
+
+    #------------------------------------------------------------------------
+
+    def _rate_limit ( self, endpoint ):
+        """
+        Counts a call against the endpoint's window and returns the rate
+        limit headers.  Remaining is below zero if the call is over the
+        limit.
+        """
+
+        limit = self.rateLimits.get ( endpoint )
+
+        if limit == None:
+
+            return None
+
+        now = time.time ()
+
+        window = self._windows.get ( endpoint )
+
+        if window == None or now >= window [ 1 ]:
+
+            window = [ 0, int ( now + self.window ) + 1 ]
+
+            self._windows [ endpoint ] = window
+
+        window [ 0 ] += 1
+
+        return { "x-rate-limit-limit"     : str ( limit ),
+                 "x-rate-limit-remaining" : str ( limit - window [ 0 ] ),
+                 "x-rate-limit-reset"     : str ( window [ 1 ] ) }
+
+    #------------------------------------------------------------------------
+
+    def _update ( self, params ):
+
+        text = params.get ( "status" )
+
+        if text == None:
+
+            return 400, error_body ( 170, "Missing required parameter" )
+
+        #twitter refuses a status that repeats one already posted
+        for s in self.statuses:
+
+            if s [ "text" ] == text:
+
+                return 403, error_body ( 187, "Status is a duplicate." )
+
+        replyTo = params.get ( "in_reply_to_status_id" )
+
+        if replyTo != None:
+
+            replyTo = int ( replyTo )
+
+        status = self._new_status ( text, BOT_NAME, replyTo )
+
+        self.statuses.append ( status )
+
+        return 200, status
+
+    #------------------------------------------------------------------------
+
+    def _mentions ( self, params ):
+
+        sinceID = int ( params.get ( "since_id", 0 ) )
+        maxID = params.get ( "max_id" )
+
+        maxID = None if maxID == None else int ( maxID )
+
+        count = min ( int ( params.get ( "count", 20 ) ), MAX_PAGE_SIZE )
+
+        page = []
+
+        for m in reversed ( self.mentions ):
+
+            if len ( page ) >= count:
+
+                break
+
+            if m [ "id" ] > sinceID and ( maxID == None or m [ "id" ] <= maxID ):
+
+                page.append ( m )
+
+        return 200, page
+
+#----------------------------------------------------------------------------
+
+def error_body ( code, message ):
+
+    return { "errors" : [ { "code" : code, "message" : message } ] }
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    logging.basicConfig ( format='%(asctime)s - %(levelname)s - %(message)s',
+                          level=logging.DEBUG )
+
+    port = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else 8080
+    latency = float ( sys.argv [ 2 ] ) if len ( sys.argv ) > 2 else 0
+    errorRate = float ( sys.argv [ 3 ] ) if len ( sys.argv ) > 3 else 0
+
+    fake = FakeTwitter ( port = port, latency = latency,
+                         errorRate = errorRate )
+
+    logging.info ( "Fake twitter API at %s", fake.url )
+
+    with fake:
+
+        try:
+
+            while True:
+
+                text = input ( "Mention: " )
+
+                fake.add_mention ( text )
+
+        except ( EOFError, KeyboardInterrupt ):
+
+            pass
+
+if __name__ == "__main__":
+    sys.exit ( main () )
@@ -0,0 +1,114 @@
+#############################################################################
+# fake_twitter_test.py
+#----------------------------------------------------------------------------
+# Tests the twitter connection against the local stand-in for twitter.
+#############################################################################
+
+import os
+
+import requests
+
+from fake_twitter import *
+from twitter_connection import TwitterConnection
+from retry_policy import RetryPolicy
+
+import twitter_connection
+
+KEYS = { "consumer_key"        : "key",
+         "consumer_secret"     : "secret",
+         "access_token"        : "token",
+         "access_token_secret" : "token secret" }
+
+#----------------------------------------------------------------------------
+
+def test_fake_twitter_rate_limit ():
+
+    with FakeTwitter ( rateLimits = { "statuses/mentions_timeline" : 1 } ) \
+            as fake:
+
+        url = fake.url + "/1.1/statuses/mentions_timeline.json"
+
+        response = requests.get ( url )
+
+        assert ( response.status_code == 200 )
+        assert ( response.json () == [] )
+        assert ( response.headers [ "x-rate-limit-remaining" ] == "0" )
+
+        response = requests.get ( url )
+
+        assert ( response.status_code == 429 )
+        assert ( response.json () [ "errors" ] [ 0 ] [ "code" ] == 88 )
+
+#----------------------------------------------------------------------------
+
+def test_connection_with_fake_twitter ( tmp_path ):
+
+    statePath = os.path.join ( str ( tmp_path ), "state.db" )
+
+    with FakeTwitter () as fake:
+
+        first = fake.add_mention ( "@tab_bot hello" )
+
+        keys = dict ( KEYS, api_url = fake.url )
+
+        with TwitterConnection ( statePath, keys = keys ) as tc:
+
+            tc.retryPolicy = RetryPolicy ( baseDelay = 0.01 )
+
+            #mentions from before the bot started are skipped
+            assert ( tc.latestMention == first )
+
+            mention = fake.add_mention ( "@tab_bot cmd look", "a", 7 )
+
+            mentions = tc.get_latest_mentions ()
+
+            assert ( [ ( m.id, m.text, m.username, m.replyTo ) 
+                       for m in mentions ] ==
+                     [ ( mention, "@tab_bot cmd look", "a", 7 ) ] )
+
+            #a failed post is tried again
+            fake.fail_next ( 1, 503 )
+            fake.fail_next ( 1, DROP_CONNECTION )
+
+            calls = twitter_connection.API_CALLS
+
+            ok = calls.labels ( "statuses/update", "ok" ).value
+            errors = calls.labels ( "statuses/update", "error" ).value
+
+            ids = tc.send_message_chain ( [ "word " * 100 ], 42 )
+
+            #each attempt is counted by its outcome
+            assert ( calls.labels ( "statuses/update", "ok" ).value == 
+                     ok + 2 )
+            assert ( calls.labels ( "statuses/update", "error" ).value == 
+                     errors + 2 )
+
+        assert ( len ( ids ) == 2 )
+        assert ( [ s [ "id" ] for s in fake.statuses ] == ids )
+
+        #the chain replies to the status and then to itself
+        assert ( fake.statuses [ 0 ] [ "in_reply_to_status_id" ] == 42 )
+        assert ( fake.statuses [ 1 ] [ "in_reply_to_status_id" ] == ids [ 0 ] )
+
+        assert ( fake.requests [ "statuses/update" ] == 4 )
+
+#----------------------------------------------------------------------------
+
+def test_refused_tweet_is_not_retried ( tmp_path ):
+
+    statePath = os.path.join ( str ( tmp_path ), "state.db" )
+
+    with FakeTwitter () as fake:
+
+        keys = dict ( KEYS, api_url = fake.url )
+
+        with TwitterConnection ( statePath, keys = keys ) as tc:
+
+            tc.retryPolicy = RetryPolicy ( baseDelay = 0.01 )
+
+            assert ( len ( tc.send_message_chain ( [ "look" ] ) ) == 1 )
+
+            #twitter refuses the duplicate so the chain is dropped at once
+            assert ( tc.send_message_chain ( [ "look" ] ) == [] )
+
+        assert ( fake.requests [ "statuses/update" ] == 2 )
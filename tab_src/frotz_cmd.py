@@ -19,7 +19,7 @@ def main ():
         while True:
 
             #print a block of output from the game
-            for line in gameRunner.read_output_block ():
+            for line in gameRunner.read_output_block ( timeout = 5 ):
 
                 print ( line )
 
@@ -0,0 +1,286 @@
+#############################################################################
+# frotz_pool.py
+#----------------------------------------------------------------------------
+# Keeps games started ahead of time so a new game can begin instantly.
+#############################################################################
+
+import time, logging, threading
+
+from contextlib import contextmanager
+
+from frotz_runner import FrotzRunner
+
+#----------------------------------------------------------------------------
+
+#Default number of warm games kept ready
+POOL_SIZE = 1
+
+#Largest number of warm games a pool can be asked to keep
+MAX_POOL_SIZE = 16
+
+#How long a new game has to print its opening output before it is
+#considered broken
+WARM_TIMEOUT = 30
+
+#How often the warm games are checked to make sure they are still running
+HEALTH_CHECK_INTERVAL = 60
+
+#Longest wait between attempts to start a game after failures
+MAX_REFILL_DELAY = 5*60
+
+#----------------------------------------------------------------------------
+
+class FrotzPool:
+    """
+    Provides a 'context manager' that keeps a number of dfrotz games
+    started and waiting at their first prompt.
+
+    The opening output of each warm game is read ahead of time so the
+    game can be handed out and its intro posted straight away.  A thread
+    starts a new game whenever the pool drops below its size and checks
+    that the waiting games are still running.
+
+    Usage:
+
+        with FrotzPool ( "z8/advent.z8" ) as pool:
+
+            with pool.game () as frotz:
+
+                ...
+    """
+
+    def __init__ ( self, gamePath, size = POOL_SIZE,
+                   runnerFactory = FrotzRunner ):
+
+        assert 0 <= size <= MAX_POOL_SIZE
+
+        self.gamePath = gamePath
+
+        self.size = size
+
+        #called with the game path to create each runner
+        self.runnerFactory = runnerFactory
+
+        self._warm = []
+
+        self._cond = threading.Condition ()
+
+        self._closed = False
+
+    #------------------------------------------------------------------------
+
+    def __enter__ ( self ):
+
+        self._thread = threading.Thread ( target = self._refill_loop )
+        self._thread.daemon = True
+        self._thread.start ()
+
+        return self
+
+    #------------------------------------------------------------------------
+
+    def __exit__ ( self, *args ):
+
+        with self._cond:
+
+            self._closed = True
+
+            warm, self._warm = self._warm, []
+
+            self._cond.notify_all ()
+
+        for runner in warm:
+
+            runner.__exit__ ( None, None, None )
+
+    #------------------------------------------------------------------------
+
+    def acquire ( self ):
+        """
+        Returns a running game.  A warm game is used if one is ready,
+        otherwise a new game is started.
+
+        The game should be handed back to release when it is finished.
+        """
+
+        exited = []
+
+        with self._cond:
+
+            runner = None
+
+            while len ( self._warm ) > 0 and runner == None:
+
+                runner = self._warm.pop ( 0 )
+
+                #called from the event loop so the check must not block
+                if runner.poll ( 0 ) != None:
+
+                    exited.append ( runner )
+
+                    runner = None
+
+            self._cond.notify_all ()
+
+        for game in exited:
+
+            logging.warning ( "Discarding exited warm game." )
+
+            game.__exit__ ( None, None, None )
+
+        if runner == None:
+
+            logging.info ( "No warm game ready - starting %s", self.gamePath )
+
+            runner = self.runnerFactory ( self.gamePath ).__enter__ ()
+
+        return runner
+
+    #------------------------------------------------------------------------
+
+    def release ( self, runner ):
+        """
+        Stops a game returned by acquire.  Games are never reused since
+        they hold the state of the last play through.
+        """
+
+        runner.__exit__ ( None, None, None )
+
+    #------------------------------------------------------------------------
+
+    @contextmanager
+    def game ( self ):
+        """
+        Context manager that acquires a game and releases it when done.
+        """
+
+        runner = self.acquire ()
+
+        try:
+
+            yield runner
+
+        finally:
+
+            self.release ( runner )
+
+    #------------------------------------------------------------------------
+
+    def warm_count ( self ):
+        """
+        Returns the number of games waiting in the pool.
+        """
+
+        with self._cond:
+
+            return len ( self._warm )
+
+    #------------------------------------------------------------------------
+
+    def _start_warm_game ( self ):
+        """
+        Starts a game and waits for its opening output.  Returns the
+        runner or None if the game failed to start.
+        """
+
+        runner = None
+
+        try:
+
+            runner = self.runnerFactory ( self.gamePath ).__enter__ ()
+
+            if runner.warm_up ( WARM_TIMEOUT ):
+
+                return runner
+
+            logging.warning ( "Warm game did not reach its prompt: %s",
+                              self.gamePath )
+
+        except Exception:
+
+            logging.error ( "Failed to start warm game: %s", self.gamePath,
+                            exc_info = True )
+
+        if runner != None:
+
+            runner.__exit__ ( None, None, None )
+
+        return None
+
+    #------------------------------------------------------------------------
+
+    def _check_health ( self ):
+        """
+        Removes warm games that have exited and returns them so they can
+        be stopped once the lock is released.  Called with the lock held.
+        """
+
+        healthy = [ r for r in self._warm if r.poll ( 0 ) == None ]
+
+        exited = [ r for r in self._warm if r not in healthy ]
+
+        self._warm = healthy
+
+        return exited
+
+    #------------------------------------------------------------------------
+
+    def _refill_loop ( self ):
+
+        failures = 0
+
+        while True:
+
+            with self._cond:
+
+                exited = self._check_health ()
+
+            for runner in exited:
+
+                logging.warning ( "Warm game exited while waiting: %s",
+                                  self.gamePath )
+
+                runner.__exit__ ( None, None, None )
+
+            with self._cond:
+
+                #sleep until a game is taken or the next health check
+
+                if not self._closed and len ( self._warm ) >= self.size:
+
+                    self._cond.wait ( HEALTH_CHECK_INTERVAL )
+
+                    continue
+
+                if self._closed:
+
+                    return
+
+            runner = self._start_warm_game ()
+
+            started = runner != None
+
+            with self._cond:
+
+                if started and not self._closed:
+
+                    self._warm.append ( runner )
+
+                    runner = None
+
+            #the pool closed while the game was starting
+            if runner != None:
+
+                runner.__exit__ ( None, None, None )
+
+            if self._closed:
+
+                return
+
+            #back off if games keep failing to start
+
+            failures = 0 if started else failures + 1
+
+            if failures > 0:
+
+                time.sleep ( min ( 2 ** failures, MAX_REFILL_DELAY ) )
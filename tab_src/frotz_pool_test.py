@@ -0,0 +1,105 @@
+#############################################################################
+# frotz_pool_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the pool of warm games.  A stand-in runner is used so no
+# dfrotz process is needed.
+#############################################################################
+
+import time
+
+import frotz_pool
+
+from frotz_pool import FrotzPool
+
+#----------------------------------------------------------------------------
+
+class StubRunner:
+
+    started = 0
+
+    def __init__ ( self, gamePath ):
+
+        self.gamePath = gamePath
+        self.exitCode = None
+        self.warm = False
+
+    def __enter__ ( self ):
+
+        StubRunner.started += 1
+
+        return self
+
+    def __exit__ ( self, *args ):
+
+        self.exitCode = -9
+
+    def warm_up ( self, timeout ):
+
+        self.warm = True
+
+        return True
+
+    def poll ( self, wait = 1 ):
+
+        return self.exitCode
+
+#----------------------------------------------------------------------------
+
+def wait_for_warm ( pool, count ):
+
+    for i in range ( 100 ):
+
+        if pool.warm_count () >= count:
+
+            return
+
+        time.sleep ( 0.01 )
+
+#----------------------------------------------------------------------------
+
+def test_pool_refills ():
+
+    with FrotzPool ( "test.z8", size = 2, runnerFactory = StubRunner ) as p:
+
+        wait_for_warm ( p, 2 )
+
+        assert ( p.warm_count () == 2 )
+
+        with p.game () as runner:
+
+            assert ( runner.warm )
+
+            wait_for_warm ( p, 2 )
+
+            assert ( p.warm_count () == 2 )
+
+        assert ( runner.poll () != None )
+
+#----------------------------------------------------------------------------
+
+def test_pool_skips_exited_games ():
+
+    with FrotzPool ( "test.z8", size = 1, runnerFactory = StubRunner ) as p:
+
+        wait_for_warm ( p, 1 )
+
+        p._warm [ 0 ].exitCode = 1
+
+        runner = p.acquire ()
+
+        assert ( runner.poll () == None )
+
+        p.release ( runner )
+
+#----------------------------------------------------------------------------
+
+def test_empty_pool_starts_cold_game ():
+
+    with FrotzPool ( "test.z8", size = 0, runnerFactory = StubRunner ) as p:
+
+        runner = p.acquire ()
+
+        assert ( not runner.warm )
+        assert ( runner.poll () == None )
+
+        p.release ( runner )
@@ -0,0 +1,358 @@
+#############################################################################
+# frotz_reactor.py
+#----------------------------------------------------------------------------
+# A single I/O thread that services the pipes of every running frotz game.
+#############################################################################
+
+import os, io, codecs, errno, logging, selectors, threading
+
+#----------------------------------------------------------------------------
+
+#How many bytes are read from a game's output pipe at a time
+READ_SIZE = 64 * 1024
+
+#----------------------------------------------------------------------------
+
+class _Channel:
+    """
+    Reactor side state for one game.
+
+    The runner is told about output through its _on_output and _on_eof
+    methods which are called from the reactor thread.
+    """
+
+    def __init__ ( self, runner, stdout, stdin ):
+
+        self.runner = runner
+
+        self.stdout = stdout
+        self.stdin = stdin
+
+        #decodes the raw output and translates newlines the same way as
+        #Popen ( universal_newlines = True )
+        self.decoder = io.IncrementalNewlineDecoder (
+                codecs.getincrementaldecoder ( "utf-8" ) ( "replace" ),
+                translate = True )
+
+        #bytes waiting to be written to the game's stdin
+        self.writeBuffer = bytearray ()
+
+        self.writing = False
+
+#----------------------------------------------------------------------------
+
+class FrotzReactor:
+    """
+    Services the stdin and stdout pipes of many game sub-processes from
+    one thread using the selectors module.
+
+    The pipes are made non-blocking.  Output is decoded and handed to the
+    runner as it arrives and input is buffered until the pipe can accept
+    it.  Other threads never touch the selector directly - they queue an
+    operation and wake the reactor through a pipe.
+
+    Every game shares the thread so an error handling one pipe is logged
+    and that pipe is dropped instead of stopping the thread.
+    """
+
+    def __init__ ( self ):
+
+        self._selector = selectors.DefaultSelector ()
+
+        self._lock = threading.Lock ()
+
+        #operations queued by other threads to run on the reactor thread
+        self._pending = []
+
+        #runner -> _Channel
+        self._channels = {}
+
+        self._wakeRead, self._wakeWrite = os.pipe ()
+
+        os.set_blocking ( self._wakeRead, False )
+        os.set_blocking ( self._wakeWrite, False )
+
+        self._selector.register ( self._wakeRead, selectors.EVENT_READ )
+
+        self._thread = threading.Thread ( target = self._run )
+        self._thread.daemon = True
+        self._thread.start ()
+
+    #------------------------------------------------------------------------
+
+    def add ( self, runner, stdout, stdin ):
+        """
+        Starts servicing a game's pipes.  The pipes are raw binary files
+        from Popen ( bufsize = 0 ).
+        """
+
+        os.set_blocking ( stdout.fileno (), False )
+        os.set_blocking ( stdin.fileno (), False )
+
+        channel = _Channel ( runner, stdout, stdin )
+
+        self._call_soon ( lambda: self._add ( channel ) )
+
+    #------------------------------------------------------------------------
+
+    def remove ( self, runner ):
+        """
+        Stops servicing a game's pipes and closes them.
+        """
+
+        self._call_soon ( lambda: self._remove ( runner ) )
+
+    #------------------------------------------------------------------------
+
+    def write ( self, runner, data ):
+        """
+        Queues bytes to be written to a game's stdin.
+        """
+
+        self._call_soon ( lambda: self._write ( runner, data ) )
+
+    #------------------------------------------------------------------------
+
+    def _call_soon ( self, op ):
+
+        with self._lock:
+
+            self._pending.append ( op )
+
+        try:
+
+            os.write ( self._wakeWrite, b"\0" )
+
+        #pipe full - the reactor is already due to wake
+        except BlockingIOError:
+
+            pass
+
+    #------------------------------------------------------------------------
+
+    def _run ( self ):
+
+        while True:
+
+            for key, mask in self._selector.select ():
+
+                try:
+
+                    if key.data == None:
+
+                        self._run_pending ()
+
+                    elif mask & selectors.EVENT_READ:
+
+                        self._handle_read ( key.data )
+
+                    else:
+
+                        self._handle_write ( key.data )
+
+                except Exception:
+
+                    logging.error ( "Frotz reactor failed on %r.",
+                                    key.fileobj, exc_info = True )
+
+                    self._drop ( key )
+
+    #------------------------------------------------------------------------
+
+    def _drop ( self, key ):
+        """
+        Stops watching a pipe that failed.  If it was a game's output the
+        game is told its output has ended so readers do not wait for it.
+        """
+
+        channel = key.data
+
+        #the wake pipe is always needed
+        if channel == None:
+
+            return
+
+        self._unregister ( key.fileobj )
+
+        if key.fileobj is channel.stdin:
+
+            del channel.writeBuffer [ : ]
+
+            channel.writing = False
+
+            return
+
+        try:
+
+            channel.runner._on_eof ()
+
+        except Exception:
+
+            logging.error ( "Frotz runner failed at end of output.",
+                            exc_info = True )
+
+    #------------------------------------------------------------------------
+
+    def _unregister ( self, pipe ):
+
+        try:
+
+            self._selector.unregister ( pipe )
+
+        #not registered or already closed
+        except ( KeyError, ValueError ):
+
+            pass
+
+    #------------------------------------------------------------------------
+
+    def _run_pending ( self ):
+
+        try:
+
+            while os.read ( self._wakeRead, 4096 ):
+
+                pass
+
+        except BlockingIOError:
+
+            pass
+
+        with self._lock:
+
+            pending, self._pending = self._pending, []
+
+        for op in pending:
+
+            try:
+
+                op ()
+
+            except Exception:
+
+                logging.error ( "Frotz reactor operation failed.",
+                                exc_info = True )
+
+    #------------------------------------------------------------------------
+
+    def _add ( self, channel ):
+
+        self._channels [ channel.runner ] = channel
+
+        self._selector.register ( channel.stdout, selectors.EVENT_READ,
+                                  channel )
+
+    #------------------------------------------------------------------------
+
+    def _remove ( self, runner ):
+
+        channel = self._channels.pop ( runner, None )
+
+        if channel == None:
+
+            return
+
+        for pipe in ( channel.stdout, channel.stdin ):
+
+            self._unregister ( pipe )
+
+            pipe.close ()
+
+    #------------------------------------------------------------------------
+
+    def _write ( self, runner, data ):
+
+        channel = self._channels.get ( runner )
+
+        if channel == None or channel.stdin.closed:
+
+            return
+
+        channel.writeBuffer += data
+
+        if not channel.writing:
+
+            self._selector.register ( channel.stdin, selectors.EVENT_WRITE,
+                                      channel )
+
+            channel.writing = True
+
+    #------------------------------------------------------------------------
+
+    def _handle_read ( self, channel ):
+
+        try:
+
+            data = os.read ( channel.stdout.fileno (), READ_SIZE )
+
+        except BlockingIOError:
+
+            return
+
+        #an error or a pipe that was closed ends the output
+        except ( OSError, ValueError ):
+
+            data = b""
+
+        if len ( data ) > 0:
+
+            channel.runner._on_output ( channel.decoder.decode ( data ) )
+
+            return
+
+        #end of file - the game has exited
+
+        self._unregister ( channel.stdout )
+
+        channel.runner._on_output ( channel.decoder.decode ( b"", True ) )
+        channel.runner._on_eof ()
+
+    #------------------------------------------------------------------------
+
+    def _handle_write ( self, channel ):
+
+        try:
+
+            written = os.write ( channel.stdin.fileno (), channel.writeBuffer )
+
+        except BlockingIOError:
+
+            return
+
+        except OSError as e:
+
+            if e.errno != errno.EPIPE:
+
+                logging.warning ( "Error writing to frotz: %s", e )
+
+            #the game is not reading any more input
+            written = len ( channel.writeBuffer )
+
+        del channel.writeBuffer [ : written ]
+
+        if len ( channel.writeBuffer ) == 0:
+
+            self._unregister ( channel.stdin )
+
+            channel.writing = False
+
+#----------------------------------------------------------------------------
+
+_defaultReactor = None
+_defaultReactorLock = threading.Lock ()
+
+def get_reactor ():
+    """
+    Returns the reactor shared by every FrotzRunner in the process.  It is
+    created the first time it is needed.
+    """
+
+    global _defaultReactor
+
+    with _defaultReactorLock:
+
+        if _defaultReactor == None:
+
+            _defaultReactor = FrotzReactor ()
+
+        return _defaultReactor
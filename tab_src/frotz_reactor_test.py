@@ -0,0 +1,87 @@
+#############################################################################
+# frotz_reactor_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the I/O thread shared by the games.  Pipes stand in for
+# the game sub-processes.
+#############################################################################
+
+import os, threading
+
+from frotz_reactor import *
+
+#----------------------------------------------------------------------------
+
+class RecordingRunner:
+    """
+    Records the output handed to it by the reactor.
+    """
+
+    def __init__ ( self, failing = False ):
+
+        self.failing = failing
+
+        self.output = ""
+
+        self.changed = threading.Event ()
+        self.ended = threading.Event ()
+
+    def _on_output ( self, text ):
+
+        if self.failing:
+
+            raise RuntimeError ( "runner failed" )
+
+        self.output += text
+
+        self.changed.set ()
+
+    def _on_eof ( self ):
+
+        self.ended.set ()
+
+#----------------------------------------------------------------------------
+
+def add_game ( reactor, runner ):
+    """
+    Adds pipes for a runner and returns the end the 'game' writes its
+    output to.
+    """
+
+    outRead, outWrite = os.pipe ()
+    inRead, inWrite = os.pipe ()
+
+    os.close ( inRead )
+
+    reactor.add ( runner, os.fdopen ( outRead, "rb", 0 ),
+                  os.fdopen ( inWrite, "wb", 0 ) )
+
+    return outWrite
+
+#----------------------------------------------------------------------------
+
+def test_reactor_survives_runner_error ():
+
+    reactor = FrotzReactor ()
+
+    broken = RecordingRunner ( failing = True )
+    working = RecordingRunner ()
+
+    brokenOut = add_game ( reactor, broken )
+    workingOut = add_game ( reactor, working )
+
+    #the failing runner is dropped and told its output has ended
+    os.write ( brokenOut, b"boom\n" )
+
+    assert ( broken.ended.wait ( 5 ) )
+
+    #the other game is still serviced
+    os.write ( workingOut, b"West of House\n" )
+
+    assert ( working.changed.wait ( 5 ) )
+    assert ( working.output == "West of House\n" )
+
+    reactor.remove ( broken )
+    reactor.remove ( working )
+
+    os.close ( brokenOut )
+    os.close ( workingOut )
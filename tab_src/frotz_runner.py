@@ -1,24 +1,49 @@
-import sys, time
-from subprocess import PIPE, Popen
-from threading import Thread
+import sys, time, re, asyncio, logging
+from subprocess import PIPE, Popen, TimeoutExpired
 from queue import Queue, Empty
 
+import metrics, tracing
+
+from frotz_reactor import get_reactor
+
 #----------------------------------------------------------------------------
 
-#These function are used by the FrotzRunner threads to continuously read
-#output and send commands to the game sub-process
+#Command that runs the interpreter.  The story path is added to the end.
+#fake_dfrotz.interpreter_command gives a command for the scripted stand-in.
+DFROTZ_COMMAND = [ "dfrotz" ]
+
+#Matches the input prompt dfrotz prints when the game is waiting for a
+#command.  The prompt is not followed by a newline so it is matched against
+#the incomplete line at the end of the output.
+DEFAULT_PROMPT = r">\s*$"
+
+#Matches the prompt dfrotz prints when it asks for the name of a save file
+FILENAME_PROMPT = re.compile ( r"(?i).*filename.*:\s*$" )
+
+#The longest a single turn's output is waited for when the prompt is not
+#seen e.g. if the game is asking a question with a different prompt
+TURN_TIMEOUT = 10
 
-def read_subp_output ( subPstdout, outQueue ):
+#Put on the output queue when the prompt is seen
+PROMPT = object ()
 
-    #keep reading output lines and adding to queue until program finishes
-    for line in iter ( subPstdout.readline, b'' ):
-        outQueue.put ( line )
+#How long poll waits for the game to exit after it has closed its output
+EXIT_WAIT = 1
 
-def write_subp_input ( subPstdin, inQueue ):
+OUTPUT_WAIT_SECONDS = metrics.REGISTRY.histogram ( 
+        "tab_frotz_output_wait_seconds", 
+        "Time read_output_block waited for the game's output" )
 
-    while True:
+#----------------------------------------------------------------------------
 
-        subPstdin.write ( inQueue.get () )
+def command_succeeded ( output ):
+    """
+    Returns True if the output of a save or restore says it worked.  The
+    game prints 'Ok.' on success and 'Save failed.' or similar otherwise.
+    """
+
+    return any ( line.strip ().lower ().startswith ( "ok" ) 
+                 for line in output )
 
 #----------------------------------------------------------------------------
 
@@ -26,41 +51,75 @@ class FrotzRunner:
     """
     Provides a 'context manager' that can be used to control a dfrotz game.
 
-    The game is run in a sub-process and two threads are used to input
-    commands and read output from the game.
+    The game is run in a sub-process.  Its pipes are serviced by a
+    FrotzReactor that is shared with every other game in the process so
+    no threads are started per game.  Output can be read from a thread
+    with read_output_block or from a coroutine with 
+    read_output_block_async, which holds no thread while it waits.
 
     A demonstration of its usage can be found in the 'frotz_cmd.py' file.
     """
 
-    def __init__ ( self, gamePath ):
+    def __init__ ( self, gamePath, reactor = None, prompt = DEFAULT_PROMPT, 
+                   turnTimeout = TURN_TIMEOUT, interpreter = None ):
+        """
+        prompt      - regex matching the prompt that ends each turn's 
+                      output or None to guess the end of the output with 
+                      retries
+
+        turnTimeout - longest time a turn's output is read for if the 
+                      prompt is not seen
+
+        interpreter - command that runs the game as a list of arguments.
+                      Defaults to DFROTZ_COMMAND.
+        """
 
         self.gamePath = gamePath
 
+        self.interpreter = list ( interpreter or DFROTZ_COMMAND )
+
+        self.reactor = reactor
+
+        self.prompt = re.compile ( prompt ) if prompt != None else None
+
+        self.turnTimeout = turnTimeout
+
         self.outputQueue = Queue ()
-        self.inputQueue = Queue ()
+
+        #output after the last newline - kept until the line is complete
+        self._partialLine = ""
+
+        #set when the last of the game's output has been read
+        self.outputEnded = False
+
+        #output read ahead of time by warm_up
+        self._bufferedOutput = []
+
+        #True when the last turn read ended with the game waiting for input
+        self.atPrompt = False
+
+        #trace of the last command written.  The output read after it is
+        #traced as part of the same trace.
+        self.turnTrace = None
+
+        #event loop of the coroutine reading the output and the event the
+        #reactor thread sets on that loop when output arrives
+        self._loop = None
+        self._outputReady = None
 
     #------------------------------------------------------------------------
 
     def __enter__ ( self ):
 
-        self.subP = Popen ( ['dfrotz', self.gamePath ], 
-                            stdout = PIPE, stdin = PIPE, 
-                            universal_newlines = True,
-                            bufsize = 1                   )
+        if self.reactor == None:
 
-        self.outputThread = \
-                Thread ( target = read_subp_output, \
-                         args = ( self.subP.stdout, self.outputQueue ) )
-        
-        self.outputThread.daemon = True
-        self.outputThread.start ()
+            self.reactor = get_reactor ()
 
-        self.inputThread = \
-                Thread ( target = write_subp_input, \
-                         args = ( self.subP.stdin, self.inputQueue ) )
-        
-        self.inputThread.daemon = True
-        self.inputThread.start ()
+        self.subP = Popen ( self.interpreter + [ self.gamePath ], 
+                            stdout = PIPE, stdin = PIPE, 
+                            bufsize = 0                   )
+
+        self.reactor.add ( self, self.subP.stdout, self.subP.stdin )
 
         return self
 
@@ -70,12 +129,91 @@ class FrotzRunner:
         
         self.subP.kill ()
 
+        self.subP.wait ()
+
+        self.reactor.remove ( self )
+
+    #------------------------------------------------------------------------ 
+
+    def _on_output ( self, text ):
+        """
+        Called from the reactor thread with output from the game.  Each
+        complete line is put on the output queue.
+        """
+
+        lines = ( self._partialLine + text ).splitlines ( True )
+
+        self._partialLine = ""
+
+        if len ( lines ) > 0 and not lines [ -1 ].endswith ( "\n" ):
+
+            self._partialLine = lines.pop ()
+
+        for line in lines:
+
+            self.outputQueue.put ( line )
+
+        #the game is waiting for input so the turn's output is complete
+
+        if self.prompt != None and \
+           ( self.prompt.match ( self._partialLine ) or 
+             FILENAME_PROMPT.match ( self._partialLine ) ):
+
+            self._partialLine = ""
+
+            self.outputQueue.put ( PROMPT )
+
+        self._notify ()
+
+    #------------------------------------------------------------------------ 
+
+    def _on_eof ( self ):
+        """
+        Called from the reactor thread when the game closes its output.
+        """
+
+        if self._partialLine != "":
+
+            self.outputQueue.put ( self._partialLine )
+
+            self._partialLine = ""
+
+        self.outputQueue.put ( '' )
+
+        self._notify ()
+
+    #------------------------------------------------------------------------ 
+
+    def _notify ( self ):
+        """
+        Wakes a coroutine waiting in read_output_block_async.  Called from
+        the reactor thread after output is queued.
+        """
+
+        loop = self._loop
+
+        if loop == None:
+
+            return
+
+        try:
+
+            loop.call_soon_threadsafe ( self._outputReady.set )
+
+        #the loop has been closed
+        except RuntimeError:
+
+            pass
+
     #------------------------------------------------------------------------ 
 
-    def read_output_line  ( self ):
+    def read_output_line  ( self, timeout = 0 ):
 
         """
         Reads the latest line of output and returns it as a string.
+
+        timeout - how long to block waiting for a line.  The default of 0
+                  returns immediately.
         
         Throws Empty if there is no output available but the game 
         sub-process is still running.
@@ -87,9 +225,23 @@ class FrotzRunner:
         to check the game sub-process is running.
         """
 
-        line = self.outputQueue.get_nowait ()
+        if timeout > 0:
+
+            line = self.outputQueue.get ( timeout = timeout )
+
+        else:
+
+            line = self.outputQueue.get_nowait ()
+
+        #the caller is reading line by line so prompts are skipped
+
+        while line is PROMPT:
+
+            line = self.outputQueue.get_nowait ()
 
         if line == '':
+
+            self.outputEnded = True
             
             raise EOFError ()
 
@@ -99,10 +251,16 @@ class FrotzRunner:
 
     #------------------------------------------------------------------------
 
-    def read_output_block ( self, num_retry = 5, wait_time = 0.1 ):
+    def read_output_block ( self, num_retry = 5, wait_time = 0.1, 
+                            timeout = 0 ):
         """
         Tries to read a block of lines from the game sub-process.  
 
+        timeout - how long to block waiting for the first line of the
+                  block.  This lets a caller running in a worker thread
+                  wake as soon as the game prints something instead of
+                  polling.
+
         After reading each line the system will wait and try read again
         in case there are more lines of output that have been delayed by
         the game sub-process.
@@ -115,6 +273,109 @@ class FrotzRunner:
 
         It was designed not to throw an error so that the 'quit' message
         from the game would not be lost.
+
+        If the runner has a prompt the block ends as soon as the prompt is
+        seen and num_retry and wait_time are not used.
+        """
+
+        if len ( self._bufferedOutput ) > 0:
+
+            output_lines, self._bufferedOutput = self._bufferedOutput, []
+
+            return output_lines
+
+        start = time.perf_counter ()
+
+        #the reader is often started before the command it answers is
+        #written so the span is made once the output has arrived
+        traceStart = time.time ()
+
+        try:
+
+            if self.prompt != None:
+
+                output = self._read_turn ( timeout )
+
+            else:
+
+                output = self._read_lines ( num_retry, wait_time, timeout )
+
+        finally:
+
+            OUTPUT_WAIT_SECONDS.observe ( time.perf_counter () - start )
+
+        return self._end_block ( output, traceStart )
+
+    #------------------------------------------------------------------------
+
+    async def read_output_block_async ( self, num_retry = 5, wait_time = 0.1,
+                                        timeout = 0 ):
+        """
+        Reads a block of output in the same way as read_output_block from
+        a coroutine.  The reactor wakes the event loop when output arrives
+        so no thread is held while the game is waited for.
+
+        Only one coroutine should read the output at a time.
+        """
+
+        if len ( self._bufferedOutput ) > 0:
+
+            output_lines, self._bufferedOutput = self._bufferedOutput, []
+
+            return output_lines
+
+        start = time.perf_counter ()
+
+        traceStart = time.time ()
+
+        try:
+
+            if self.prompt != None:
+
+                output = await self._read_turn_async ( timeout )
+
+            else:
+
+                output = await self._read_lines_async ( num_retry, wait_time, 
+                                                        timeout )
+
+        finally:
+
+            OUTPUT_WAIT_SECONDS.observe ( time.perf_counter () - start )
+
+        return self._end_block ( output, traceStart )
+
+    #------------------------------------------------------------------------
+
+    def _end_block ( self, output, traceStart ):
+        """
+        Traces a block of output once it has been read and returns it.
+        """
+
+        span = tracing.TRACER.span ( "frotz.read_output",
+                                     tracing.TRACER.current () or 
+                                     self.turnTrace,
+                                     root = False, lines = len ( output ) )
+
+        if span.context != None:
+
+            span.start = traceStart
+
+        span.end ()
+
+        #the next block of output is not part of the command's turn
+        if len ( output ) > 0:
+
+            self.turnTrace = None
+
+        return output
+
+    #------------------------------------------------------------------------
+
+    def _read_lines ( self, num_retry, wait_time, timeout ):
+        """
+        Reads lines until no more output arrives after num_retry waits of
+        wait_time.
         """
 
         retries = num_retry
@@ -125,10 +386,15 @@ class FrotzRunner:
 
             try:
 
-                line = self.read_output_line () 
+                #only the first attempt waits for the timeout
+                line = self.read_output_line ( timeout ) 
+
+                timeout = 0
 
             except Empty:
 
+                timeout = 0
+
                 retries -= 1
                 time.sleep ( wait_time )
 
@@ -142,25 +408,321 @@ class FrotzRunner:
 
         return output_lines
 
+    async def _read_lines_async ( self, num_retry, wait_time, timeout ):
+
+        retries = num_retry
+
+        output_lines = []
+
+        while retries > 0:
+
+            try:
+
+                line = await self._get_async ( timeout ) 
+
+            except Empty:
+
+                retries -= 1
+                await asyncio.sleep ( wait_time )
+
+                line = None
+
+            timeout = 0
+
+            #the block is read line by line so prompts are skipped
+            if line == None or line is PROMPT:
+
+                continue
+
+            if line == '':
+
+                self.outputEnded = True
+
+                break
+
+            output_lines.append ( line )
+
+        return output_lines
+
+    #------------------------------------------------------------------------
+
+    def _read_turn ( self, timeout ):
+        """
+        Reads output up to the next prompt.
+
+        Waits up to timeout for the output to start and then up to the
+        runner's turnTimeout for the prompt.
+        """
+
+        output_lines = []
+
+        deadline = None
+
+        self.atPrompt = False
+
+        if self.outputEnded:
+
+            return output_lines
+
+        while True:
+
+            wait = self._turn_wait ( timeout, deadline )
+
+            if wait == None:
+
+                break
+
+            try:
+
+                if wait > 0:
+
+                    line = self.outputQueue.get ( timeout = wait )
+
+                else:
+
+                    line = self.outputQueue.get_nowait ()
+
+            except Empty:
+
+                break
+
+            if self._end_of_turn ( line ):
+
+                break
+
+            if deadline == None:
+
+                deadline = time.monotonic () + self.turnTimeout
+
+            output_lines.append ( line )
+
+        return output_lines
+
+    async def _read_turn_async ( self, timeout ):
+
+        output_lines = []
+
+        deadline = None
+
+        self.atPrompt = False
+
+        if self.outputEnded:
+
+            return output_lines
+
+        while True:
+
+            wait = self._turn_wait ( timeout, deadline )
+
+            if wait == None:
+
+                break
+
+            try:
+
+                line = await self._get_async ( wait )
+
+            except Empty:
+
+                break
+
+            if self._end_of_turn ( line ):
+
+                break
+
+            if deadline == None:
+
+                deadline = time.monotonic () + self.turnTimeout
+
+            output_lines.append ( line )
+
+        return output_lines
+
+    #------------------------------------------------------------------------
+
+    def _turn_wait ( self, timeout, deadline ):
+        """
+        Returns how long to wait for the next line of a turn or None once
+        the prompt has been waited for for turnTimeout.
+        """
+
+        if deadline == None:
+
+            return timeout
+
+        wait = deadline - time.monotonic ()
+
+        if wait <= 0:
+
+            logging.warning ( "No prompt after %ss of output.",
+                              self.turnTimeout )
+
+            return None
+
+        return wait
+
+    def _end_of_turn ( self, line ):
+        """
+        Returns True if the line read ends the turn i.e. it is the prompt
+        or the end of the output.
+        """
+
+        if line is PROMPT:
+
+            self.atPrompt = True
+
+            return True
+
+        if line == '':
+
+            self.outputEnded = True
+
+            return True
+
+        return False
+
+    #------------------------------------------------------------------------
+
+    async def _get_async ( self, wait ):
+        """
+        Returns the next item on the output queue.  Waits up to wait
+        seconds on the event loop and raises Empty if nothing arrives.
+        """
+
+        loop = asyncio.get_event_loop ()
+
+        if self._loop is not loop:
+
+            #the event is made before the reactor can see the loop
+            self._outputReady = asyncio.Event ()
+            self._loop = loop
+
+        deadline = time.monotonic () + wait
+
+        while True:
+
+            try:
+
+                return self.outputQueue.get_nowait ()
+
+            except Empty:
+
+                remaining = deadline - time.monotonic ()
+
+                if remaining <= 0:
+
+                    raise
+
+            #output queued from now on sets the event after it is cleared
+            #as the reactor's set runs on this loop
+            self._outputReady.clear ()
+
+            try:
+
+                await asyncio.wait_for ( self._outputReady.wait (), 
+                                         remaining )
+
+            except asyncio.TimeoutError:
+
+                pass
+
+    #------------------------------------------------------------------------
+
+    def warm_up ( self, timeout ):
+        """
+        Reads the game's opening output ahead of time so that it can be
+        returned straight away by the next call to read_output_block.
+
+        Returns True if the game printed its opening output and is still
+        running.
+        """
+
+        self._bufferedOutput = self.read_output_block ( timeout = timeout )
+
+        return len ( self._bufferedOutput ) > 0 and self.poll () == None
+
+    #------------------------------------------------------------------------
+
+    def save_game ( self, path ):
+        """
+        Saves the game to a Quetzal file using the game's own save 
+        command.  Returns True if the game reported that the save worked.
+
+        Only call this between turns - the save's output is read here so
+        nothing else should be reading the game's output at the time.
+        """
+
+        return command_succeeded ( self._file_command ( "save", path ) )
+
+    #------------------------------------------------------------------------
+
+    def restore_game ( self, path ):
+        """
+        Restores the game from a Quetzal file written by save_game.  
+        Returns True if the game reported that the restore worked.
+
+        The same restrictions as save_game apply.
+        """
+
+        return command_succeeded ( self._file_command ( "restore", path ) )
+
+    #------------------------------------------------------------------------
+
+    def _file_command ( self, cmd, path ):
+        """
+        Sends a command that asks for a file name and answers with path.
+        Returns the output after the file name was sent.
+        """
+
+        self.write_command ( cmd + "\n" )
+
+        self.read_output_block ( timeout = self.turnTimeout )
+
+        self.write_command ( path + "\n" )
+
+        return self.read_output_block ( timeout = self.turnTimeout )
+
     #------------------------------------------------------------------------
 
     def write_command ( self, cmd ):
         """
-        Sends a command to the game.
+        Sends a command to the game.  If the calling thread is in a trace
+        the output read next is traced as part of it.
         """
 
-        self.inputQueue.put ( cmd )
+        self.atPrompt = False
+
+        self.turnTrace = tracing.TRACER.current ()
+
+        with tracing.TRACER.span ( "frotz.write_command", root = False ):
+
+            self.reactor.write ( self, cmd.encode ( "utf-8" ) )
 
     #------------------------------------------------------------------------
 
-    def poll ( self ):
+    def poll ( self, wait = EXIT_WAIT ):
         """
         Returns None if the game sub-process is running.
 
         If the game sub-process has finished it returns the returncode
         of the sub-process.
+
+        wait - how long to wait for the game to exit once it has closed
+               its output.  Pass 0 to never block.
         """
 
+        #the game closed its output so it should be about to exit
+
+        if self.outputEnded:
+
+            try:
+
+                return self.subP.wait ( wait )
+
+            except TimeoutExpired:
+
+                return None
+
         return self.subP.poll ()
 
     #------------------------------------------------------------------------
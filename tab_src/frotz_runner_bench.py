@@ -0,0 +1,60 @@
+# frotz_runner_bench.py
+#
+# Benchmark for the game runner's I/O.
+#
+# Plays turns against fake_dfrotz so the time measured is the time taken
+# to send a command and read the output back.
+#
+# Usage: python3 frotz_runner_bench.py [turns] [output size] [latency]
+
+import sys, time
+
+import fake_dfrotz
+
+from frotz_runner import FrotzRunner
+
+#Commands played in a loop
+COMMANDS = [ "look\n", "go north\n", "go south\n", "xyzzy\n" ]
+
+#----------------------------------------------------------------------------
+
+def bench ( turns, outputSize, latency ):
+    """
+    Returns ( seconds, lines read ) for playing the turns.
+    """
+
+    interpreter = fake_dfrotz.interpreter_command ( latency, outputSize )
+
+    with FrotzRunner ( "story.z8", interpreter = interpreter ) as frotz:
+
+        frotz.read_output_block ( timeout = 5 )
+
+        lines = 0
+
+        start = time.perf_counter ()
+
+        for i in range ( turns ):
+
+            frotz.write_command ( COMMANDS [ i % len ( COMMANDS ) ] )
+
+            lines += len ( frotz.read_output_block ( timeout = 5 ) )
+
+        return time.perf_counter () - start, lines
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    turns = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else 10000
+    outputSize = int ( sys.argv [ 2 ] ) if len ( sys.argv ) > 2 else 0
+    latency = float ( sys.argv [ 3 ] ) if len ( sys.argv ) > 3 else 0
+
+    elapsed, lines = bench ( turns, outputSize, latency )
+
+    print ( "%10s %10s %10s %14s" % ( "turns", "lines", "s", "turns/s" ) )
+
+    print ( "%10d %10d %10.2f %14.0f" % 
+            ( turns, lines, elapsed, turns / elapsed ) )
+
+if __name__ == "__main__":
+    sys.exit ( main () )
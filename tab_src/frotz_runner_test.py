@@ -0,0 +1,131 @@
+#############################################################################
+# frotz_runner_test.py
+#----------------------------------------------------------------------------
+# Unit tests for splitting game output into turns.  Output is fed to the
+# runner directly so no dfrotz process is needed.
+#############################################################################
+
+import asyncio, threading
+
+from frotz_runner import *
+
+def test_read_output_block_prompt ():
+
+    testCases = \
+    [
+        {
+            "chunks" : [ "West of House\n", "\n>" ],
+            "out"    : [ "West of House\n", "\n" ]
+        },
+
+        {
+            "chunks" : [ "West of ", "House\n", "Mailbox\n\n> " ],
+            "out"    : [ "West of House\n", "Mailbox\n", "\n" ]
+        },
+
+        {
+            "chunks" : [ "Taken.\n>", "Dropped.\n>" ],
+            "out"    : [ "Taken.\n" ]
+        },
+
+        {
+            "chunks" : [ "a > b\n", ">\n" ],
+            "out"    : [ "a > b\n", ">\n" ]
+        },
+
+        {
+            "chunks" : [ "" ],
+            "out"    : []
+        }
+    ]
+
+    for tc in testCases:
+
+        runner = FrotzRunner ( "test.z8", turnTimeout = 0.1 )
+
+        for chunk in tc [ "chunks" ]:
+
+            runner._on_output ( chunk )
+
+        out = runner.read_output_block ()
+
+        assert ( out == tc [ "out" ] ), ( tc, out )
+
+#----------------------------------------------------------------------------
+
+def test_read_output_block_eof ():
+
+    runner = FrotzRunner ( "test.z8" )
+
+    runner._on_output ( "Bye" )
+    runner._on_eof ()
+
+    assert ( runner.read_output_block () == [ "Bye" ] )
+
+#----------------------------------------------------------------------------
+
+def test_read_output_block_custom_prompt ():
+
+    runner = FrotzRunner ( "test.z8", prompt = r"Filename: $" )
+
+    runner._on_output ( "Save where?\nFilename: " )
+
+    assert ( runner.read_output_block () == [ "Save where?\n" ] )
+
+#----------------------------------------------------------------------------
+
+def test_read_output_block_turn_timeout ():
+
+    runner = FrotzRunner ( "test.z8", turnTimeout = 0.05 )
+
+    runner._on_output ( "Thinking...\n" )
+
+    start = time.monotonic ()
+
+    assert ( runner.read_output_block () == [ "Thinking...\n" ] )
+
+    assert ( time.monotonic () - start < 1 )
+
+#----------------------------------------------------------------------------
+
+def test_command_succeeded ():
+
+    assert ( command_succeeded ( [ "Ok.\n", "\n" ] ) )
+    assert ( not command_succeeded ( [ "Save failed.\n" ] ) )
+    assert ( not command_succeeded ( [] ) )
+
+#----------------------------------------------------------------------------
+
+def test_read_output_block_async ():
+
+    runner = FrotzRunner ( "test.z8", turnTimeout = 1 )
+
+    loop = asyncio.new_event_loop ()
+
+    #output arrives on another thread as it does from the reactor
+    def game ():
+
+        time.sleep ( 0.05 )
+
+        runner._on_output ( "West of House\n" )
+        runner._on_output ( "\n>" )
+
+    try:
+
+        thread = threading.Thread ( target = game )
+        thread.start ()
+
+        start = time.monotonic ()
+
+        out = loop.run_until_complete ( 
+                runner.read_output_block_async ( timeout = 5 ) )
+
+        thread.join ()
+
+    finally:
+
+        loop.close ()
+
+    assert ( out == [ "West of House\n", "\n" ] )
+    assert ( runner.atPrompt )
+    assert ( time.monotonic () - start < 1 )
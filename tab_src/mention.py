@@ -0,0 +1,64 @@
+#############################################################################
+# mention.py
+#----------------------------------------------------------------------------
+# Record of a tweet that mentions the bot.
+#############################################################################
+
+import sys
+
+#----------------------------------------------------------------------------
+
+class Mention:
+    """
+    The parts of a mention used by the bot.
+
+    Uses __slots__ so that a large backlog of mentions takes up little
+    memory.  Usernames are interned so players who send many mentions
+    share one copy of their name.
+
+    text     - text of the tweet
+    id       - status ID of the tweet
+    username - screen name of the player who sent it
+    replyTo  - status ID the tweet replied to or None
+    """
+
+    __slots__ = ( "text", "id", "username", "replyTo" )
+
+    def __init__ ( self, text, statusID, username, replyTo = None ):
+
+        self.text = text
+        self.id = statusID
+        self.username = sys.intern ( username )
+        self.replyTo = replyTo
+
+    #------------------------------------------------------------------------
+
+    @classmethod
+    def from_status ( cls, status ):
+        """
+        Creates a Mention from a tweepy status.
+        """
+
+        return cls ( status.text, status.id, status.user.screen_name,
+                     status.in_reply_to_status_id )
+
+    #------------------------------------------------------------------------
+
+    def __eq__ ( self, other ):
+
+        if not isinstance ( other, Mention ):
+
+            return NotImplemented
+
+        return self.text == other.text and self.id == other.id and \
+               self.username == other.username and \
+               self.replyTo == other.replyTo
+
+    def __hash__ ( self ):
+
+        return hash ( self.id )
+
+    def __repr__ ( self ):
+
+        return "Mention ( %r, %r, %r, %r )" % ( self.text, self.id,
+                                               self.username, self.replyTo )
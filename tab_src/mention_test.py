@@ -0,0 +1,23 @@
+#############################################################################
+# mention_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the mention record.
+#############################################################################
+
+from mention import *
+
+def test_mention ():
+
+    a = Mention ( "cmd look", 1, "".join ( [ "play", "er" ] ) )
+    b = Mention ( "cmd look", 2, "".join ( [ "pla", "yer" ] ), 10 )
+
+    #usernames are shared between mentions
+    assert ( a.username is b.username )
+
+    assert ( a == Mention ( "cmd look", 1, "player" ) )
+    assert ( a != b )
+
+    assert ( b.replyTo == 10 )
+
+    #records have no per-instance dict
+    assert ( not hasattr ( a, "__dict__" ) )
@@ -0,0 +1,519 @@
+#############################################################################
+# metrics.py
+#----------------------------------------------------------------------------
+# Counters and histograms recorded by the bot and an HTTP server that
+# exports them in the Prometheus text format.
+#
+# Metrics are created once when a module is imported and updated where
+# the work happens e.g.
+#
+#   CALLS = metrics.REGISTRY.counter ( "tab_calls_total", "Calls made",
+#                                      ( "endpoint", ) )
+#
+#   CALLS.labels ( "statuses/update" ).inc ()
+#############################################################################
+
+import logging, threading
+
+from bisect import bisect_left
+from threading import get_ident
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+#----------------------------------------------------------------------------
+
+#Port the metrics are served on.  Only local connections are accepted.
+METRICS_PORT = 9464
+
+#Upper bounds of the histogram buckets used for durations in seconds
+DURATION_BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                     10, 30, 60 )
+
+#Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#----------------------------------------------------------------------------
+
+class _CounterValue:
+    """
+    Value of a counter for one set of labels.
+
+    Each thread adds to its own cell so no lock is taken when the counter
+    is updated.  A lock costs more than the rest of the update and
+    updates happen far more often than the value is read.
+    """
+
+    __slots__ = ( "_cells", )
+
+    def __init__ ( self ):
+
+        #thread ID -> [ total ]
+        self._cells = {}
+
+    def inc ( self, amount = 1 ):
+
+        cell = self._cells.get ( get_ident () )
+
+        if cell == None:
+
+            cell = self._cells.setdefault ( get_ident (), [ 0 ] )
+
+        cell [ 0 ] += amount
+
+    @property
+    def value ( self ):
+
+        return sum ( cell [ 0 ] for cell in list ( self._cells.values () ) )
+
+#----------------------------------------------------------------------------
+
+class _HistogramValue:
+    """
+    Value of a histogram for one set of labels.  Updated without a lock
+    in the same way as _CounterValue.
+    """
+
+    __slots__ = ( "bounds", "_cells" )
+
+    def __init__ ( self, bounds ):
+
+        self.bounds = bounds
+
+        #thread ID -> observations in each bucket followed by their sum.
+        #The last bucket is +Inf.
+        self._cells = {}
+
+    def observe ( self, value ):
+
+        cell = self._cells.get ( get_ident () )
+
+        if cell == None:
+
+            cell = self._cells.setdefault ( 
+                    get_ident (), [ 0 ] * ( len ( self.bounds ) + 1 ) + 
+                                  [ 0.0 ] )
+
+        cell [ bisect_left ( self.bounds, value ) ] += 1
+        cell [ -1 ] += value
+
+    def snapshot ( self ):
+        """
+        Returns ( cumulative bucket counts, sum, count ).
+        """
+
+        totals = [ 0 ] * ( len ( self.bounds ) + 1 ) + [ 0.0 ]
+
+        for cell in list ( self._cells.values () ):
+
+            for i, c in enumerate ( list ( cell ) ):
+
+                totals [ i ] += c
+
+        cumulative = []
+        running = 0
+
+        for c in totals [ : -1 ]:
+
+            running += c
+
+            cumulative.append ( running )
+
+        return cumulative, totals [ -1 ], running
+
+#----------------------------------------------------------------------------
+
+class _Metric:
+    """
+    A named metric with a value for each set of label values.  If the
+    metric has no labels inc and observe update its only value.
+    """
+
+    kind = None
+
+    def __init__ ( self, name, help, labelNames = () ):
+
+        self.name = name
+        self.help = help
+        self.labelNames = tuple ( labelNames )
+
+        self._lock = threading.Lock ()
+
+        #tuple of label values -> value
+        self._values = {}
+
+        if len ( self.labelNames ) == 0:
+
+            self._default = self.labels ()
+
+    #------------------------------------------------------------------------
+
+    def _new_value ( self ):
+
+        raise NotImplementedError ()
+
+    #------------------------------------------------------------------------
+
+    def labels ( self, *values ):
+        """
+        Returns the value for the label values given in the order of the
+        metric's label names.
+        """
+
+        value = self._values.get ( values )
+
+        if value != None:
+
+            return value
+
+        if len ( values ) != len ( self.labelNames ):
+
+            raise ValueError ( "%s takes labels %s" %
+                               ( self.name, self.labelNames ) )
+
+        with self._lock:
+
+            return self._values.setdefault ( values, self._new_value () )
+
+    #------------------------------------------------------------------------
+
+    def items ( self ):
+        """
+        Returns a list of ( label values, value ) sorted by label values.
+        """
+
+        with self._lock:
+
+            return sorted ( self._values.items () )
+
+#----------------------------------------------------------------------------
+
+class Counter ( _Metric ):
+    """
+    Count that only goes up e.g. the number of calls made.
+    """
+
+    kind = "counter"
+
+    def _new_value ( self ):
+
+        return _CounterValue ()
+
+    def __init__ ( self, name, help, labelNames = () ):
+
+        _Metric.__init__ ( self, name, help, labelNames )
+
+        #saves a call when the only value is updated
+        if len ( self.labelNames ) == 0:
+
+            self.inc = self._default.inc
+
+    def inc ( self, amount = 1 ):
+
+        self._default.inc ( amount )
+
+#----------------------------------------------------------------------------
+
+class Histogram ( _Metric ):
+    """
+    Counts observations e.g. durations in buckets so their distribution
+    can be seen.
+
+    buckets - upper bounds of the buckets in increasing order.  A +Inf
+              bucket is always added.
+    """
+
+    kind = "histogram"
+
+    def __init__ ( self, name, help, labelNames = (),
+                   buckets = DURATION_BUCKETS ):
+
+        self.buckets = tuple ( sorted ( buckets ) )
+
+        _Metric.__init__ ( self, name, help, labelNames )
+
+        if len ( self.labelNames ) == 0:
+
+            self.observe = self._default.observe
+
+    def _new_value ( self ):
+
+        return _HistogramValue ( self.buckets )
+
+    def observe ( self, value ):
+
+        self._default.observe ( value )
+
+#----------------------------------------------------------------------------
+
+class Registry:
+    """
+    Holds the metrics exported by the bot.
+    """
+
+    def __init__ ( self ):
+
+        self._lock = threading.Lock ()
+
+        #name -> metric in the order they were created
+        self._metrics = {}
+
+    #------------------------------------------------------------------------
+
+    def _add ( self, cls, name, *args, **kwargs ):
+
+        with self._lock:
+
+            metric = self._metrics.get ( name )
+
+            if metric == None:
+
+                metric = cls ( name, *args, **kwargs )
+
+                self._metrics [ name ] = metric
+
+            elif type ( metric ) != cls:
+
+                raise ValueError ( "%s is already a %s" %
+                                   ( name, metric.kind ) )
+
+            return metric
+
+    #------------------------------------------------------------------------
+
+    def counter ( self, name, help, labelNames = () ):
+        """
+        Returns the counter with the name creating it if needed.
+        """
+
+        return self._add ( Counter, name, help, labelNames )
+
+    def histogram ( self, name, help, labelNames = (),
+                    buckets = DURATION_BUCKETS ):
+        """
+        Returns the histogram with the name creating it if needed.
+        """
+
+        return self._add ( Histogram, name, help, labelNames, buckets )
+
+    #------------------------------------------------------------------------
+
+    def get ( self, name ):
+
+        with self._lock:
+
+            return self._metrics.get ( name )
+
+    #------------------------------------------------------------------------
+
+    def exposition ( self ):
+        """
+        Returns every metric in the Prometheus text format.
+        """
+
+        with self._lock:
+
+            metrics = list ( self._metrics.values () )
+
+        lines = []
+
+        for metric in metrics:
+
+            lines.append ( "# HELP %s %s" % ( metric.name,
+                                              escape_help ( metric.help ) ) )
+            lines.append ( "# TYPE %s %s" % ( metric.name, metric.kind ) )
+
+            for labelValues, value in metric.items ():
+
+                labels = list ( zip ( metric.labelNames, labelValues ) )
+
+                if metric.kind == "counter":
+
+                    lines.append ( sample ( metric.name, labels,
+                                            value.value ) )
+
+                    continue
+
+                cumulative, total, count = value.snapshot ()
+
+                bounds = [ format_value ( b ) for b in metric.buckets ]
+
+                for le, c in zip ( bounds + [ "+Inf" ], cumulative ):
+
+                    lines.append ( sample ( metric.name + "_bucket",
+                                            labels + [ ( "le", le ) ], c ) )
+
+                lines.append ( sample ( metric.name + "_sum", labels,
+                                        total ) )
+                lines.append ( sample ( metric.name + "_count", labels,
+                                        count ) )
+
+        return "\n".join ( lines ) + "\n"
+
+#----------------------------------------------------------------------------
+
+#Registry used by the bot's modules
+REGISTRY = Registry ()
+
+#----------------------------------------------------------------------------
+
+def format_value ( value ):
+
+    if isinstance ( value, int ):
+
+        return str ( value )
+
+    if value == float ( "inf" ):
+
+        return "+Inf"
+
+    return repr ( float ( value ) )
+
+#----------------------------------------------------------------------------
+
+def escape_help ( text ):
+
+    return text.replace ( "\\", "\\\\" ).replace ( "\n", "\\n" )
+
+#----------------------------------------------------------------------------
+
+def sample ( name, labels, value ):
+    """
+    Returns a sample line e.g. 'name{label="value"} 1'.
+    """
+
+    if len ( labels ) == 0:
+
+        return "%s %s" % ( name, format_value ( value ) )
+
+    pairs = [ '%s="%s"' % ( k, escape_help ( str ( v ) ).replace ( '"',
+                                                                  '\\"' ) )
+              for k, v in labels ]
+
+    return "%s{%s} %s" % ( name, ",".join ( pairs ), format_value ( value ) )
+
+#----------------------------------------------------------------------------
+
+class _Server ( ThreadingMixIn, HTTPServer ):
+
+    daemon_threads = True
+
+#----------------------------------------------------------------------------
+
+class _Handler ( BaseHTTPRequestHandler ):
+
+    def do_GET ( self ):
+
+        exporter = self.server.exporter
+
+        path = self.path.split ( "?", 1 ) [ 0 ]
+
+        if path == "/metrics":
+
+            status = 200
+            body = exporter.registry.exposition ()
+
+        elif path == "/health":
+
+            healthy = exporter.healthy ()
+
+            status = 200 if healthy else 503
+            body = "ok\n" if healthy else "unhealthy\n"
+
+        else:
+
+            status = 404
+            body = "not found\n"
+
+        data = body.encode ( "utf-8" )
+
+        self.send_response ( status )
+        self.send_header ( "Content-Type", CONTENT_TYPE )
+        self.send_header ( "Content-Length", str ( len ( data ) ) )
+        self.end_headers ()
+
+        self.wfile.write ( data )
+
+    def log_message ( self, format, *args ):
+
+        logging.debug ( "metrics: " + format, *args )
+
+#----------------------------------------------------------------------------
+
+class MetricsServer:
+    """
+    Serves the metrics of a registry over HTTP.
+
+    /metrics - every metric in the Prometheus text format
+
+    /health  - 200 if the health function returns True otherwise 503
+
+    health - function that returns True while the bot is working.  If not
+             given the bot is healthy while the server is running.
+    """
+
+    def __init__ ( self, registry = REGISTRY, host = "127.0.0.1",
+                   port = METRICS_PORT, health = None ):
+
+        self.registry = registry
+        self.health = health
+
+        self._server = _Server ( ( host, port ), _Handler )
+        self._server.exporter = self
+
+        self._thread = None
+
+    #------------------------------------------------------------------------
+
+    @property
+    def url ( self ):
+
+        host, port = self._server.server_address [ : 2 ]
+
+        return "http://%s:%d" % ( host, port )
+
+    #------------------------------------------------------------------------
+
+    def healthy ( self ):
+
+        if self.health == None:
+
+            return True
+
+        try:
+
+            return bool ( self.health () )
+
+        except Exception:
+
+            logging.error ( "Health check failed", exc_info = True )
+
+            return False
+
+    #------------------------------------------------------------------------
+
+    def start ( self ):
+
+        self._thread = threading.Thread ( target = self._server.serve_forever,
+                                          name = "metrics",
+                                          daemon = True )
+        self._thread.start ()
+
+        return self
+
+    def stop ( self ):
+
+        self._server.shutdown ()
+        self._server.server_close ()
+
+        if self._thread != None:
+
+            self._thread.join ()
+
+    def __enter__ ( self ):
+
+        return self.start ()
+
+    def __exit__ ( self, *args ):
+
+        self.stop ()
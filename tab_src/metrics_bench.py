@@ -0,0 +1,59 @@
+# metrics_bench.py
+#
+# Benchmark for recording metrics.
+#
+# Measures the time taken by one counter increment or histogram observation
+# in the ways the bot records them.
+#
+# Usage: python3 metrics_bench.py [observations]
+
+import sys, time
+
+from metrics import Registry
+
+#----------------------------------------------------------------------------
+
+def bench ( record, n ):
+    """
+    Returns the nanoseconds taken by each call to record.
+    """
+
+    start = time.perf_counter ()
+
+    for i in range ( n ):
+
+        record ()
+
+    return 1e9 * ( time.perf_counter () - start ) / n
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    n = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else 1000000
+
+    registry = Registry ()
+
+    counter = registry.counter ( "counter_total", "counter" )
+    histogram = registry.histogram ( "histogram_seconds", "histogram" )
+
+    calls = registry.counter ( "calls_total", "calls", 
+                               ( "endpoint", "outcome" ) )
+    waits = registry.histogram ( "waits_seconds", "waits", ( "endpoint", ) )
+
+    cases = [ ( "empty loop", lambda: None ),
+              ( "counter", counter.inc ),
+              ( "histogram", lambda: histogram.observe ( 0.03 ) ),
+              ( "labelled counter", 
+                lambda: calls.labels ( "statuses/update", "ok" ).inc () ),
+              ( "labelled histogram", 
+                lambda: waits.labels ( "statuses/update" ).observe ( 0.03 ) ) ]
+
+    print ( "%20s %10s" % ( "metric", "ns/call" ) )
+
+    for name, record in cases:
+
+        print ( "%20s %10.0f" % ( name, bench ( record, n ) ) )
+
+if __name__ == "__main__":
+    sys.exit ( main () )
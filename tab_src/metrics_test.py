@@ -0,0 +1,120 @@
+#############################################################################
+# metrics_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the metrics registry and exporter.
+#############################################################################
+
+import threading
+
+import pytest
+import requests
+
+from metrics import *
+
+#----------------------------------------------------------------------------
+
+def test_exposition ():
+
+    registry = Registry ()
+
+    calls = registry.counter ( "calls_total", "Calls made", 
+                               ( "endpoint", "outcome" ) )
+
+    waits = registry.histogram ( "wait_seconds", "Time waited",
+                                 buckets = ( 0.1, 1 ) )
+
+    calls.labels ( "statuses/update", "ok" ).inc ()
+    calls.labels ( "statuses/update", "ok" ).inc ( 2 )
+    calls.labels ( 'a"b', "error" ).inc ()
+
+    for value in [ 0.05, 0.1, 0.5, 5 ]:
+
+        waits.observe ( value )
+
+    assert ( registry.exposition () ==
+             "# HELP calls_total Calls made\n"
+             "# TYPE calls_total counter\n"
+             'calls_total{endpoint="a\\"b",outcome="error"} 1\n'
+             'calls_total{endpoint="statuses/update",outcome="ok"} 3\n'
+             "# HELP wait_seconds Time waited\n"
+             "# TYPE wait_seconds histogram\n"
+             'wait_seconds_bucket{le="0.1"} 2\n'
+             'wait_seconds_bucket{le="1"} 3\n'
+             'wait_seconds_bucket{le="+Inf"} 4\n'
+             "wait_seconds_sum 5.65\n"
+             "wait_seconds_count 4\n" )
+
+#----------------------------------------------------------------------------
+
+def test_registry ():
+
+    registry = Registry ()
+
+    counter = registry.counter ( "x_total", "x", ( "a", ) )
+
+    #the same metric is returned when a module asks for it again
+    assert ( registry.counter ( "x_total", "x", ( "a", ) ) is counter )
+
+    with pytest.raises ( ValueError ):
+
+        registry.histogram ( "x_total", "x" )
+
+    with pytest.raises ( ValueError ):
+
+        counter.labels ( "1", "2" )
+
+#----------------------------------------------------------------------------
+
+def test_counter_threads ():
+
+    registry = Registry ()
+
+    counter = registry.counter ( "x_total", "x" )
+    histogram = registry.histogram ( "y_seconds", "y" )
+
+    def work ():
+
+        for i in range ( 10000 ):
+
+            counter.inc ()
+            histogram.observe ( 1 )
+
+    threads = [ threading.Thread ( target = work ) for i in range ( 8 ) ]
+
+    for t in threads:
+
+        t.start ()
+
+    for t in threads:
+
+        t.join ()
+
+    assert ( "x_total 80000\n" in registry.exposition () )
+    assert ( "y_seconds_count 80000\n" in registry.exposition () )
+
+#----------------------------------------------------------------------------
+
+def test_metrics_server ():
+
+    registry = Registry ()
+
+    registry.counter ( "x_total", "x" ).inc ()
+
+    healthy = [ True ]
+
+    with MetricsServer ( registry, port = 0, 
+                         health = lambda: healthy [ 0 ] ) as server:
+
+        response = requests.get ( server.url + "/metrics" )
+
+        assert ( response.status_code == 200 )
+        assert ( response.headers [ "Content-Type" ] == CONTENT_TYPE )
+        assert ( "x_total 1\n" in response.text )
+
+        assert ( requests.get ( server.url + "/health" ).status_code == 200 )
+
+        healthy [ 0 ] = False
+
+        assert ( requests.get ( server.url + "/health" ).status_code == 503 )
+
+        assert ( requests.get ( server.url + "/other" ).status_code == 404 )
@@ -0,0 +1,384 @@
+#############################################################################
+# outbox.py
+#----------------------------------------------------------------------------
+# Queue of tweet chains waiting to be posted.  The queue is kept in the
+# state database so chains that were not finished are posted after a
+# restart.
+#############################################################################
+
+import json, sqlite3, threading, logging
+
+from concurrent.futures import Future
+
+import tracing
+
+#----------------------------------------------------------------------------
+
+#Failed attempts to post a single tweet before the rest of its chain is
+#dropped
+MAX_SEND_ATTEMPTS = 10
+
+#Wait between attempts when no retryDelay function is given
+SEND_RETRY_DELAY = 1
+
+#----------------------------------------------------------------------------
+
+class TweetRefused ( Exception ):
+    """
+    Raised by the send function when twitter will never accept a tweet
+    e.g. a duplicate status.
+    """
+
+#----------------------------------------------------------------------------
+
+class Outbox:
+    """
+    Posts chains of tweets from a background thread.
+
+    Each chain is a list of tweets where every tweet replies to the one
+    before it.  Chains are posted one at a time in the order they were
+    queued so the tweets of a chain are never mixed up.
+
+    Chains can belong to a thread e.g. the game being played.  A chain that
+    follows its thread replies to the last tweet posted in that thread so
+    that output carries on from the previous chain.
+
+    The position in each chain is saved after every tweet so a restart
+    carries on from the next tweet instead of posting the chain again.
+
+    send       - function called as send ( text, replyID ) that posts a
+                 tweet and returns its status ID or None if it failed.
+                 It raises TweetRefused if trying again will not help and
+                 the rest of the chain is dropped straight away.
+
+    retryDelay - function that returns how long to wait after a failed
+                 attempt
+    """
+
+    def __init__ ( self, path, send, retryDelay = lambda: SEND_RETRY_DELAY,
+                   maxAttempts = MAX_SEND_ATTEMPTS ):
+
+        self.send = send
+        self.retryDelay = retryDelay
+        self.maxAttempts = maxAttempts
+
+        self._lock = threading.Lock ()
+
+        #notified when a chain is queued or the outbox closes
+        self._wake = threading.Condition ( self._lock )
+
+        self._closed = False
+
+        self._thread = None
+
+        #chain id -> Future for chains queued since the outbox was opened
+        self._futures = {}
+
+        #chain id -> tracing.SpanContext of chains queued in a trace.  Not
+        #saved so chains posted after a restart are not traced.
+        self._traces = {}
+
+        self._db = sqlite3.connect ( path, check_same_thread = False )
+
+        self._db.execute ( "PRAGMA journal_mode=WAL" )
+
+        self._db.execute ( "CREATE TABLE IF NOT EXISTS outbox "
+                           "( id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "thread TEXT, follow INTEGER, reply_id INTEGER, "
+                           "messages TEXT, status_ids TEXT )" )
+
+        #the last status posted in each thread
+        self._db.execute ( "CREATE TABLE IF NOT EXISTS outbox_threads "
+                           "( thread TEXT PRIMARY KEY, tail INTEGER )" )
+
+        self._db.commit ()
+
+    #------------------------------------------------------------------------
+
+    def start ( self ):
+        """
+        Starts the thread that posts the queued chains.
+        """
+
+        self._thread = threading.Thread ( target = self._run,
+                                          name = "outbox", daemon = True )
+
+        self._thread.start ()
+
+    #------------------------------------------------------------------------
+
+    def close ( self ):
+        """
+        Stops the sender once the tweet it is posting is done.  Chains that
+        have not been posted stay in the database.
+        """
+
+        with self._lock:
+
+            self._closed = True
+
+            self._wake.notify_all ()
+
+        if self._thread != None:
+
+            self._thread.join ()
+
+        with self._lock:
+
+            for future in self._futures.values ():
+
+                future.cancel ()
+
+            self._futures.clear ()
+
+            self._traces.clear ()
+
+            self._db.close ()
+
+    #------------------------------------------------------------------------
+
+    def put ( self, messages, replyID = None, thread = None, follow = False,
+              trace = None ):
+        """
+        Queues a chain of tweets.
+
+        replyID - status the first tweet replies to
+
+        thread  - name of the thread the chain belongs to
+
+        follow  - if True and there is no replyID the first tweet replies
+                  to the last tweet posted in the thread
+
+        trace   - tracing.SpanContext the posting of the chain is traced
+                  under
+
+        Returns a Future that gives the list of status IDs posted.  The
+        list is shorter than messages if the chain could not be finished.
+        """
+
+        future = Future ()
+
+        if len ( messages ) == 0:
+
+            future.set_result ( [] )
+
+            return future
+
+        with self._lock:
+
+            if self._closed:
+
+                raise RuntimeError ( "Outbox is closed" )
+
+            with self._db:
+
+                cursor = self._db.execute (
+                    "INSERT INTO outbox ( thread, follow, reply_id, "
+                    "messages, status_ids ) VALUES ( ?, ?, ?, ?, ? )",
+                    ( thread_key ( thread ), int ( follow ), replyID,
+                      json.dumps ( messages ), "[]" ) )
+
+            self._futures [ cursor.lastrowid ] = future
+
+            if trace != None:
+
+                self._traces [ cursor.lastrowid ] = trace
+
+            self._wake.notify_all ()
+
+        return future
+
+    #------------------------------------------------------------------------
+
+    def pending ( self ):
+        """
+        Returns the number of chains that have not been finished.
+        """
+
+        with self._lock:
+
+            return self._db.execute (
+                    "SELECT COUNT(*) FROM outbox" ).fetchone () [ 0 ]
+
+    #------------------------------------------------------------------------
+
+    def tail ( self, thread ):
+        """
+        Returns the last status posted in a thread or None.
+        """
+
+        with self._lock:
+
+            return self._tail ( thread_key ( thread ) )
+
+    def _tail ( self, thread ):
+
+        row = self._db.execute ( "SELECT tail FROM outbox_threads "
+                                 "WHERE thread = ?", ( thread, ) ).fetchone ()
+
+        return None if row == None else row [ 0 ]
+
+    #------------------------------------------------------------------------
+
+    def _next_chain ( self ):
+        """
+        Waits for the oldest unfinished chain.  Returns None once the
+        outbox is closed.
+        """
+
+        with self._lock:
+
+            while not self._closed:
+
+                row = self._db.execute (
+                        "SELECT id, thread, follow, reply_id, messages, "
+                        "status_ids FROM outbox ORDER BY id LIMIT 1"
+                        ).fetchone ()
+
+                if row != None:
+
+                    chainID, thread, follow, replyID, messages, statusIDs = \
+                            row
+
+                    messages = json.loads ( messages )
+                    statusIDs = json.loads ( statusIDs )
+
+                    if follow and replyID == None and len ( statusIDs ) == 0:
+
+                        replyID = self._tail ( thread )
+
+                    return chainID, thread, replyID, messages, statusIDs
+
+                self._wake.wait ()
+
+        return None
+
+    #------------------------------------------------------------------------
+
+    def _run ( self ):
+
+        while True:
+
+            chain = self._next_chain ()
+
+            if chain == None:
+
+                return
+
+            with self._lock:
+
+                trace = self._traces.pop ( chain [ 0 ], None )
+
+            with tracing.TRACER.span ( "outbox.post_chain", trace, 
+                                       root = False ) as span:
+
+                span.set ( "tweets", len ( chain [ 3 ] ) )
+
+                posted = self._post_chain ( *chain )
+
+            if not posted:
+
+                return
+
+    #------------------------------------------------------------------------
+
+    def _post_chain ( self, chainID, thread, replyID, messages, statusIDs ):
+        """
+        Posts the tweets of a chain that have not been posted yet.  Returns
+        False if the outbox was closed part way through.
+        """
+
+        for msg in messages [ len ( statusIDs ) : ]:
+
+            status = None
+
+            attempt = 0
+
+            while status == None:
+
+                logging.info ( "Sending Message: "+msg )
+
+                try:
+
+                    status = self.send ( msg, replyID )
+
+                except TweetRefused as e:
+
+                    logging.error ( "Tweet refused ( %s ) - dropping:\n%s",
+                                    e, "\n".join ( messages [
+                                            len ( statusIDs ) : ] ) )
+
+                    self._finish ( chainID, statusIDs )
+
+                    return True
+
+                if status != None:
+
+                    break
+
+                attempt += 1
+
+                if attempt >= self.maxAttempts:
+
+                    logging.critical ( "Failed to send tweets:\n" +
+                                       "\n".join ( messages [
+                                                len ( statusIDs ) : ] ) )
+
+                    self._finish ( chainID, statusIDs )
+
+                    return True
+
+                #wait without stopping close from ending the thread
+                with self._lock:
+
+                    if self._closed:
+
+                        return False
+
+                    self._wake.wait ( self.retryDelay () )
+
+            replyID = status
+
+            statusIDs.append ( status )
+
+            with self._lock, self._db:
+
+                self._db.execute ( "UPDATE outbox SET reply_id = ?, "
+                                   "status_ids = ? WHERE id = ?",
+                                   ( replyID, json.dumps ( statusIDs ),
+                                     chainID ) )
+
+                self._db.execute ( "INSERT OR REPLACE INTO outbox_threads "
+                                   "( thread, tail ) VALUES ( ?, ? )",
+                                   ( thread, replyID ) )
+
+        self._finish ( chainID, statusIDs )
+
+        return True
+
+    #------------------------------------------------------------------------
+
+    def _finish ( self, chainID, statusIDs ):
+
+        with self._lock:
+
+            with self._db:
+
+                self._db.execute ( "DELETE FROM outbox WHERE id = ?",
+                                   ( chainID, ) )
+
+            future = self._futures.pop ( chainID, None )
+
+        if future != None:
+
+            future.set_result ( statusIDs )
+
+#----------------------------------------------------------------------------
+
+def thread_key ( thread ):
+    """
+    Threads are stored by name - chains without a thread share the thread
+    named ''.
+    """
+
+    return "" if thread == None else thread
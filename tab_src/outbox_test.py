@@ -0,0 +1,158 @@
+#############################################################################
+# outbox_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the outbound tweet queue.
+#############################################################################
+
+import os, threading
+
+from outbox import *
+
+class FakeTwitter:
+    """
+    Records the tweets posted.  Posting fails while failing is set and
+    is refused while refusing is set.
+    """
+
+    def __init__ ( self ):
+
+        self.posted = []
+
+        self.failing = False
+        self.refusing = False
+
+        self.attempts = 0
+
+        self.lock = threading.Lock ()
+
+    def send ( self, text, replyID ):
+
+        with self.lock:
+
+            self.attempts += 1
+
+            if self.refusing:
+
+                raise TweetRefused ( "duplicate" )
+
+            if self.failing:
+
+                return None
+
+            statusID = 100 + len ( self.posted )
+
+            self.posted.append ( ( text, replyID, statusID ) )
+
+            return statusID
+
+#----------------------------------------------------------------------------
+
+def test_outbox_chains ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "state.db" )
+
+    twitter = FakeTwitter ()
+
+    outbox = Outbox ( path, twitter.send, lambda: 0 )
+
+    outbox.start ()
+
+    header = outbox.put ( [ "start" ], thread = "advent" )
+    output = outbox.put ( [ "a", "b" ], thread = "advent", follow = True )
+    other = outbox.put ( [ "c" ], replyID = 7 )
+
+    assert ( header.result ( 5 ) == [ 100 ] )
+    assert ( output.result ( 5 ) == [ 101, 102 ] )
+    assert ( other.result ( 5 ) == [ 103 ] )
+
+    assert ( outbox.put ( [] ).result ( 5 ) == [] )
+
+    #each tweet replies to the one before it and output follows the header
+    assert ( twitter.posted == [ ( "start", None, 100 ),
+                                 ( "a",     100,  101 ),
+                                 ( "b",     101,  102 ),
+                                 ( "c",     7,    103 ) ] )
+
+    assert ( outbox.tail ( "advent" ) == 102 )
+    assert ( outbox.pending () == 0 )
+
+    outbox.close ()
+
+#----------------------------------------------------------------------------
+
+def test_outbox_gives_up ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "state.db" )
+
+    twitter = FakeTwitter ()
+    twitter.failing = True
+
+    outbox = Outbox ( path, twitter.send, lambda: 0, maxAttempts = 3 )
+
+    outbox.start ()
+
+    assert ( outbox.put ( [ "a", "b" ] ).result ( 5 ) == [] )
+
+    #the next chain is not held up by the failed one
+    twitter.failing = False
+
+    assert ( outbox.put ( [ "c" ] ).result ( 5 ) == [ 100 ] )
+
+    outbox.close ()
+
+#----------------------------------------------------------------------------
+
+def test_outbox_drops_refused ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "state.db" )
+
+    twitter = FakeTwitter ()
+    twitter.refusing = True
+
+    outbox = Outbox ( path, twitter.send, lambda: 0, maxAttempts = 3 )
+
+    outbox.start ()
+
+    #a refused tweet is not tried again
+    assert ( outbox.put ( [ "a", "b" ] ).result ( 5 ) == [] )
+    assert ( twitter.attempts == 1 )
+
+    twitter.refusing = False
+
+    assert ( outbox.put ( [ "c" ] ).result ( 5 ) == [ 100 ] )
+    assert ( outbox.pending () == 0 )
+
+    outbox.close ()
+
+#----------------------------------------------------------------------------
+
+def test_outbox_survives_restart ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "state.db" )
+
+    twitter = FakeTwitter ()
+
+    #queue chains without a sender as if the bot stopped before posting
+
+    outbox = Outbox ( path, twitter.send )
+
+    outbox.put ( [ "start" ], thread = "advent" )
+    outbox.put ( [ "a" ], thread = "advent", follow = True )
+
+    outbox.close ()
+
+    outbox = Outbox ( path, twitter.send, lambda: 0 )
+
+    assert ( outbox.pending () == 2 )
+
+    outbox.start ()
+
+    last = outbox.put ( [ "b" ], thread = "advent", follow = True )
+
+    assert ( last.result ( 5 ) == [ 102 ] )
+
+    assert ( twitter.posted == [ ( "start", None, 100 ),
+                                 ( "a",     100,  101 ),
+                                 ( "b",     101,  102 ) ] )
+
+    outbox.close ()
@@ -0,0 +1,102 @@
+# pack_messages_bench.py
+#
+# Benchmark for packing game output into tweets.
+#
+# Usage: python3 pack_messages_bench.py [repeats]
+
+import sys, time, random, tracemalloc
+
+from twitter_connection import iter_pack_messages
+
+#Output sizes to benchmark in bytes
+SIZES = [ 1024, 10*1024, 100*1024, 1024*1024 ]
+
+WORDS = [ "You", "are", "standing", "at", "the", "end", "of", "a", "road",
+          "before", "small", "brick", "building.", "Around", "you", "is",
+          "forest.", "A", "stream", "flows", "out", "the", "building",
+          "and", "down", "gully.", "\n" ]
+
+#----------------------------------------------------------------------------
+
+def make_output ( size ):
+    """
+    Returns a list of lines of game-like text about size bytes long.
+    """
+
+    random.seed ( size )
+
+    lines = []
+    line = []
+    total = 0
+
+    while total < size:
+
+        word = random.choice ( WORDS )
+
+        total += len ( word ) + 1
+
+        if word == "\n":
+
+            lines.append ( " ".join ( line ) + "\n" )
+            line = []
+
+        else:
+
+            line.append ( word )
+
+    lines.append ( " ".join ( line ) )
+
+    return lines
+
+#----------------------------------------------------------------------------
+
+def bench ( lines, repeats ):
+    """
+    Returns ( best time in seconds, number of tweets, peak memory ) for
+    packing the lines.
+    """
+
+    best = None
+
+    for i in range ( repeats ):
+
+        start = time.perf_counter ()
+
+        count = sum ( 1 for tweet in iter_pack_messages ( lines ) )
+
+        elapsed = time.perf_counter () - start
+
+        best = elapsed if best == None else min ( best, elapsed )
+
+    tracemalloc.start ()
+
+    for tweet in iter_pack_messages ( lines ):
+
+        pass
+
+    peak = tracemalloc.get_traced_memory () [ 1 ]
+
+    tracemalloc.stop ()
+
+    return best, count, peak
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    repeats = int ( sys.argv [ 1 ] ) if len ( sys.argv ) > 1 else 5
+
+    print ( "%10s %10s %10s %10s %12s" %
+            ( "bytes", "tweets", "ms", "MB/s", "peak bytes" ) )
+
+    for size in SIZES:
+
+        lines = make_output ( size )
+
+        best, count, peak = bench ( lines, repeats )
+
+        print ( "%10d %10d %10.2f %10.2f %12d" %
+                ( size, count, best * 1000, size / best / 1e6, peak ) )
+
+if __name__ == "__main__":
+    sys.exit ( main () )
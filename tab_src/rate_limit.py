@@ -0,0 +1,130 @@
+#############################################################################
+# rate_limit.py
+#----------------------------------------------------------------------------
+# Keeps track of the twitter API rate limits so calls can wait for the
+# limit to reset instead of being refused.
+#############################################################################
+
+import time, logging, threading
+
+#----------------------------------------------------------------------------
+
+#Extra time waited after a reset time to allow for clock differences
+RESET_MARGIN = 2
+
+#----------------------------------------------------------------------------
+
+class RateLimitBudget:
+    """
+    Records the calls left for each API endpoint from the
+    x-rate-limit-remaining and x-rate-limit-reset response headers.
+
+    delay returns how long a caller should wait before using an endpoint
+    so that the last call of a window is never exceeded.
+
+    reserve - calls kept back in each window e.g. for manual use of the
+              account
+    """
+
+    def __init__ ( self, reserve = 0, clock = time.time ):
+
+        self.reserve = reserve
+
+        self._clock = clock
+
+        self._lock = threading.Lock ()
+
+        #endpoint -> [ calls remaining, reset time ( epoch seconds ) ]
+        self._limits = {}
+
+    #------------------------------------------------------------------------
+
+    def update ( self, endpoint, headers ):
+        """
+        Records the rate limit headers of a response.  Responses without
+        the headers are ignored.
+        """
+
+        if headers == None:
+
+            return
+
+        remaining = headers.get ( "x-rate-limit-remaining" )
+        reset = headers.get ( "x-rate-limit-reset" )
+
+        if remaining == None or reset == None:
+
+            return
+
+        with self._lock:
+
+            self._limits [ endpoint ] = [ int ( remaining ), int ( reset ) ]
+
+    #------------------------------------------------------------------------
+
+    def exhausted ( self, endpoint, headers = None, retryAfter = None ):
+        """
+        Records that the endpoint refused a call because of the rate limit.
+
+        Returns the reset time if it is known from the headers or
+        retryAfter ( seconds ) otherwise None.
+        """
+
+        self.update ( endpoint, headers )
+
+        with self._lock:
+
+            limit = self._limits.get ( endpoint )
+
+            if limit != None:
+
+                limit [ 0 ] = 0
+
+            elif retryAfter != None:
+
+                limit = [ 0, int ( self._clock () + retryAfter ) ]
+
+                self._limits [ endpoint ] = limit
+
+            else:
+
+                return None
+
+            return limit [ 1 ]
+
+    #------------------------------------------------------------------------
+
+    def delay ( self, endpoint ):
+        """
+        Returns how many seconds to wait before calling the endpoint.
+
+        Each call counts against the budget so callers should call the
+        endpoint once for each delay they ask for.
+        """
+
+        with self._lock:
+
+            limit = self._limits.get ( endpoint )
+
+            if limit == None:
+
+                return 0
+
+            remaining, reset = limit
+
+            now = self._clock ()
+
+            #a new window has started
+            if now >= reset + RESET_MARGIN:
+
+                del self._limits [ endpoint ]
+
+                return 0
+
+            if remaining > self.reserve:
+
+                limit [ 0 ] -= 1
+
+                return 0
+
+            return reset + RESET_MARGIN - now
@@ -0,0 +1,65 @@
+#############################################################################
+# rate_limit_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the rate limit budget.
+#############################################################################
+
+from rate_limit import *
+
+def test_budget ():
+
+    now = [ 1000 ]
+
+    budget = RateLimitBudget ( clock = lambda: now [ 0 ] )
+
+    #unknown endpoints are not delayed
+    assert ( budget.delay ( "mentions" ) == 0 )
+
+    budget.update ( "mentions", { "x-rate-limit-remaining" : "2",
+                                  "x-rate-limit-reset"     : "1900" } )
+
+    #responses without headers do not change the budget
+    budget.update ( "mentions", {} )
+    budget.update ( "mentions", None )
+
+    assert ( budget.delay ( "mentions" ) == 0 )
+    assert ( budget.delay ( "mentions" ) == 0 )
+
+    #the budget is used up so wait until it resets
+    assert ( budget.delay ( "mentions" ) == 900 + RESET_MARGIN )
+
+    #other endpoints are not affected
+    assert ( budget.delay ( "update" ) == 0 )
+
+    now [ 0 ] = 1900 + RESET_MARGIN
+
+    assert ( budget.delay ( "mentions" ) == 0 )
+
+#----------------------------------------------------------------------------
+
+def test_budget_reserve ():
+
+    budget = RateLimitBudget ( reserve = 1, clock = lambda: 0 )
+
+    budget.update ( "mentions", { "x-rate-limit-remaining" : "2",
+                                  "x-rate-limit-reset"     : "60" } )
+
+    assert ( budget.delay ( "mentions" ) == 0 )
+    assert ( budget.delay ( "mentions" ) == 60 + RESET_MARGIN )
+
+#----------------------------------------------------------------------------
+
+def test_budget_exhausted ():
+
+    budget = RateLimitBudget ( clock = lambda: 100 )
+
+    assert ( budget.exhausted ( "update" ) == None )
+
+    assert ( budget.exhausted ( "update", retryAfter = 30 ) == 130 )
+    assert ( budget.delay ( "update" ) == 30 + RESET_MARGIN )
+
+    budget.update ( "mentions", { "x-rate-limit-remaining" : "10",
+                                  "x-rate-limit-reset"     : "500" } )
+
+    assert ( budget.exhausted ( "mentions" ) == 500 )
+    assert ( budget.delay ( "mentions" ) == 400 + RESET_MARGIN )
@@ -0,0 +1,196 @@
+#############################################################################
+# retry_policy.py
+#----------------------------------------------------------------------------
+# Decides how long to wait before retrying a failed twitter API call and
+# when to stop calling an endpoint that keeps failing.
+#############################################################################
+
+import time, random, logging, threading
+
+#----------------------------------------------------------------------------
+
+#First retry waits up to this long - the wait doubles for each attempt
+BASE_RETRY_DELAY = 1
+
+#Longest wait between two attempts
+MAX_RETRY_DELAY = 5*60
+
+#Attempts made for a single call before giving up
+MAX_ATTEMPTS = 5
+
+#Failed attempts in a row before an endpoint's circuit opens.  Each
+#attempt counts so this is well above MAX_ATTEMPTS - one call running out
+#of retries does not open the circuit on its own.
+FAILURE_THRESHOLD = 3 * MAX_ATTEMPTS
+
+#How long an open circuit waits before letting a test call through.  The
+#wait doubles each time the test call fails.
+RESET_TIMEOUT = 30
+
+MAX_RESET_TIMEOUT = 30*60
+
+#----------------------------------------------------------------------------
+
+class RetryPolicy:
+    """
+    Exponential backoff with 'full jitter' - the wait before a retry is a
+    random time up to a limit that doubles with each attempt.  The random
+    spread stops retries from many callers lining up.
+    """
+
+    def __init__ ( self, baseDelay = BASE_RETRY_DELAY,
+                   maxDelay = MAX_RETRY_DELAY, maxAttempts = MAX_ATTEMPTS,
+                   random = random.random ):
+
+        assert maxAttempts > 0
+
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.maxAttempts = maxAttempts
+
+        self._random = random
+
+    #------------------------------------------------------------------------
+
+    def delay ( self, attempt ):
+        """
+        Returns how long to wait after the given attempt ( counting from 0 )
+        failed.
+        """
+
+        limit = min ( self.maxDelay, self.baseDelay * 2 ** attempt )
+
+        return self._random () * limit
+
+#----------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    Stops calls to an endpoint that keeps failing.
+
+    CLOSED    - calls are made as normal.  After FAILURE_THRESHOLD failures
+                in a row the circuit opens.
+
+    OPEN      - calls are refused straight away until the reset timeout
+                has passed.
+
+    HALF_OPEN - a single test call is let through.  If it works the
+                circuit closes, otherwise it opens again with a longer
+                timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__ ( self, name = None, failureThreshold = FAILURE_THRESHOLD,
+                   resetTimeout = RESET_TIMEOUT,
+                   maxResetTimeout = MAX_RESET_TIMEOUT,
+                   clock = time.monotonic ):
+
+        self.name = name
+
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.maxResetTimeout = maxResetTimeout
+
+        self._clock = clock
+
+        self._lock = threading.Lock ()
+
+        self.state = CircuitBreaker.CLOSED
+
+        self._failures = 0
+
+        self._timeout = resetTimeout
+
+        self._openedAt = None
+
+    #------------------------------------------------------------------------
+
+    def allow ( self ):
+        """
+        Returns True if a call may be made now.
+        """
+
+        with self._lock:
+
+            if self.state == CircuitBreaker.CLOSED:
+
+                return True
+
+            if self.state == CircuitBreaker.OPEN and \
+               self._clock () >= self._openedAt + self._timeout:
+
+                logging.info ( "Circuit %s half-open - testing", self.name )
+
+                self.state = CircuitBreaker.HALF_OPEN
+
+                return True
+
+            #open or a test call is already being made
+            return False
+
+    #------------------------------------------------------------------------
+
+    def retry_after ( self ):
+        """
+        Returns how long until allow will next let a call through.
+        """
+
+        with self._lock:
+
+            if self.state != CircuitBreaker.OPEN:
+
+                return 0
+
+            return max ( 0, self._openedAt + self._timeout - self._clock () )
+
+    #------------------------------------------------------------------------
+
+    def record_success ( self ):
+
+        with self._lock:
+
+            if self.state != CircuitBreaker.CLOSED:
+
+                logging.info ( "Circuit %s closed", self.name )
+
+            self.state = CircuitBreaker.CLOSED
+
+            self._failures = 0
+
+            self._timeout = self.resetTimeout
+
+    #------------------------------------------------------------------------
+
+    def record_failure ( self ):
+
+        with self._lock:
+
+            if self.state == CircuitBreaker.HALF_OPEN:
+
+                self._timeout = min ( self._timeout * 2,
+                                      self.maxResetTimeout )
+
+                self._open ()
+
+                return
+
+            self._failures += 1
+
+            if self.state == CircuitBreaker.CLOSED and \
+               self._failures >= self.failureThreshold:
+
+                self._open ()
+
+    #------------------------------------------------------------------------
+
+    def _open ( self ):
+
+        logging.warning ( "Circuit %s open for %ds", self.name,
+                          self._timeout )
+
+        self.state = CircuitBreaker.OPEN
+
+        self._openedAt = self._clock ()
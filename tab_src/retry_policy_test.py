@@ -0,0 +1,92 @@
+#############################################################################
+# retry_policy_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the retry backoff and circuit breaker.
+#############################################################################
+
+from retry_policy import *
+
+def test_retry_delay ():
+
+    policy = RetryPolicy ( baseDelay = 1, maxDelay = 10, random = lambda: 1 )
+
+    testCases = \
+    [
+        { "attempt" : 0, "delay" : 1  },
+        { "attempt" : 1, "delay" : 2  },
+        { "attempt" : 3, "delay" : 8  },
+        { "attempt" : 4, "delay" : 10 },
+        { "attempt" : 9, "delay" : 10 }
+    ]
+
+    for tc in testCases:
+
+        assert ( policy.delay ( tc [ "attempt" ] ) == tc [ "delay" ] ), tc
+
+    #full jitter means the wait can be anything up to the limit
+    policy = RetryPolicy ( baseDelay = 1, maxDelay = 10, random = lambda: 0 )
+
+    assert ( policy.delay ( 3 ) == 0 )
+
+#----------------------------------------------------------------------------
+
+def test_circuit_breaker ():
+
+    now = [ 0 ]
+
+    breaker = CircuitBreaker ( "update", failureThreshold = 2, 
+                               resetTimeout = 10, maxResetTimeout = 15,
+                               clock = lambda: now [ 0 ] )
+
+    assert ( breaker.allow () )
+
+    breaker.record_failure ()
+
+    assert ( breaker.state == CircuitBreaker.CLOSED )
+
+    #a success resets the count of failures
+    breaker.record_success ()
+    breaker.record_failure ()
+
+    assert ( breaker.state == CircuitBreaker.CLOSED )
+
+    breaker.record_failure ()
+
+    assert ( breaker.state == CircuitBreaker.OPEN )
+    assert ( not breaker.allow () )
+    assert ( breaker.retry_after () == 10 )
+
+    #one test call is let through after the timeout
+    now [ 0 ] = 10
+
+    assert ( breaker.allow () )
+    assert ( breaker.state == CircuitBreaker.HALF_OPEN )
+    assert ( not breaker.allow () )
+
+    #a failed test call opens the circuit for longer
+    breaker.record_failure ()
+
+    assert ( breaker.state == CircuitBreaker.OPEN )
+    assert ( breaker.retry_after () == 15 )
+
+    now [ 0 ] = 25
+
+    assert ( breaker.allow () )
+
+    breaker.record_success ()
+
+    assert ( breaker.state == CircuitBreaker.CLOSED )
+    assert ( breaker.allow () )
+    assert ( breaker.retry_after () == 0 )
+
+#----------------------------------------------------------------------------
+
+def test_one_call_does_not_open_circuit ():
+
+    breaker = CircuitBreaker ( "update" )
+
+    for attempt in range ( RetryPolicy ().maxAttempts ):
+
+        breaker.record_failure ()
+
+    assert ( breaker.state == CircuitBreaker.CLOSED )
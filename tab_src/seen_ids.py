@@ -0,0 +1,84 @@
+#############################################################################
+# seen_ids.py
+#----------------------------------------------------------------------------
+# Remembers which tweets have already been handled.
+#############################################################################
+
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------
+
+#How many mention IDs are remembered
+SEEN_MENTIONS_SIZE = 10000
+
+#----------------------------------------------------------------------------
+
+class SeenIDs:
+    """
+    Set of the most recently seen IDs with a fixed maximum size.  When
+    the set is full the ID that was seen longest ago is forgotten.
+
+    Mentions are fetched in ID order so the IDs forgotten are the oldest
+    ones which are below the polling watermark and will not be fetched
+    again.
+    """
+
+    def __init__ ( self, maxSize = SEEN_MENTIONS_SIZE, ids = () ):
+
+        assert maxSize > 0
+
+        self.maxSize = maxSize
+
+        self._ids = OrderedDict ()
+
+        #True when IDs have been added since the set was saved
+        self.changed = False
+
+        for i in ids:
+
+            self.add ( i )
+
+        self.changed = False
+
+    #------------------------------------------------------------------------
+
+    def add ( self, i ):
+        """
+        Records an ID.  Returns True if the ID had not been seen before.
+        """
+
+        if i in self._ids:
+
+            self._ids.move_to_end ( i )
+
+            return False
+
+        self._ids [ i ] = None
+
+        if len ( self._ids ) > self.maxSize:
+
+            self._ids.popitem ( last = False )
+
+        self.changed = True
+
+        return True
+
+    #------------------------------------------------------------------------
+
+    def __contains__ ( self, i ):
+
+        return i in self._ids
+
+    def __len__ ( self ):
+
+        return len ( self._ids )
+
+    #------------------------------------------------------------------------
+
+    def to_list ( self ):
+        """
+        Returns the IDs oldest first so they can be saved and passed back
+        to the constructor.
+        """
+
+        return list ( self._ids )
@@ -0,0 +1,50 @@
+#############################################################################
+# seen_ids_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the set of seen IDs.
+#############################################################################
+
+from seen_ids import *
+
+def test_seen_ids ():
+
+    seen = SeenIDs ( 3 )
+
+    testCases = \
+    [
+        { "id" : 1, "new" : True  },
+        { "id" : 2, "new" : True  },
+        { "id" : 1, "new" : False },
+        { "id" : 3, "new" : True  },
+        { "id" : 4, "new" : True  },
+        { "id" : 2, "new" : True  },
+        { "id" : 3, "new" : False }
+    ]
+
+    for tc in testCases:
+
+        assert ( seen.add ( tc [ "id" ] ) == tc [ "new" ] ), tc
+
+    #2 was forgotten when 4 was added as it was seen longest ago then 1
+    #was forgotten when 2 was added again
+    assert ( len ( seen ) == 3 )
+    assert ( 1 not in seen )
+    assert ( seen.to_list () == [ 4, 2, 3 ] )
+
+#----------------------------------------------------------------------------
+
+def test_seen_ids_saved ():
+
+    seen = SeenIDs ( 2, [ 1, 2, 3 ] )
+
+    assert ( not seen.changed )
+    assert ( 1 not in seen and 3 in seen )
+
+    seen.add ( 3 )
+
+    assert ( not seen.changed )
+
+    seen.add ( 4 )
+
+    assert ( seen.changed )
+    assert ( SeenIDs ( 2, seen.to_list () ).to_list () == [ 3, 4 ] )
@@ -0,0 +1,161 @@
+#############################################################################
+# session_manager.py
+#----------------------------------------------------------------------------
+# Keeps track of the games hosted by the bot and works out which game a
+# mention was sent to.
+#############################################################################
+
+import os, re, asyncio, logging, threading
+
+from collections import OrderedDict, deque
+
+from command_votes import CommandTally
+
+#----------------------------------------------------------------------------
+
+#How many commands are remembered in each session's history
+HISTORY_LENGTH = 100
+
+#How many posted status IDs are remembered for routing replies.  The
+#oldest IDs are forgotten first.
+MAX_TRACKED_STATUSES = 10000
+
+#Matches hashtags that can be used to pick a game
+HASHTAG_REGEX = re.compile ( r"#(\w+)" )
+
+#----------------------------------------------------------------------------
+
+def strip_hashtags ( text ):
+    """
+    Removes hashtags from a mention so that a game's tag does not end up
+    as part of the command sent to it.
+    """
+
+    return HASHTAG_REGEX.sub ( "", text )
+
+#----------------------------------------------------------------------------
+
+class GameSession:
+    """
+    Holds the state of one game hosted by the bot.
+
+    storyPath - path of the z-machine story file the game runs
+
+    tag       - optional hashtag ( without the '#' ) players can use to
+                send a command to this game without replying to its thread
+
+    checkpoints - optional CheckpointStore used to save the game so it 
+                  can be recovered after a crash
+    """
+
+    def __init__ ( self, storyPath, tag = None, checkpoints = None ):
+
+        self.storyPath = storyPath
+
+        self.tag = tag.lower () if tag else None
+
+        self.checkpoints = checkpoints
+
+        #name used to store the session's state e.g. its checkpoints
+        if self.tag:
+
+            self.name = self.tag
+
+        elif storyPath:
+
+            self.name = os.path.basename ( storyPath )
+
+        else:
+
+            self.name = None
+
+        #ID of the message that starts the current thread of the game
+        self.headerID = None
+
+        #recent commands sent to the game as ( username, cmd ) tuples
+        self.history = deque ( maxlen = HISTORY_LENGTH )
+
+        #counts the votes for the next command
+        self.tally = CommandTally ()
+
+        #commands waiting to be sent to the game
+        self.commands = asyncio.Queue ()
+
+    #------------------------------------------------------------------------
+
+    def __repr__ ( self ):
+
+        return "GameSession(%r, %r)" % ( self.storyPath, self.tag )
+
+#----------------------------------------------------------------------------
+
+class SessionManager:
+    """
+    Owns the games hosted by the bot and routes mentions to them.
+
+    A mention is routed to a game if it replies to one of the messages
+    the game posted or, failing that, if it contains the game's hashtag.
+    When only one game is hosted every mention is routed to it.
+    """
+
+    def __init__ ( self, sessions ):
+
+        self.sessions = list ( sessions )
+
+        self._tags = { s.tag : s for s in self.sessions if s.tag }
+
+        #status ID -> session that posted it.  Updated by the outbox
+        #thread while mentions are routed from other threads.
+        self._statusIndex = OrderedDict ()
+
+        self._lock = threading.Lock ()
+
+    #------------------------------------------------------------------------
+
+    def track ( self, session, statusIDs ):
+        """
+        Records that the session posted the given statuses so that
+        replies to them are routed back to the session.
+        """
+
+        with self._lock:
+
+            for statusID in statusIDs:
+
+                self._statusIndex [ statusID ] = session
+
+            while len ( self._statusIndex ) > MAX_TRACKED_STATUSES:
+
+                self._statusIndex.popitem ( last = False )
+
+    #------------------------------------------------------------------------
+
+    def route ( self, mention ):
+        """
+        Returns the session a mention was sent to or None if it could
+        not be matched to a game.
+        """
+
+        with self._lock:
+
+            session = self._statusIndex.get ( mention.replyTo )
+
+        if session != None:
+
+            return session
+
+        for tag in HASHTAG_REGEX.findall ( mention.text ):
+
+            session = self._tags.get ( tag.lower () )
+
+            if session != None:
+
+                return session
+
+        if len ( self.sessions ) == 1:
+
+            return self.sessions [ 0 ]
+
+        logging.info ( "Mention %s not routed to a game.", mention.id )
+
+        return None
@@ -0,0 +1,71 @@
+#############################################################################
+# session_manager_test.py
+#----------------------------------------------------------------------------
+# Unit tests for routing mentions to game sessions.
+#############################################################################
+
+from session_manager import *
+from mention import Mention
+
+def make_mention ( text, replyTo = None ):
+
+    return Mention ( text, 1, "u", replyTo )
+
+#----------------------------------------------------------------------------
+
+def test_route ():
+
+    advent = GameSession ( "advent.z8", "Advent" )
+    zork   = GameSession ( "zork.z5", "zork" )
+
+    manager = SessionManager ( [ advent, zork ] )
+
+    manager.track ( advent, [ 10, 11 ] )
+    manager.track ( zork, [ 20 ] )
+
+    testCases = \
+    [
+        { "mention" : make_mention ( "cmd look", 11 ),         "out" : advent },
+        { "mention" : make_mention ( "cmd look", 20 ),         "out" : zork   },
+        { "mention" : make_mention ( "cmd look #zork" ),       "out" : zork   },
+        { "mention" : make_mention ( "cmd look #ADVENT" ),     "out" : advent },
+        { "mention" : make_mention ( "cmd look #zork", 10 ),   "out" : advent },
+        { "mention" : make_mention ( "cmd look #zork", 99 ),   "out" : zork   },
+        { "mention" : make_mention ( "cmd look" ),             "out" : None   },
+        { "mention" : make_mention ( "cmd look #other", 99 ),  "out" : None   },
+    ]
+
+    for tc in testCases:
+
+        assert ( manager.route ( tc [ "mention" ] ) is tc [ "out" ] ), tc
+
+#----------------------------------------------------------------------------
+
+def test_route_single_session ():
+
+    advent = GameSession ( "advent.z8" )
+
+    manager = SessionManager ( [ advent ] )
+
+    assert ( manager.route ( make_mention ( "cmd look" ) ) is advent )
+
+#----------------------------------------------------------------------------
+
+def test_track_is_bounded ():
+
+    advent = GameSession ( "advent.z8", "advent" )
+    zork   = GameSession ( "zork.z5", "zork" )
+
+    manager = SessionManager ( [ advent, zork ] )
+
+    manager.track ( advent, range ( MAX_TRACKED_STATUSES + 5 ) )
+
+    assert ( manager.route ( make_mention ( "x", 0 ) ) is None )
+    assert ( manager.route ( make_mention ( "x", 5 ) ) is advent )
+
+#----------------------------------------------------------------------------
+
+def test_strip_hashtags ():
+
+    assert ( strip_hashtags ( "cmd look #advent" ).strip () == "cmd look" )
+    assert ( strip_hashtags ( "#advent cmd go north" ) == " cmd go north" )
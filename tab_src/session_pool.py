@@ -0,0 +1,263 @@
+#############################################################################
+# session_pool.py
+#----------------------------------------------------------------------------
+# Keep-alive HTTP sessions for the twitter API with a limit on the calls
+# each endpoint can have in progress at once.
+#############################################################################
+
+import threading
+
+from contextlib import contextmanager
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, urlunsplit
+
+#----------------------------------------------------------------------------
+
+#Calls an endpoint can have in progress at once when it is not configured
+DEFAULT_CONCURRENCY = 1
+
+#Connections kept open to each host
+MAX_CONNECTIONS = 8
+
+#----------------------------------------------------------------------------
+
+class SessionPool:
+    """
+    Hands out requests sessions for each endpoint.
+
+    An endpoint has at most as many sessions checked out as its
+    concurrency allows so calls to one endpoint never wait for calls to
+    another.  A session is only used by one call at a time so the last
+    response it received belongs to that call.
+
+    Every session shares one connection pool so connections are kept
+    alive between calls instead of being opened for each request.
+
+    concurrency - dict of endpoint -> calls allowed at once
+
+    baseURL     - if set requests are sent here instead of the host in
+                  their URL e.g. to use a local stand-in for twitter
+    """
+
+    def __init__ ( self, concurrency = None, default = DEFAULT_CONCURRENCY,
+                   maxConnections = MAX_CONNECTIONS, baseURL = None ):
+
+        self.concurrency = dict ( concurrency or {} )
+        self.default = default
+        self.baseURL = baseURL
+
+        self._adapter = HTTPAdapter ( pool_maxsize = maxConnections )
+
+        self._lock = threading.Lock ()
+
+        #endpoint -> BoundedSemaphore
+        self._slots = {}
+
+        #endpoint -> list of sessions not checked out
+        self._idle = {}
+
+        #every session created so they can be closed
+        self._sessions = []
+
+        #the session checked out by each thread
+        self._local = threading.local ()
+
+    #------------------------------------------------------------------------
+
+    def _slot ( self, endpoint ):
+
+        with self._lock:
+
+            slot = self._slots.get ( endpoint )
+
+            if slot == None:
+
+                limit = self.concurrency.get ( endpoint, self.default )
+
+                slot = threading.BoundedSemaphore ( limit )
+
+                self._slots [ endpoint ] = slot
+                self._idle [ endpoint ] = []
+
+            return slot
+
+    #------------------------------------------------------------------------
+
+    def _new_session ( self ):
+
+        session = RedirectSession ( self.baseURL )
+
+        session.mount ( "https://", self._adapter )
+        session.mount ( "http://", self._adapter )
+
+        session.last_response = None
+
+        def record ( response, *args, **kwargs ):
+
+            session.last_response = response
+
+        session.hooks [ "response" ].append ( record )
+
+        self._sessions.append ( session )
+
+        return session
+
+    #------------------------------------------------------------------------
+
+    @contextmanager
+    def session ( self, endpoint ):
+        """
+        Context manager that checks out a session for the endpoint.  Waits
+        while the endpoint has as many calls in progress as it allows.
+        """
+
+        slot = self._slot ( endpoint )
+
+        slot.acquire ()
+
+        with self._lock:
+
+            idle = self._idle [ endpoint ]
+
+            session = idle.pop () if len ( idle ) > 0 else \
+                      self._new_session ()
+
+        #only responses to this checkout's calls are seen by the caller
+        session.last_response = None
+
+        previous = getattr ( self._local, "session", None )
+
+        self._local.session = session
+
+        try:
+
+            yield session
+
+        finally:
+
+            self._local.session = previous
+
+            with self._lock:
+
+                self._idle [ endpoint ].append ( session )
+
+            slot.release ()
+
+    #------------------------------------------------------------------------
+
+    def current ( self ):
+        """
+        Returns the session checked out by the calling thread or None.
+        """
+
+        return getattr ( self._local, "session", None )
+
+    #------------------------------------------------------------------------
+
+    def close ( self ):
+
+        with self._lock:
+
+            for session in self._sessions:
+
+                session.close ()
+
+            self._adapter.close ()
+
+#----------------------------------------------------------------------------
+
+class RedirectSession ( requests.Session ):
+    """
+    Session that sends every request to baseURL keeping the path and query
+    of the request.  Behaves as a normal session if baseURL is None.
+    """
+
+    def __init__ ( self, baseURL = None ):
+
+        requests.Session.__init__ ( self )
+
+        self.baseURL = baseURL
+
+    def request ( self, method, url, *args, **kwargs ):
+
+        if self.baseURL != None:
+
+            url = redirect_url ( url, self.baseURL )
+
+        return requests.Session.request ( self, method, url, *args, **kwargs )
+
+#----------------------------------------------------------------------------
+
+def redirect_url ( url, baseURL ):
+    """
+    Returns url with its scheme and host replaced by those of baseURL.  Any
+    path in baseURL is put in front of the path of url.
+    """
+
+    parts = urlsplit ( url )
+    base = urlsplit ( baseURL )
+
+    return urlunsplit ( ( base.scheme, base.netloc, 
+                          base.path.rstrip ( "/" ) + parts.path,
+                          parts.query, parts.fragment ) )
+
+#----------------------------------------------------------------------------
+
+class PooledAPI:
+    """
+    Wraps a tweepy.API so that the named methods are sent with the session
+    the calling thread has checked out of the pool.
+
+    tweepy makes a new requests session for every call which means a new
+    connection each time.  The wrapper builds the call with tweepy and
+    swaps in the pooled session before it is sent.  Calls made without a
+    session checked out are passed straight to tweepy.
+    """
+
+    def __init__ ( self, api, pool, methods ):
+
+        self._api = api
+        self._pool = pool
+        self._methods = frozenset ( methods )
+
+    #------------------------------------------------------------------------
+
+    def __getattr__ ( self, name ):
+
+        attr = getattr ( self._api, name )
+
+        if name not in self._methods:
+
+            return attr
+
+        def call ( *args, **kwargs ):
+
+            session = self._pool.current ()
+
+            #tweepy cursors ask for the method object to parse results
+            if session == None or kwargs.get ( "create" ):
+
+                return attr ( *args, **kwargs )
+
+            method = attr ( *args, create = True, **kwargs )
+
+            #create is added to the parameters along with the real ones
+            params = method.session.params
+            params.pop ( "create", None )
+
+            session.headers = method.session.headers
+            session.params = params
+
+            method.session = session
+
+            return method.execute ()
+
+        #lets tweepy.Cursor page through the method
+        if hasattr ( attr, "pagination_mode" ):
+
+            call.pagination_mode = attr.pagination_mode
+
+        return call
@@ -0,0 +1,98 @@
+#############################################################################
+# session_pool_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the pooled twitter API sessions.
+#############################################################################
+
+import threading
+
+import requests
+
+from session_pool import *
+
+class FakeMethod:
+    """
+    Stands in for the method object tweepy builds for each call.
+    """
+
+    def __init__ ( self, params ):
+
+        self.session = requests.Session ()
+        self.session.params = params
+
+    def execute ( self ):
+
+        return self.session, dict ( self.session.params )
+
+class FakeAPI:
+
+    def update_status ( self, status, create = False ):
+
+        method = FakeMethod ( { "status" : status, "create" : str ( create ) } )
+
+        return method if create else method.execute ()
+
+#----------------------------------------------------------------------------
+
+def test_pooled_api ():
+
+    pool = SessionPool ()
+
+    api = PooledAPI ( FakeAPI (), pool, [ "update_status" ] )
+
+    #without a session checked out tweepy's own session is used
+    session, params = api.update_status ( "a" )
+
+    assert ( pool.current () == None )
+    assert ( params [ "status" ] == "a" )
+
+    with pool.session ( "statuses/update" ) as pooled:
+
+        assert ( pool.current () is pooled )
+
+        session, params = api.update_status ( "b" )
+
+        assert ( session is pooled )
+        assert ( params == { "status" : "b" } )
+
+    #the session is reused by the next call
+    with pool.session ( "statuses/update" ) as again:
+
+        assert ( again is pooled )
+
+    assert ( pool.current () == None )
+
+    pool.close ()
+
+#----------------------------------------------------------------------------
+
+def test_session_pool_concurrency ():
+
+    pool = SessionPool ( { "update" : 1, "mentions" : 2 } )
+
+    entered = threading.Event ()
+
+    def use_update ():
+
+        with pool.session ( "update" ):
+
+            entered.set ()
+
+    with pool.session ( "update" ):
+
+        #other endpoints do not wait
+        with pool.session ( "mentions" ) as a, pool.session ( "mentions" ) as b:
+
+            assert ( a is not b )
+
+        thread = threading.Thread ( target = use_update )
+        thread.start ()
+
+        #a second update waits for the first
+        assert ( not entered.wait ( 0.1 ) )
+
+    thread.join ( 5 )
+
+    assert ( entered.is_set () )
+
+    pool.close ()
@@ -0,0 +1,96 @@
+#############################################################################
+# state_store.py
+#----------------------------------------------------------------------------
+# Small key/value store that keeps the bot's state between runs.
+#############################################################################
+
+import os, json, sqlite3, threading
+
+#----------------------------------------------------------------------------
+
+#Location of the file holding the bot's state
+STATE_PATH = os.path.join ( "config", "state.db" )
+
+#----------------------------------------------------------------------------
+
+class StateStore:
+    """
+    Stores JSON values by key in an SQLite database.
+
+    The database uses write-ahead logging so a write does not rewrite the
+    whole file.  The log is synced on every commit so each write is
+    durable once set returns, even if the power is lost.  Writes happen a
+    few times a minute so the sync costs little.  The store can be used
+    from several threads.
+    """
+
+    def __init__ ( self, path = STATE_PATH ):
+
+        directory = os.path.dirname ( path )
+
+        if directory != "":
+
+            os.makedirs ( directory, exist_ok = True )
+
+        self.path = path
+
+        self._lock = threading.Lock ()
+
+        self._db = sqlite3.connect ( path, check_same_thread = False )
+
+        self._db.execute ( "PRAGMA journal_mode=WAL" )
+        self._db.execute ( "PRAGMA synchronous=FULL" )
+
+        self._db.execute ( "CREATE TABLE IF NOT EXISTS state "
+                           "( key TEXT PRIMARY KEY, value TEXT )" )
+
+        self._db.commit ()
+
+    #------------------------------------------------------------------------
+
+    def get ( self, key, default = None ):
+        """
+        Returns the value stored for key or default if there is none.
+        """
+
+        with self._lock:
+
+            row = self._db.execute ( "SELECT value FROM state WHERE key = ?",
+                                     ( key, ) ).fetchone ()
+
+        if row == None:
+
+            return default
+
+        return json.loads ( row [ 0 ] )
+
+    #------------------------------------------------------------------------
+
+    def set ( self, key, value ):
+        """
+        Stores a value that can be converted to JSON.
+        """
+
+        self.update ( { key : value } )
+
+    #------------------------------------------------------------------------
+
+    def update ( self, values ):
+        """
+        Stores several values in one transaction.
+        """
+
+        rows = [ ( k, json.dumps ( v ) ) for k, v in values.items () ]
+
+        with self._lock, self._db:
+
+            self._db.executemany ( "INSERT OR REPLACE INTO state "
+                                   "( key, value ) VALUES ( ?, ? )", rows )
+
+    #------------------------------------------------------------------------
+
+    def close ( self ):
+
+        with self._lock:
+
+            self._db.close ()
@@ -0,0 +1,34 @@
+#############################################################################
+# state_store_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the state store.
+#############################################################################
+
+import os
+
+from state_store import *
+
+def test_state_store ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "state", "state.db" )
+
+    store = StateStore ( path )
+
+    assert ( store.get ( "processed_mention" ) == None )
+    assert ( store.get ( "processed_mention", 0 ) == 0 )
+
+    store.set ( "processed_mention", 1234567890123456789 )
+    store.update ( { "header_id:advent" : 42, "list" : [ 1, 2 ] } )
+    store.set ( "header_id:advent", 43 )
+
+    store.close ()
+
+    #values survive reopening the store
+
+    store = StateStore ( path )
+
+    assert ( store.get ( "processed_mention" ) == 1234567890123456789 )
+    assert ( store.get ( "header_id:advent" ) == 43 )
+    assert ( store.get ( "list" ) == [ 1, 2 ] )
+
+    store.close ()
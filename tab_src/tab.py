@@ -7,20 +7,69 @@
 # through twitter comments.
 #############################################################################
 
-import sys, time, uuid, random, logging
+import os, sys, uuid, logging, asyncio
 
-import urlmarker, re
+import urlmarker, re, metrics, tracing
 
-from queue import Queue, Empty
-from threading import Thread, Lock
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 
-from frotz_runner import FrotzRunner
+from frotz_pool import FrotzPool
 from twitter_connection import TwitterConnection
+from session_manager import GameSession, SessionManager, strip_hashtags
+from checkpoint import CheckpointStore, CHECKPOINT_DIR
+from command_votes import CommandTally
+from command_filter import BannedCommands, BANNED_CMDS_PATH, cmd_is_banned
+from user_throttle import UserThrottle
+from metrics import MetricsServer
 
 #----------------------------------------------------------------------------
 
-#How long to sleep at the end of each 'game loop'
-GAME_LOOP_SLEEP = 5*60
+#How long to wait between checks of the mentions timeline
+MENTION_POLL_SLEEP = 30
+
+#How long the output reader blocks waiting for the game before checking
+#that the frotz process is still running
+OUTPUT_WAIT_TIMEOUT = 30
+
+#How many commands are sent to a game between checkpoints.  At most this
+#many turns are lost if the bot or the game crashes.
+CHECKPOINT_TURNS = 5
+
+#Games hosted by the bot.  Players reply to a game's thread or use its tag
+#to send it commands.
+GAME_SESSIONS = \
+[
+    { "story" : "z8/advent.z8", "tag" : "advent" }
+]
+
+#Metrics recorded by the bot
+
+MENTIONS = metrics.REGISTRY.counter ( 
+        "tab_mentions_total", 
+        "Mentions checked for commands by result - parsed, dropped "
+        "( no allowed command ), throttled or unrouted",
+        ( "result", ) )
+
+FROTZ_RESTARTS = metrics.REGISTRY.counter ( 
+        "tab_frotz_restarts_total", 
+        "Games started again after their frotz process exited",
+        ( "session", ) )
+
+#Lines holding a command start with this
+CMD_PREFIX = "cmd "
+
+#A line starting with 'cmd ' and an optional username.  [^\S\n] is any
+#whitespace but a new line.  Group 1 is the rest of the line which must
+#have something other than whitespace in it.
+CMD_LINE_REGEX = re.compile ( r"^[^\S\n]*(?:@[^ \n]* [^\S\n]*)?cmd "
+                              r"([^\n]*?\S)[^\S\n]*$", re.M )
+
+URL_REGEX = re.compile ( urlmarker.ANY_URL_REGEX )
+
+#Characters removed from commands - \w is the characters allowed by
+#str.isalnum plus '_'
+DISALLOWED_CHARS_REGEX = re.compile ( r"[^\w ]|_" )
 
 #----------------------------------------------------------------------------
 
@@ -43,138 +92,259 @@ def string_has_url ( s ):
     that could be abused to make the bot spam out URLs.
     """
 
-    return len ( re.findall ( urlmarker.ANY_URL_REGEX, s ) ) > 0
+    #every form of URL matched by the regex has a '.' or ':' so the regex
+    #only needs to run on strings that contain one
+
+    if "." not in s and ":" not in s:
+
+        return False
+
+    return URL_REGEX.search ( s ) != None
 
 #----------------------------------------------------------------------------
 
 def cmd_from_text ( text, bannedCmds ):
+    """
+    Returns the command in a mention's text or None if there is not one.
+
+    The command is the rest of the first line that starts with 'cmd '
+    ( after an optional @username ) in lower case with everything but
+    letters, numbers and spaces removed.
 
-    logging.info ( "cmd_from_text:\n"+text )
+    bannedCmds - BannedCommands that decides which commands are ignored.
+                 A set or list bans commands by their first word.
+    """
+
+    logging.debug ( "cmd_from_text:\n%s", text )
     
     if len ( text ) < 5:
         return None
 
-    cmd = None
+    #convert to lower case
 
-    #check each line for a command
+    text = text.lower ()
 
-    for line in text.split ( "\n" ):
+    #most mentions are not commands so skip them before the regex
 
-        #strip before checking for 'cmd' in case the user put spaces
-        line = line.strip ()
+    if CMD_PREFIX not in text:
 
-        #if the first word is a username then process the rest of the line
-        #after the first word
-
-        if len( line ) > 0 and line [ 0 ] == "@":
+        return None
 
-            line = line.split ( " ", 1 ) [ 1 ].strip ()
+    #find the first line that starts with 'cmd ' - if the line starts 
+    #with a username the command comes after it
 
-        #convert to lower case
+    match = CMD_LINE_REGEX.search ( text )
 
-        line = line.lower ()
+    if match == None:
 
-        #check for cmd and return the rest of the command
+        return None
 
-        if len ( line ) > 4 and line [ : 4 ] == "cmd ":
+    #The rest of the line after 'cmd '
+    cmd = match.group ( 1 )
 
-            #The rest of the line after 'cmd '
-            cmd = line [ 4 : ]
+    #block commands with urls - note that urls are allowed in cmd tweets
+    #just not as part of the command
 
-            #block commands with urls - note that urls are allowed in 
-            #cmd tweets just not as part of the command
+    if string_has_url ( cmd ):
 
-            if string_has_url ( cmd ):
+        logging.warning ( "Ignored command with URL:\n"+cmd )
 
-                logging.warning ( "Ignored command with URL:\n"+cmd )
+        return None
+    
+    #remove whitespace at beginning and end of command then only allow
+    #alpha-numeric and space characters
 
-                return None
-            
-            #remove whitespace at beginning and end of command
-            cmd = cmd.strip ()
+    cmd = DISALLOWED_CHARS_REGEX.sub ( "", cmd.strip () )
 
-            #only allow alpha-numeric and space characters
+    if cmd_is_banned ( cmd, bannedCmds ):
 
-            allowed_chars = [ x for x in cmd if char_allowed_in_cmd ( x ) ]
+        return None
 
-            cmd = "".join ( allowed_chars )
+    return cmd
 
-            #check the command's first word against the banned commands
 
-            firstWord = cmd.split ( " " ) [ 0 ]
+#----------------------------------------------------------------------------
 
-            for banned in bannedCmds:
+def check_mentions_for_cmd ( tc, bannedCmds, tally = None, 
+                             throttle = None ):
+    """
+    Checks the latest mentions for commands and counts them as votes.  The
+    mentions are handled as for a single game hosted by a SessionManager.
 
-                if firstWord == banned:
+    tally    - CommandTally that collects the votes.  If no tally is given
+               only the latest mentions are counted.
 
-                    return None
+    throttle - UserThrottle that drops mentions from players who send too
+               many
 
-            #only parse the first command
-            break
+    Returns the winning command once the tally's window has closed or 
+    None if there is no command to send yet.
+    """
 
-    return cmd 
+    session = GameSession ( None )
 
-#----------------------------------------------------------------------------
+    if tally != None:
 
-def check_mentions_for_cmd ( tc, bannedCmds ):
+        session.tally = tally
 
-    cmd = None
+    else:
 
-    for mention in tc.get_latest_mentions ():
+        session.tally = CommandTally ( window = 0 )
 
-        parsedCmd = cmd_from_text ( mention [ "text" ], bannedCmds )
+    commands = check_mentions_for_session_cmds ( 
+            tc, bannedCmds, SessionManager ( [ session ] ), throttle )
 
-        if parsedCmd != None:
-            cmd = { "cmd" : parsedCmd, "username" : mention [ "username" ] }
-    
-    return cmd
+    return commands.get ( session )
 
 #----------------------------------------------------------------------------
 
-def post_status ( tc, msgList, replyID ):
+def check_mentions_for_session_cmds ( tc, bannedCmds, manager, 
+                                      throttle = None ):
     """
-    Posts a message to twitter and returns a list of the status IDs that
-    hold the message.  (The message will be split up into multiple 
-    messages when sent to Twitter)
+    Checks the latest mentions for commands and routes them to the game 
+    sessions held by the manager.  Mentions from players who have sent
+    too many are dropped by the throttle.
+
+    The commands are counted as votes by each session's tally.  Returns a
+    dict mapping each session whose voting window has closed to the
+    winning command.
     """
 
-    messageChain = tc.send_message_chain ( msgList, replyID )
+    commands = {}
+
+    #the winning command carries on the trace of the check that found
+    #its first vote
+
+    with tracing.TRACER.span ( "check_mentions" ) as span:
+
+        mentions = tc.get_latest_mentions ()
+
+        with tracing.TRACER.span ( "parse_mentions", 
+                                   mentions = len ( mentions ) ):
+
+            for mention in mentions:
+
+                if throttle != None and \
+                   not throttle.allow ( mention.username ):
 
-    if len ( messageChain ) == 0:
+                    logging.debug ( "Throttled mention from %s", 
+                                    mention.username )
 
-        msgStr = "\n".join ( msgList )
+                    MENTIONS.labels ( "throttled" ).inc ()
 
-        logging.critical ( "Failed to send tweets:\n"+msgStr )
+                    continue
 
-    return messageChain
+                session = manager.route ( mention )
+
+                if session == None:
+
+                    MENTIONS.labels ( "unrouted" ).inc ()
+
+                    continue
+
+                text = strip_hashtags ( mention.text )
+
+                parsedCmd = cmd_from_text ( text, bannedCmds )
+
+                if parsedCmd != None:
+
+                    MENTIONS.labels ( "parsed" ).inc ()
+
+                    session.tally.add ( mention.username, parsedCmd, 
+                                        span.context, mention.id )
+
+                else:
+
+                    MENTIONS.labels ( "dropped" ).inc ()
+
+    tc.mark_mentions_processed ()
+
+    for session in manager.sessions:
+
+        if session.tally.ready ():
+
+            commands [ session ] = session.tally.close ()
+
+    return commands
 
 #----------------------------------------------------------------------------
 
-def post_tail_status ( tc, msgList, replyID ):
+def post_status ( tc, msgList, replyID = None, onPosted = None, 
+                  thread = None, follow = False, trace = None ):
     """
-    Posts a list of messages in reply to another status and returns the ID 
-    of the final twitter status in the resulting chain.
+    Queues a message to be posted to twitter and returns a Future that 
+    gives the list of status IDs that hold the message.  (The message will
+    be split up into multiple messages when sent to Twitter)
 
-    Used to add messages onto an existing chain of messages.
+    The message is posted by the connection's background sender so the
+    caller does not wait for twitter.
+
+    onPosted - optional function called with the list of status IDs e.g.
+               to record which game posted them
+
+    thread   - name of the thread the message belongs to
+
+    follow   - if True the message replies to the last message posted in
+               the thread
+
+    trace    - tracing.SpanContext the message belongs to.  The time from
+               queuing the message to it being posted is traced as a
+               post_chain span.
     """
 
-    messageChain = post_status ( tc, msgList, replyID )
+    span = tracing.TRACER.span ( "post_chain", trace, root = False,
+                                 follow = follow )
 
-    if len ( messageChain ) > 0:
+    def posted ( future ):
 
-        return messageChain [ -1 ]
+        span.end ()
 
-    else:
+        if future.cancelled ():
 
-        return None
+            return
+
+        messageChain = future.result ()
+
+        if onPosted != None:
+
+            onPosted ( messageChain )
+
+        if len ( messageChain ) == 0:
+
+            msgStr = "\n".join ( msgList )
+
+            logging.critical ( "Failed to send tweets:\n"+msgStr )
+
+    future = tc.post_message_chain ( msgList, replyID, thread, follow,
+                                     span.context )
+
+    future.add_done_callback ( posted )
+
+    return future
+
+#----------------------------------------------------------------------------
+
+def post_tail_status ( tc, msgList, session, onPosted = None, 
+                       trace = None ):
+    """
+    Queues a list of messages in reply to the last message posted by the
+    session.
+
+    Used to add messages onto an existing chain of messages.
+    """
+
+    return post_status ( tc, msgList, None, onPosted, session.name, 
+                         follow = True, trace = trace )
 
 #----------------------------------------------------------------------------
 
-def post_header_status ( tc, text ):
+def post_header_status ( tc, text, session, onPosted = None, 
+                         trace = None ):
 
     """
-    Posts a message as the first message in a new thread and returns the ID 
-    of the first message in the chain.( Message may be split up by twitter )
+    Queues a message as the first message in a new thread for the session.
+    Once it is posted the ID of the first message in the chain is saved as
+    the session's headerID. ( Message may be split up by twitter )
 
     Used to start new threads e.g. when a new command is sent.
     """
@@ -184,79 +354,492 @@ def post_header_status ( tc, text ):
     unique = str ( uuid.uuid4 () )[:8]
     text += "\n\n"+unique
 
-    messageChain = post_status ( tc, [ text ], None )
+    def posted ( messageChain ):
 
-    if len ( messageChain ) > 0:
+        if len ( messageChain ) > 0:
 
-        return messageChain [ 0 ]
+            session.headerID = messageChain [ 0 ]
 
-    else:
+            save_header_id ( tc, session )
 
-        return None
+        if onPosted != None:
+
+            onPosted ( messageChain )
+
+    return post_status ( tc, [ text ], None, posted, session.name, 
+                         trace = trace )
 
 #----------------------------------------------------------------------------
     
-def game_loop ( frotz, tc, bannedCmds ):
+async def poll_mentions ( tc, bannedCmds, session ):
+    """
+    Task that checks the mentions timeline on a schedule and puts the
+    winning command onto the session's command queue whenever a voting
+    window closes.
+    """
+
+    await poll_session_mentions ( tc, bannedCmds, 
+                                  SessionManager ( [ session ] ) )
+
+#----------------------------------------------------------------------------
+
+async def poll_session_mentions ( tc, bannedCmds, manager ):
+    """
+    Task that checks the mentions timeline on a schedule and puts the
+    commands it finds onto the command queues of the sessions they were
+    sent to.
+
+    The checks run on a thread of their own so checkpoints being saved
+    for many sessions at once can not hold up mention handling.
+    """
+
+    loop = asyncio.get_event_loop ()
+
+    throttle = UserThrottle ()
+
+    executor = ThreadPoolExecutor ( max_workers = 1 )
+
+    try:
+
+        while True:
+
+            commands = await loop.run_in_executor ( 
+                    executor, check_mentions_for_session_cmds, 
+                    tc, bannedCmds, manager, throttle )
+
+            for session, command in commands.items ():
+
+                await session.commands.put ( command )
+
+            await asyncio.sleep ( MENTION_POLL_SLEEP )
+
+    finally:
+
+        #a check that is running finishes on its own
+        executor.shutdown ( wait = False )
+
+#----------------------------------------------------------------------------
+
+def save_header_id ( tc, session ):
+    """
+    Remembers the ID of the session's current thread so that replies to
+    it are still routed to the session after a restart.
+    """
+
+    if session.name != None and session.headerID != None:
+
+        tc.state.set ( "header_id:" + session.name, session.headerID )
+
+#----------------------------------------------------------------------------
+
+def load_header_ids ( tc, manager ):
+    """
+    Restores the thread IDs saved by save_header_id.
+    """
+
+    for session in manager.sessions:
+
+        if session.name == None:
+
+            continue
+
+        session.headerID = tc.state.get ( "header_id:" + session.name )
+
+        if session.headerID != None:
+
+            manager.track ( session, [ session.headerID ] )
+
+#----------------------------------------------------------------------------
+
+def restore_checkpoint ( frotz, session ):
+    """
+    Restores a new game from the session's latest checkpoint.  Returns
+    True if the game was restored.
+    """
+
+    if session.checkpoints == None:
+
+        return False
+
+    path = session.checkpoints.latest ()
+
+    if path == None:
+
+        return False
+
+    with tracing.TRACER.span ( "restore_checkpoint" ):
+
+        #the opening text of the new game is not needed
+        frotz.read_output_block ( timeout = OUTPUT_WAIT_TIMEOUT )
+
+        if frotz.restore_game ( path ):
+
+            logging.info ( "Restored checkpoint: %s", path )
+
+            return True
+
+    logging.warning ( "Failed to restore checkpoint: %s", path )
+
+    return False
+
+#----------------------------------------------------------------------------
+
+def save_checkpoint ( frotz, session ):
+    """
+    Saves the game to a new checkpoint and removes old checkpoints.
+    """
+
+    path = session.checkpoints.new_path ()
+
+    with tracing.TRACER.span ( "save_checkpoint" ):
+
+        saved = frotz.save_game ( path )
+
+    if saved:
+
+        logging.info ( "Saved checkpoint: %s", path )
+
+        session.checkpoints.prune ()
+
+    else:
 
-    #The headerID holds the ID of the message that the next piece of 
-    #output should reply to
+        logging.warning ( "Failed to save checkpoint: %s", path )
+
+#----------------------------------------------------------------------------
+
+async def run_game ( frotz, session, outbox ):
+    """
+    Task that sends commands to the game as soon as they arrive and puts 
+    each block of output on the outbox.
+
+    A header message is put on the outbox before a command is written
+    so that the game's response is always posted as a reply to it.
+
+    This is the only task that uses the frotz process so checkpoints can
+    be saved between turns without a player's command getting mixed up
+    with the save.  Returns the exit code when the frotz process exits.
+
+    Each command is traced as a game_turn span from writing it to the
+    game until its output is read.  The span carries on the trace the
+    command arrived with and the header and output are posted in it.
+    """
+
+    loop = asyncio.get_event_loop ()
+
+    reader = None
+    nextCommand = None
+
+    #span of the command waiting for its output
+    turn = None
+
+    turnsSinceSave = 0
+
+    try:
+
+        while True:
+
+            if reader == None:
+
+                #check for exit before reading so the last block of output
+                #e.g. the 'quit' message is still read after the game halts
+
+                if frotz.outputEnded:
+
+                    #the game is exiting - waiting for it would block
+                    #every session on the loop
+                    exitCode = await loop.run_in_executor ( None, 
+                                                            frotz.poll )
+
+                else:
+
+                    exitCode = frotz.poll ( 0 )
+
+                timeout = OUTPUT_WAIT_TIMEOUT if exitCode == None else 0
+
+                #the reactor wakes the loop when output arrives so the
+                #wait holds no executor thread
+                reader = asyncio.ensure_future ( 
+                        frotz.read_output_block_async ( 5, 0.1, timeout ) )
+
+            if nextCommand == None:
+
+                nextCommand = asyncio.ensure_future ( session.commands.get () )
+
+            await asyncio.wait ( [ reader, nextCommand ], 
+                                 return_when = asyncio.FIRST_COMPLETED )
+
+            if nextCommand.done ():
+
+                command = nextCommand.result ()
+
+                nextCommand = None
+
+                logging.info ( "Command:" )
+
+                #Commands are the winners picked by CommandTally.winner
+                #i.e. { "cmd" : ..., "username" : ..., "votes" : ... }
+                #with "trace" set if the vote was traced
+
+                msg =  "Sending Command: " + command [ "cmd" ] + "\n\n"
+                msg += "From: @" + command [ "username" ]
+
+                if command.get ( "votes", 1 ) > 1:
+
+                    msg += " and " + str ( command [ "votes" ] - 1 ) + \
+                           " others"
+
+                logging.info ( msg )
+
+                if turn != None:
+
+                    turn.end ()
+
+                turn = tracing.TRACER.span ( "game_turn", 
+                                             command.get ( "trace" ),
+                                             cmd = command [ "cmd" ],
+                                             votes = command.get ( "votes", 
+                                                                   1 ) )
+
+                await outbox.put ( ( "header", msg, turn.context ) )
+
+                session.history.append ( ( command [ "username" ], 
+                                           command [ "cmd" ] ) )
+
+                with tracing.TRACER.activate ( turn.context ):
+
+                    frotz.write_command ( command [ "cmd" ] + "\n" )
+
+                turnsSinceSave += 1
+
+            if reader.done ():
+
+                output = reader.result ()
+
+                reader = None
+
+                trace = None
+
+                if len ( output ) > 0:
+
+                    #the output answers the last command sent
+
+                    if turn != None:
+
+                        turn.set ( "lines", len ( output ) )
+                        turn.end ()
+
+                        trace = turn.context
+
+                        turn = None
+
+                    await outbox.put ( ( "output", output, trace ) )
+
+                if exitCode != None:
+
+                    logging.warning ( "Frotz process exited.  "+
+                                      "Exit code: "+str ( exitCode ) )
+
+                    return exitCode
+
+                #save when the game is waiting for the next command
+
+                if session.checkpoints != None and frotz.atPrompt and \
+                   turnsSinceSave >= CHECKPOINT_TURNS:
+
+                    await loop.run_in_executor ( None, save_checkpoint,
+                                                 frotz, session )
+
+                    turnsSinceSave = 0
+
+    finally:
+
+        if nextCommand != None:
+
+            nextCommand.cancel ()
+
+        if reader != None:
+
+            reader.cancel ()
+
+        if turn != None:
+
+            turn.end ()
+
+#----------------------------------------------------------------------------
+
+async def post_messages ( tc, outbox, session, onPosted = None ):
+    """
+    Task that queues the messages on the outbox to be posted to twitter.
+
+    Header messages start a new thread.  Output is posted as a reply to
+    the last message sent in the current thread.
+    """
+
+    while True:
+
+        kind, payload, trace = await outbox.get ()
+
+        if kind == "header":
+
+            post_header_status ( tc, payload, session, onPosted, trace )
+
+        else:
+
+            consoleMsg = "Sending output:\n" + "\n".join( payload )
+            logging.info ( consoleMsg )
+
+            post_tail_status ( tc, payload, session, onPosted, trace )
+
+        outbox.task_done ()
+
+#----------------------------------------------------------------------------
+
+async def game_loop ( frotz, tc, bannedCmds, session = None, 
+                      manager = None ):
+    """
+    Runs a game until the frotz process exits.
+
+    Mention polling, sending commands, reading game output and posting
+    to twitter run as separate tasks that wake when there is work for
+    them so a command is answered as soon as the game responds.
+
+    session - the GameSession being played.  If no session is given the
+              game polls the mentions timeline for its own commands.  
+              Otherwise commands are expected on the session's queue.
+
+    manager - SessionManager that records the messages posted by the
+              session so replies to them can be routed back to it
+    """
+
+    loop = asyncio.get_event_loop ()
+
+    tasks = []
+
+    if session == None:
+
+        session = GameSession ( None )
+
+        tasks.append ( asyncio.ensure_future ( 
+                poll_mentions ( tc, bannedCmds, session ) ) )
+
+    onPosted = None
+
+    if manager != None:
+
+        onPosted = lambda statusIDs: manager.track ( session, statusIDs )
+
+    resumed = await loop.run_in_executor ( None, restore_checkpoint, 
+                                           frotz, session )
+
+    #The header starts the thread that the game's output replies to
    
-    startText  = "Starting Adventure..."
+    if resumed:
+
+        startText  = "Resuming Adventure..."
+
+    else:
+
+        startText  = "Starting Adventure..."
+
     #startText += "\n\n#InteractiveFiction #TwitterBot #TwitterGame"
+
+    if session.tag:
+
+        startText += "\n\n#" + session.tag
     
-    headerID = post_header_status ( tc, startText )
+    post_header_status ( tc, startText, session, onPosted )
 
-    while True:
+    #show the players where they were
+    if resumed:
 
-        #break loop if frotz process has halted
+        frotz.write_command ( "look\n" )
 
-        exitCode = frotz.poll ()
+    #holds ( "header", text, trace ) and ( "output", lines, trace ) items
+    #to be posted
+    outbox = asyncio.Queue ()
 
-        if exitCode != None:
+    game = asyncio.ensure_future ( run_game ( frotz, session, outbox ) )
+    poster = asyncio.ensure_future ( post_messages ( tc, outbox, session,
+                                                     onPosted ) )
 
-            logging.warning ( "Frotz process exited.  "+
-                              "Exit code: "+str ( exitCode ) )
+    tasks += [ game, poster ]
 
-            break
+    try:
 
-        #if a commmand is due to be sent then send it and change the 
-        #header so later output is posted as a reply
-        
-        command = check_mentions_for_cmd ( tc, bannedCmds )
+        await asyncio.wait ( tasks, return_when = asyncio.FIRST_COMPLETED )
 
-        if command != None:
+        #post the output the game printed before it exited
 
-            logging.info ( "Command:" )
+        if game.done () and not poster.done ():
 
-            #Expect commands from the command queue to be dictionary
-            #objects with the form { user : user.id, cmd : "..." }
+            flushed = asyncio.ensure_future ( outbox.join () )
 
-            msg =  "Sending Command: " + command [ "cmd" ] + "\n\n"
-            msg += "From: @" + command [ "username" ]
+            await asyncio.wait ( [ flushed, poster ], 
+                                 return_when = asyncio.FIRST_COMPLETED )
 
-            logging.info ( msg )
+            flushed.cancel ()
 
-            headerID = post_header_status ( tc, msg )
+    finally:
 
-            frotz.write_command ( command [ "cmd" ] + "\n" )
+        for task in tasks:
 
+            task.cancel ()
 
-        #out ID is the message that the next output chain should reply to
-        outID = headerID
+        results = await asyncio.gather ( *tasks, return_exceptions = True )
 
-        output = frotz.read_output_block ()
+    #raise any error that stopped one of the tasks
 
-        if len ( output ) > 0:
-            
-            consoleMsg = "Sending output:\n" + "\n".join( output )
-            logging.info ( consoleMsg )
-            
-            #record the last message sent so that the next output will be
-            #sent as a reply
-            outID = post_tail_status ( tc, output, outID )
+    for result in results:
+
+        if isinstance ( result, Exception ) and \
+           not isinstance ( result, asyncio.CancelledError ):
+
+            raise result
 
+    #the game ended normally so the next game starts from the beginning
 
-        time.sleep ( GAME_LOOP_SLEEP )
+    if game.result () == 0 and session.checkpoints != None:
+
+        session.checkpoints.clear ()
+
+#----------------------------------------------------------------------------
+
+async def run_session ( tc, bannedCmds, session, manager, pool ):
+    """
+    Keeps a session's game running - a new game is taken from the pool 
+    whenever the frotz process exits.
+    """
+
+    while True:
+
+        logging.info ( "Starting frotz: %s", session.storyPath )
+
+        with pool.game () as frotz:
+
+            logging.info ( "Entering game loop: %s", session.storyPath )
+
+            await game_loop ( frotz, tc, bannedCmds, session, manager )
+
+        FROTZ_RESTARTS.labels ( str ( session.name ) ).inc ()
+
+#----------------------------------------------------------------------------
+
+async def run_sessions ( tc, bannedCmds, manager, pools ):
+    """
+    Runs every game held by the manager along with the task that routes
+    commands from the mentions timeline to them.
+
+    pools - dict mapping each story path to the FrotzPool that provides
+            its games
+    """
+
+    tasks = [ run_session ( tc, bannedCmds, s, manager, 
+                            pools [ s.storyPath ] ) 
+              for s in manager.sessions ]
+
+    tasks.append ( poll_session_mentions ( tc, bannedCmds, manager ) )
+
+    await asyncio.gather ( *tasks )
 
 #----------------------------------------------------------------------------
 
@@ -285,25 +868,61 @@ def main ():
 
     logging.info ( "Creating Twitter Connection" )
 
-    #List of commands that will be ignored rather than sent to the game
-    #If more words are to be added to this list it would be a good idea
-    #to put them in a text file and load them
+    #Commands that will be ignored rather than sent to the game.  The file
+    #is loaded again when it is edited.
 
-    bannedCmds = [ "quit" ]
+    bannedCmds = BannedCommands ( BANNED_CMDS_PATH )
 
-    with TwitterConnection () as tc:
+    #spans are only recorded if tracing is configured
+    tracing.load_config ()
 
-        while True:
-        
-            logging.info ( "Starting frotz" )
+    loop = asyncio.get_event_loop ()
+
+    with TwitterConnection () as tc, ExitStack () as stack:
+
+        sessions = []
+
+        for g in GAME_SESSIONS:
+
+            session = GameSession ( g [ "story" ], g.get ( "tag" ) )
+
+            session.checkpoints = CheckpointStore ( 
+                    os.path.join ( CHECKPOINT_DIR, session.name ) )
+
+            sessions.append ( session )
+
+        manager = SessionManager ( sessions )
+
+        load_header_ids ( tc, manager )
+
+        #the bot is unhealthy while calls to twitter keep failing
+        try:
+
+            server = stack.enter_context ( 
+                    MetricsServer ( health = tc.healthy ) )
+
+            logging.info ( "Serving metrics at %s/metrics", server.url )
+
+        except OSError:
+
+            logging.warning ( "Could not start the metrics server", 
+                              exc_info = True )
+
+        #one pool of warm games for each story - sessions playing the 
+        #same story share a pool
+        pools = {}
 
-            with FrotzRunner ( "z8/advent.z8" ) as frotz:
+        for session in sessions:
 
-                logging.info ( "Entering game loop." )
+            if session.storyPath not in pools:
 
-                game_loop ( frotz, tc, bannedCmds )
+                pools [ session.storyPath ] = stack.enter_context (
+                        FrotzPool ( session.storyPath ) )
 
+        logging.info ( "Hosting %d games.", len ( sessions ) )
 
+        loop.run_until_complete ( 
+                run_sessions ( tc, bannedCmds, manager, pools ) )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,475 @@
+# tab_bench.py
+#
+# End to end benchmark for the bot.
+#
+# Runs tab.game_loop against fake_twitter and fake_dfrotz.  Each turn a
+# player mentions the bot with a command and the turn ends when the game's
+# response to that command has been posted.
+#
+# Reports commands per minute, the time from mention to reply, tweets
+# posted per turn and the CPU time and memory used by each part.  The
+# results are saved as JSON and can be compared with an earlier run.
+#
+# Usage: python3 tab_bench.py [options]  ( see --help )
+
+import os, sys, json, time, asyncio, logging, argparse, resource, tempfile
+import subprocess
+
+import tab
+import fake_dfrotz
+
+from fake_twitter import FakeTwitter, BOT_NAME
+from frotz_runner import FrotzRunner
+from twitter_connection import TwitterConnection
+from session_manager import GameSession
+from command_votes import CommandTally
+from command_filter import CommandMatcher, DEFAULT_BANNED_CMDS
+
+KEYS = { "consumer_key"        : "key",
+         "consumer_secret"     : "secret",
+         "access_token"        : "token",
+         "access_token_secret" : "token secret" }
+
+#Calls the fake allows in each window - high enough to never be reached
+RATE_LIMIT = 10**9
+
+#Longest time to wait for the reply to a command in seconds
+REPLY_TIMEOUT = 30
+
+#Results compared by --compare and whether a higher value is better
+COMPARED_RESULTS = [ ( "commands_per_min", True ),
+                     ( "latency_ms.p50", False ),
+                     ( "latency_ms.p95", False ),
+                     ( "latency_ms.p99", False ),
+                     ( "tweets_per_turn", False ),
+                     ( "components.bot.cpu_s", False ),
+                     ( "components.twitter.cpu_s", False ),
+                     ( "components.frotz.cpu_s", False ),
+                     ( "components.bot.max_rss_kb", False ),
+                     ( "components.frotz.max_rss_kb", False ) ]
+
+#----------------------------------------------------------------------------
+
+class TimedTwitter ( FakeTwitter ):
+    """
+    FakeTwitter that records when each status is posted and the CPU time
+    its request handlers use.
+    """
+
+    def __init__ ( self, *args, **kwargs ):
+
+        FakeTwitter.__init__ ( self, *args, **kwargs )
+
+        #( time posted, text ) of each status in order
+        self.posted = []
+
+        #called from the server's thread after each status is posted
+        self.onPosted = None
+
+        self.cpuTime = 0.0
+
+    def _handle ( self, request ):
+
+        start = thread_cpu_time ()
+
+        try:
+
+            FakeTwitter._handle ( self, request )
+
+        finally:
+
+            with self._lock:
+
+                self.cpuTime += thread_cpu_time () - start
+
+    def _update ( self, params ):
+
+        status, body = FakeTwitter._update ( self, params )
+
+        if status == 200:
+
+            self.posted.append ( ( time.perf_counter (), body [ "text" ] ) )
+
+            if self.onPosted != None:
+
+                self.onPosted ()
+
+        return status, body
+
+#----------------------------------------------------------------------------
+
+def thread_cpu_time ():
+    """
+    Returns the CPU time used by the calling thread in seconds.
+    """
+
+    usage = resource.getrusage ( resource.RUSAGE_THREAD )
+
+    return usage.ru_utime + usage.ru_stime
+
+#----------------------------------------------------------------------------
+
+def process_usage ( pid ):
+    """
+    Returns ( CPU seconds, peak RSS in KB ) of a running process read from
+    /proc or ( None, None ) if it can not be read.
+    """
+
+    try:
+
+        with open ( "/proc/%d/stat" % pid ) as statFile:
+
+            #the fields after the command name which may contain spaces
+            fields = statFile.read ().rsplit ( ")", 1 ) [ 1 ].split ()
+
+        ticks = int ( fields [ 11 ] ) + int ( fields [ 12 ] )
+
+        cpu = ticks / os.sysconf ( "SC_CLK_TCK" )
+
+        rss = None
+
+        with open ( "/proc/%d/status" % pid ) as statusFile:
+
+            for line in statusFile:
+
+                if line.startswith ( "VmHWM:" ):
+
+                    rss = int ( line.split () [ 1 ] )
+
+        return cpu, rss
+
+    except ( OSError, ValueError, IndexError ):
+
+        return None, None
+
+#----------------------------------------------------------------------------
+
+def percentile ( values, p ):
+    """
+    Returns the p-th percentile of the sorted values by the nearest rank
+    method.
+    """
+
+    if len ( values ) == 0:
+
+        return None
+
+    rank = max ( 1, int ( -( -p * len ( values ) // 100 ) ) )
+
+    return values [ min ( rank, len ( values ) ) - 1 ]
+
+#----------------------------------------------------------------------------
+
+def git_commit ():
+
+    try:
+
+        return subprocess.check_output (
+                [ "git", "rev-parse", "--short", "HEAD" ],
+                stderr = subprocess.DEVNULL,
+                cwd = os.path.dirname ( os.path.abspath ( __file__ ) )
+                ).decode ().strip ()
+
+    except ( OSError, subprocess.CalledProcessError ):
+
+        return None
+
+#----------------------------------------------------------------------------
+
+async def play_turns ( fake, turns, players ):
+    """
+    Mentions the bot with a command for each turn and waits for the reply.
+    Returns the mention to reply time of each turn in seconds.
+    """
+
+    latencies = []
+
+    loop = asyncio.get_event_loop ()
+
+    posted = asyncio.Event ()
+
+    fake.onPosted = lambda: loop.call_soon_threadsafe ( posted.set )
+
+    seen = len ( fake.posted )
+
+    for turn in range ( turns ):
+
+        cmd = "examine thing %d" % turn
+
+        #the fake game repeats commands it does not know in its response
+        reply = fake_dfrotz.DEFAULT_RESPONSE % cmd
+
+        sent = time.perf_counter ()
+
+        for player in range ( players ):
+
+            fake.add_mention ( "@%s cmd %s" % ( BOT_NAME, cmd ),
+                               "player%d_%d" % ( turn, player ) )
+
+        while True:
+
+            posted.clear ()
+
+            statuses = fake.posted [ seen : ]
+
+            seen += len ( statuses )
+
+            found = [ t for t, text in statuses if reply in text ]
+
+            if len ( found ) > 0:
+
+                latencies.append ( found [ 0 ] - sent )
+
+                break
+
+            try:
+
+                await asyncio.wait_for ( posted.wait (), REPLY_TIMEOUT )
+
+            except asyncio.TimeoutError:
+
+                raise RuntimeError ( "No reply to: " + cmd )
+
+    return latencies
+
+#----------------------------------------------------------------------------
+
+async def run_bot ( args, fake, tc, frotz ):
+    """
+    Runs the game loop and the mention poller while the turns are played.
+    Returns ( seconds, latencies, statuses posted ).
+    """
+
+    session = GameSession ( None )
+
+    #every mention is a vote so the command is sent as soon as it is seen
+    session.tally = CommandTally ( window = 0 )
+
+    bannedCmds = CommandMatcher.from_lines ( DEFAULT_BANNED_CMDS )
+
+    tasks = [ asyncio.ensure_future (
+                      tab.game_loop ( frotz, tc, bannedCmds, session ) ),
+              asyncio.ensure_future (
+                      tab.poll_mentions ( tc, bannedCmds, session ) ) ]
+
+    try:
+
+        #wait for the opening of the game to be posted
+        while len ( fake.posted ) < 2:
+
+            await asyncio.sleep ( 0.01 )
+
+        start = time.perf_counter ()
+        posted = len ( fake.posted )
+
+        player = asyncio.ensure_future (
+                play_turns ( fake, args.turns, args.players ) )
+
+        await asyncio.wait ( [ player ] + tasks,
+                             return_when = asyncio.FIRST_COMPLETED )
+
+        if not player.done ():
+
+            player.cancel ()
+
+            #raise the error that stopped the bot
+            for task in tasks:
+
+                if task.done ():
+
+                    task.result ()
+
+            raise RuntimeError ( "The bot stopped during the benchmark" )
+
+        latencies = player.result ()
+
+        return ( time.perf_counter () - start, latencies,
+                 len ( fake.posted ) - posted )
+
+    finally:
+
+        for task in tasks:
+
+            task.cancel ()
+
+        await asyncio.gather ( *tasks, return_exceptions = True )
+
+#----------------------------------------------------------------------------
+
+def run ( args ):
+    """
+    Runs the benchmark and returns the results as a dict.
+    """
+
+    tab.MENTION_POLL_SLEEP = args.poll_interval
+
+    rateLimits = { "statuses/update"            : RATE_LIMIT,
+                   "statuses/mentions_timeline" : RATE_LIMIT }
+
+    interpreter = fake_dfrotz.interpreter_command ( args.frotz_latency,
+                                                   args.output_size )
+
+    loop = asyncio.get_event_loop ()
+
+    with tempfile.TemporaryDirectory () as tmp, \
+         TimedTwitter ( rateLimits = rateLimits,
+                        latency = args.twitter_latency ) as fake:
+
+        keys = dict ( KEYS, api_url = fake.url )
+
+        statePath = os.path.join ( tmp, "state.db" )
+
+        with TwitterConnection ( statePath, keys = keys ) as tc, \
+             FrotzRunner ( "story.z8", interpreter = interpreter ) as frotz:
+
+            cpuStart = time.process_time ()
+            twitterStart = fake.cpuTime
+            frotzStart = process_usage ( frotz.subP.pid ) [ 0 ]
+
+            elapsed, latencies, tweets = loop.run_until_complete (
+                    run_bot ( args, fake, tc, frotz ) )
+
+            frotzCPU, frotzRSS = process_usage ( frotz.subP.pid )
+
+            twitterCPU = fake.cpuTime - twitterStart
+            botCPU = time.process_time () - cpuStart - twitterCPU
+
+    latencies.sort ()
+
+    ms = [ 1000 * l for l in latencies ]
+
+    if frotzCPU != None and frotzStart != None:
+
+        frotzCPU -= frotzStart
+
+    return { "commit"           : git_commit (),
+             "time"             : time.strftime ( "%Y-%m-%dT%H:%M:%S" ),
+             "config"           : vars ( args ),
+             "turns"            : args.turns,
+             "seconds"          : elapsed,
+             "commands_per_min" : 60 * args.turns / elapsed,
+             "latency_ms"       : { "p50"  : percentile ( ms, 50 ),
+                                    "p95"  : percentile ( ms, 95 ),
+                                    "p99"  : percentile ( ms, 99 ),
+                                    "mean" : sum ( ms ) / len ( ms ),
+                                    "max"  : ms [ -1 ] },
+             "tweets_per_turn"  : tweets / args.turns,
+             "components"       :
+             {
+                 #the fake twitter server runs in the bot's process so
+                 #its memory is counted with the bot's
+                 "bot"     : { "cpu_s"      : botCPU,
+                               "max_rss_kb" : resource.getrusage (
+                                       resource.RUSAGE_SELF ).ru_maxrss },
+                 "twitter" : { "cpu_s"      : twitterCPU },
+                 "frotz"   : { "cpu_s"      : frotzCPU,
+                               "max_rss_kb" : frotzRSS }
+             } }
+
+#----------------------------------------------------------------------------
+
+def lookup ( results, name ):
+    """
+    Returns the value of a dotted name e.g. 'latency_ms.p50' or None.
+    """
+
+    for key in name.split ( "." ):
+
+        if not isinstance ( results, dict ):
+
+            return None
+
+        results = results.get ( key )
+
+    return results
+
+#----------------------------------------------------------------------------
+
+def report ( results, baseline = None ):
+    """
+    Returns the results as lines of text.  If a baseline is given the
+    change from it is shown and changes for the worse are marked.
+    """
+
+    lines = [ "commit %s  %d turns in %.2f s" %
+              ( results [ "commit" ], results [ "turns" ],
+                results [ "seconds" ] ) ]
+
+    for name, higherIsBetter in COMPARED_RESULTS:
+
+        value = lookup ( results, name )
+
+        if value == None:
+
+            continue
+
+        line = "%-28s %12.3f" % ( name, value )
+
+        old = lookup ( baseline, name ) if baseline != None else None
+
+        if old:
+
+            change = 100.0 * ( value - old ) / old
+
+            worse = change < 0 if higherIsBetter else change > 0
+
+            line += " %+8.1f%%%s" % ( change, "  <-- worse" if worse else "" )
+
+        lines.append ( line )
+
+    return lines
+
+#----------------------------------------------------------------------------
+
+def parse_args ( argv ):
+
+    parser = argparse.ArgumentParser (
+            description = "End to end benchmark for the bot." )
+
+    parser.add_argument ( "--turns", type = int, default = 200 )
+    parser.add_argument ( "--players", type = int, default = 1,
+                          help = "mentions sent for each command" )
+    parser.add_argument ( "--poll-interval", type = float, default = 0.01,
+                          help = "seconds between mention checks" )
+    parser.add_argument ( "--twitter-latency", type = float, default = 0,
+                          help = "seconds taken by each API call" )
+    parser.add_argument ( "--frotz-latency", type = float, default = 0,
+                          help = "seconds taken by each game turn" )
+    parser.add_argument ( "--output-size", type = int, default = 0,
+                          help = "bytes of game output each turn" )
+    parser.add_argument ( "--out", default = "tab_bench.json",
+                          help = "file the results are saved to" )
+    parser.add_argument ( "--compare",
+                          help = "results file of an earlier run" )
+
+    return parser.parse_args ( argv )
+
+#----------------------------------------------------------------------------
+
+def main ():
+
+    args = parse_args ( sys.argv [ 1 : ] )
+
+    #log at the bot's level but throw the messages away so the cost of
+    #the log calls is measured without the cost of printing them
+    logging.basicConfig ( level = logging.INFO,
+                          handlers = [ logging.NullHandler () ] )
+
+    results = run ( args )
+
+    baseline = None
+
+    if args.compare != None:
+
+        with open ( args.compare ) as baselineFile:
+
+            baseline = json.load ( baselineFile )
+
+    print ( "\n".join ( report ( results, baseline ) ) )
+
+    with open ( args.out, "w" ) as outFile:
+
+        json.dump ( results, outFile, indent = 2, sort_keys = True )
+
+if __name__ == "__main__":
+    sys.exit ( main () )
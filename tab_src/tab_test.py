@@ -1,6 +1,45 @@
 #tab_test.py
 
+import time, asyncio
+
 import tab
+import fake_dfrotz
+
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+from frotz_runner import FrotzRunner
+from session_manager import GameSession, SessionManager
+from mention import Mention
+from command_votes import CommandTally
+from command_filter import CommandMatcher
+from user_throttle import UserThrottle
+
+#----------------------------------------------------------------------------
+
+class FakeConnection:
+    """
+    Stands in for TwitterConnection and returns the same mentions from
+    every check.
+    """
+
+    def __init__ ( self, mentions ):
+
+        self.mentions = mentions
+
+        self.checks = 0
+
+    def get_latest_mentions ( self ):
+
+        self.checks += 1
+
+        return list ( self.mentions )
+
+    def mark_mentions_processed ( self ):
+
+        pass
+
+#----------------------------------------------------------------------------
 
 def test_cmd_from_text ():
 
@@ -146,3 +185,154 @@ def test_cmd_from_text ():
 
         assert ( output == test [ "cmd" ] ),  test  #output testcase on fail
 
+
+#----------------------------------------------------------------------------
+
+def test_cmd_from_text_banned_commands ():
+
+    bannedCmds = CommandMatcher.from_lines ( [ "^quit", "^save", "rude" ] )
+
+    testCases = \
+    [
+        { "text" : "cmd quit",               "cmd" : None         },
+        { "text" : "cmd save now",           "cmd" : None         },
+        { "text" : "cmd you are rude",       "cmd" : None         },
+        { "text" : "cmd you are RUDE!",      "cmd" : None         },
+        { "text" : "cmd do not quit",        "cmd" : "do not quit" },
+        { "text" : "cmd go north",           "cmd" : "go north"   }
+    ]
+
+    for test in testCases:
+
+        output = tab.cmd_from_text ( test [ "text" ], bannedCmds ) 
+
+        assert ( output == test [ "cmd" ] ), test
+
+#----------------------------------------------------------------------------
+
+def test_check_mentions_throttled ():
+
+    tc = FakeConnection ( [ Mention ( "cmd look", 1, "spammer" ),
+                            Mention ( "cmd look", 2, "spammer" ),
+                            Mention ( "cmd look", 3, "spammer" ),
+                            Mention ( "cmd go north", 4, "player" ) ] )
+
+    throttle = UserThrottle ( burst = 1, rate = 0 )
+
+    tally = CommandTally ( window = 0 )
+
+    winner = tab.check_mentions_for_cmd ( tc, [ "quit" ], tally, throttle )
+
+    #only the first mention from each player is counted so the tie goes
+    #to the first command
+    assert ( winner == { "cmd" : "look", "username" : "spammer",
+                         "votes" : 1 } )
+
+    assert ( tab.check_mentions_for_cmd ( tc, [ "quit" ], tally, 
+                                          throttle ) == None )
+
+#----------------------------------------------------------------------------
+
+def test_more_games_than_workers ( monkeypatch ):
+
+    monkeypatch.setattr ( tab, "MENTION_POLL_SLEEP", 60 )
+
+    games = 6
+
+    interpreter = fake_dfrotz.interpreter_command ()
+
+    loop = asyncio.new_event_loop ()
+
+    loop.set_default_executor ( ThreadPoolExecutor ( max_workers = 2 ) )
+
+    async def play ():
+
+        sessions = [ GameSession ( None ) for i in range ( games ) ]
+
+        outbox = asyncio.Queue ()
+
+        tc = FakeConnection ( [] )
+
+        with ExitStack () as stack:
+
+            runners = [ stack.enter_context ( 
+                            FrotzRunner ( "story.z8", 
+                                          interpreter = interpreter ) )
+                        for session in sessions ]
+
+            tasks = [ asyncio.ensure_future ( 
+                            tab.run_game ( frotz, session, outbox ) )
+                      for frotz, session in zip ( runners, sessions ) ]
+
+            try:
+
+                #every game is waiting for a command once its intro is out
+                for session in sessions:
+
+                    await outbox.get ()
+
+                start = time.monotonic ()
+
+                #blocking work e.g. a checkpoint still gets a thread
+                await asyncio.wait_for ( 
+                        loop.run_in_executor ( None, time.sleep, 0 ), 5 )
+
+                tasks.append ( asyncio.ensure_future ( 
+                        tab.poll_session_mentions ( 
+                                tc, [], SessionManager ( sessions ) ) ) )
+
+                while tc.checks == 0 and time.monotonic () - start < 5:
+
+                    await asyncio.sleep ( 0.01 )
+
+                return time.monotonic () - start
+
+            finally:
+
+                for task in tasks:
+
+                    task.cancel ()
+
+                await asyncio.gather ( *tasks, return_exceptions = True )
+
+    try:
+
+        elapsed = loop.run_until_complete ( play () )
+
+    finally:
+
+        loop.close ()
+
+    assert ( elapsed < 1 ), elapsed
+
+#----------------------------------------------------------------------------
+
+def test_run_game_ends_with_game ():
+
+    interpreter = fake_dfrotz.interpreter_command ( crashAfter = 1 )
+
+    loop = asyncio.new_event_loop ()
+
+    async def play ():
+
+        session = GameSession ( None )
+
+        outbox = asyncio.Queue ()
+
+        with FrotzRunner ( "story.z8", interpreter = interpreter ) as frotz:
+
+            game = asyncio.ensure_future ( 
+                    tab.run_game ( frotz, session, outbox ) )
+
+            await session.commands.put ( { "cmd" : "look", 
+                                           "username" : "player" } )
+
+            return await asyncio.wait_for ( game, 5 )
+
+    try:
+
+        assert ( loop.run_until_complete ( play () ) == 1 )
+
+    finally:
+
+        loop.close ()
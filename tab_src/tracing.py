@@ -0,0 +1,627 @@
+#############################################################################
+# tracing.py
+#----------------------------------------------------------------------------
+# Lightweight tracing so the time taken by each step of a turn can be
+# seen - from the mention holding a command through the game to the chain
+# of tweets that replies to it.
+#
+# A trace is a tree of spans.  Each span times one step and knows the
+# trace it belongs to and its parent span.  Spans are written to a JSON
+# lines file or sent to an OTLP collector.
+#
+# Usage:
+#
+#   with tracing.TRACER.span ( "check_mentions" ) as span:
+#
+#       span.set ( "mentions", 3 )
+#
+# The span is the current span of the thread inside the with block so
+# spans started by the calls it makes become its children.  A span's
+# context can be handed to another thread or task and passed as the
+# parent of the spans started there.
+#############################################################################
+
+import os, json, time, random, logging, threading
+
+from contextlib import contextmanager
+
+import requests
+
+#----------------------------------------------------------------------------
+
+#Location of the tracing configuration.  Tracing is off if it is missing.
+#See sample_tracing.json.
+TRACING_CONFIG_PATH = os.path.join ( "config", "tracing.json" )
+
+#Fraction of traces recorded when the configuration does not say
+DEFAULT_SAMPLE_RATE = 0.1
+
+#Name the bot's spans are reported under
+SERVICE_NAME = "tab"
+
+#How often the OTLP exporter sends the spans it has collected in seconds
+EXPORT_INTERVAL = 5
+
+#Most spans sent to the collector in one request
+EXPORT_BATCH_SIZE = 512
+
+#Most spans held waiting to be sent.  Further spans are dropped so a
+#collector that is down can not use up the bot's memory.
+MAX_QUEUED_SPANS = 10000
+
+#Longest wait for the collector to answer in seconds
+EXPORT_TIMEOUT = 10
+
+#----------------------------------------------------------------------------
+
+class SpanContext:
+    """
+    Identifies a span so that spans started elsewhere can be its children.
+
+    sampled - False if the trace is not being recorded.  Its spans are
+              still created so the decision is passed on to them.
+    """
+
+    __slots__ = ( "traceID", "spanID", "sampled" )
+
+    def __init__ ( self, traceID, spanID, sampled = True ):
+
+        self.traceID = traceID
+        self.spanID = spanID
+        self.sampled = sampled
+
+    def __repr__ ( self ):
+
+        return "SpanContext(%s, %s, %r)" % ( self.traceID, self.spanID,
+                                             self.sampled )
+
+#----------------------------------------------------------------------------
+
+class Span:
+    """
+    Times one step of a trace.  The span is exported when end is called.
+    Used as a context manager the span is the thread's current span
+    until it ends.
+    """
+
+    __slots__ = ( "tracer", "name", "context", "parentID", "start",
+                  "end_time", "attributes", "error", "_previous" )
+
+    def __init__ ( self, tracer, name, context, parentID, attributes ):
+
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parentID = parentID
+        self.attributes = attributes
+
+        self.start = time.time ()
+        self.end_time = None
+
+        #set if the step failed
+        self.error = None
+
+        self._previous = None
+
+    #------------------------------------------------------------------------
+
+    def set ( self, key, value ):
+
+        self.attributes [ key ] = value
+
+    #------------------------------------------------------------------------
+
+    def end ( self ):
+
+        if self.end_time != None:
+
+            return
+
+        self.end_time = time.time ()
+
+        if self.context.sampled:
+
+            self.tracer._export ( self )
+
+    #------------------------------------------------------------------------
+
+    def __enter__ ( self ):
+
+        self._previous = self.tracer._swap ( self.context )
+
+        return self
+
+    def __exit__ ( self, excType, excValue, traceback ):
+
+        self.tracer._swap ( self._previous )
+
+        if excValue != None and self.error == None:
+
+            self.error = repr ( excValue )
+
+        self.end ()
+
+    #------------------------------------------------------------------------
+
+    def to_dict ( self ):
+        """
+        Returns the span in the form written to JSON lines files.
+        """
+
+        record = { "trace_id"    : self.context.traceID,
+                   "span_id"     : self.context.spanID,
+                   "parent_id"   : self.parentID,
+                   "name"        : self.name,
+                   "start"       : self.start,
+                   "end"         : self.end_time,
+                   "duration_ms" : 1000 * ( self.end_time - self.start ),
+                   "attributes"  : self.attributes }
+
+        if self.error != None:
+
+            record [ "error" ] = self.error
+
+        return record
+
+#----------------------------------------------------------------------------
+
+class _NoopSpan:
+    """
+    Span returned while tracing is off.  Does nothing.
+    """
+
+    context = None
+
+    def set ( self, key, value ):
+
+        pass
+
+    def end ( self ):
+
+        pass
+
+    def __enter__ ( self ):
+
+        return self
+
+    def __exit__ ( self, *args ):
+
+        pass
+
+NOOP_SPAN = _NoopSpan ()
+
+#----------------------------------------------------------------------------
+
+class Tracer:
+    """
+    Starts spans and hands the finished ones to the exporter.
+
+    exporter   - object with export ( span ) and close () methods e.g. a
+                 JsonLinesExporter.  Tracing is off if it is None.
+
+    sampleRate - fraction of traces recorded.  The choice is made when a
+                 trace starts and every span of the trace follows it.
+    """
+
+    def __init__ ( self, exporter = None, sampleRate = DEFAULT_SAMPLE_RATE,
+                   random = random.random ):
+
+        self.exporter = exporter
+        self.sampleRate = sampleRate
+
+        self._random = random
+
+        #the current span context of each thread
+        self._local = threading.local ()
+
+    #------------------------------------------------------------------------
+
+    @property
+    def enabled ( self ):
+
+        return self.exporter != None
+
+    #------------------------------------------------------------------------
+
+    def configure ( self, exporter, sampleRate = DEFAULT_SAMPLE_RATE ):
+        """
+        Replaces the exporter and sample rate.  The old exporter is
+        closed.
+        """
+
+        old, self.exporter = self.exporter, exporter
+
+        self.sampleRate = sampleRate
+
+        if old != None and old is not exporter:
+
+            old.close ()
+
+    def close ( self ):
+
+        self.configure ( None )
+
+    #------------------------------------------------------------------------
+
+    def current ( self ):
+        """
+        Returns the context of the calling thread's current span or None.
+        """
+
+        return getattr ( self._local, "context", None )
+
+    def _swap ( self, context ):
+
+        previous = getattr ( self._local, "context", None )
+
+        self._local.context = context
+
+        return previous
+
+    @contextmanager
+    def activate ( self, context ):
+        """
+        Context manager that makes the span context the calling thread's
+        current context e.g. so a worker thread's spans join a trace.
+        """
+
+        previous = self._swap ( context )
+
+        try:
+
+            yield
+
+        finally:
+
+            self._swap ( previous )
+
+    #------------------------------------------------------------------------
+
+    def span ( self, name, parent = None, root = True, **attributes ):
+        """
+        Starts a span.
+
+        parent - SpanContext of the parent span.  Defaults to the calling
+                 thread's current span.
+
+        root   - if False and there is no parent the step is not part of
+                 a trace so no span is recorded.  Used for steps that are
+                 only interesting as part of a larger one.
+
+        Returns the span or NOOP_SPAN if tracing is off.
+        """
+
+        if self.exporter == None:
+
+            return NOOP_SPAN
+
+        if parent == None:
+
+            parent = self.current ()
+
+        if parent != None:
+
+            context = SpanContext ( parent.traceID, new_id ( 64 ),
+                                    parent.sampled )
+
+            return Span ( self, name, context, parent.spanID, attributes )
+
+        if not root:
+
+            return NOOP_SPAN
+
+        sampled = self._random () < self.sampleRate
+
+        context = SpanContext ( new_id ( 128 ), new_id ( 64 ), sampled )
+
+        return Span ( self, name, context, None, attributes )
+
+    #------------------------------------------------------------------------
+
+    def _export ( self, span ):
+
+        exporter = self.exporter
+
+        if exporter == None:
+
+            return
+
+        try:
+
+            exporter.export ( span )
+
+        except Exception:
+
+            logging.warning ( "Failed to export span: %s", span.name,
+                              exc_info = True )
+
+#----------------------------------------------------------------------------
+
+#Tracer used by the bot's modules
+TRACER = Tracer ()
+
+#----------------------------------------------------------------------------
+
+def new_id ( bits ):
+    """
+    Returns a random ID of the given number of bits as a hex string in the
+    form used by OTLP.
+    """
+
+    return "%0*x" % ( bits // 4, random.getrandbits ( bits ) )
+
+#----------------------------------------------------------------------------
+
+class JsonLinesExporter:
+    """
+    Appends each span to a file as a line of JSON.  See Span.to_dict.
+    """
+
+    def __init__ ( self, path ):
+
+        directory = os.path.dirname ( path )
+
+        if directory != "":
+
+            os.makedirs ( directory, exist_ok = True )
+
+        self.path = path
+
+        self._lock = threading.Lock ()
+
+        self._file = open ( path, "a" )
+
+    def export ( self, span ):
+
+        line = json.dumps ( span.to_dict (), default = str ) + "\n"
+
+        with self._lock:
+
+            if self._file != None:
+
+                self._file.write ( line )
+                self._file.flush ()
+
+    def close ( self ):
+
+        with self._lock:
+
+            if self._file != None:
+
+                self._file.close ()
+
+                self._file = None
+
+#----------------------------------------------------------------------------
+
+class OTLPExporter:
+    """
+    Sends spans to an OTLP collector in the OTLP/HTTP JSON format.
+
+    Spans are collected and sent in batches from a background thread so
+    the bot never waits for the collector.  Spans that can not be sent
+    are dropped.
+
+    url - address of the collector e.g. http://127.0.0.1:4318.  Spans are
+          posted to url/v1/traces.
+    """
+
+    def __init__ ( self, url, interval = EXPORT_INTERVAL,
+                   batchSize = EXPORT_BATCH_SIZE,
+                   maxQueued = MAX_QUEUED_SPANS ):
+
+        self.url = url.rstrip ( "/" ) + "/v1/traces"
+
+        self.interval = interval
+        self.batchSize = batchSize
+        self.maxQueued = maxQueued
+
+        self._session = requests.Session ()
+
+        self._queue = []
+
+        self._dropped = 0
+
+        self._closed = False
+
+        self._wake = threading.Condition ()
+
+        self._thread = threading.Thread ( target = self._run,
+                                          name = "otlp-exporter",
+                                          daemon = True )
+        self._thread.start ()
+
+    #------------------------------------------------------------------------
+
+    def export ( self, span ):
+
+        with self._wake:
+
+            if len ( self._queue ) >= self.maxQueued:
+
+                self._dropped += 1
+
+                return
+
+            self._queue.append ( span )
+
+            if len ( self._queue ) >= self.batchSize:
+
+                self._wake.notify ()
+
+    #------------------------------------------------------------------------
+
+    def close ( self ):
+        """
+        Sends the spans that are waiting and stops the thread.
+        """
+
+        with self._wake:
+
+            self._closed = True
+
+            self._wake.notify ()
+
+        self._thread.join ()
+
+        self._session.close ()
+
+    #------------------------------------------------------------------------
+
+    def _run ( self ):
+
+        while True:
+
+            with self._wake:
+
+                if not self._closed and len ( self._queue ) < self.batchSize:
+
+                    self._wake.wait ( self.interval )
+
+                batch = self._queue [ : self.batchSize ]
+
+                del self._queue [ : self.batchSize ]
+
+                dropped, self._dropped = self._dropped, 0
+
+                closed = self._closed and len ( self._queue ) == 0
+
+            if dropped > 0:
+
+                logging.warning ( "Dropped %d spans - collector too slow",
+                                  dropped )
+
+            if len ( batch ) > 0:
+
+                self._send ( batch )
+
+            if closed:
+
+                return
+
+    #------------------------------------------------------------------------
+
+    def _send ( self, batch ):
+
+        try:
+
+            response = self._session.post ( self.url,
+                                            json = otlp_request ( batch ),
+                                            timeout = EXPORT_TIMEOUT )
+
+            if response.status_code >= 300:
+
+                logging.warning ( "Collector refused %d spans: %d",
+                                  len ( batch ), response.status_code )
+
+        except requests.RequestException:
+
+            logging.warning ( "Could not send %d spans to %s",
+                              len ( batch ), self.url )
+
+#----------------------------------------------------------------------------
+
+def otlp_value ( value ):
+    """
+    Returns an attribute value in OTLP's JSON form.
+    """
+
+    if isinstance ( value, bool ):
+
+        return { "boolValue" : value }
+
+    if isinstance ( value, int ):
+
+        return { "intValue" : str ( value ) }
+
+    if isinstance ( value, float ):
+
+        return { "doubleValue" : value }
+
+    return { "stringValue" : str ( value ) }
+
+#----------------------------------------------------------------------------
+
+def otlp_span ( span ):
+
+    record = { "traceId"           : span.context.traceID,
+               "spanId"            : span.context.spanID,
+               "name"              : span.name,
+               "kind"              : 1,
+               "startTimeUnixNano" : str ( int ( span.start * 1e9 ) ),
+               "endTimeUnixNano"   : str ( int ( span.end_time * 1e9 ) ),
+               "attributes"        : [ { "key"   : k, 
+                                         "value" : otlp_value ( v ) }
+                                       for k, v in span.attributes.items () ] }
+
+    if span.parentID != None:
+
+        record [ "parentSpanId" ] = span.parentID
+
+    if span.error != None:
+
+        #STATUS_CODE_ERROR
+        record [ "status" ] = { "code" : 2, "message" : span.error }
+
+    return record
+
+#----------------------------------------------------------------------------
+
+def otlp_request ( spans ):
+    """
+    Returns the body of an OTLP/HTTP JSON export request for the spans.
+    """
+
+    resource = { "attributes" : [ { "key"   : "service.name",
+                                    "value" : otlp_value ( SERVICE_NAME ) } ] }
+
+    return { "resourceSpans" :
+             [ { "resource"   : resource,
+                 "scopeSpans" : [ { "scope" : { "name" : SERVICE_NAME },
+                                    "spans" : [ otlp_span ( s )
+                                                for s in spans ] } ] } ] }
+
+#----------------------------------------------------------------------------
+
+def load_config ( path = TRACING_CONFIG_PATH ):
+    """
+    Configures TRACER from a JSON file of the form:
+
+        { "sample_rate" : 0.1,
+          "jsonl_path"  : "traces.jsonl",
+          "otlp_url"    : "http://127.0.0.1:4318" }
+
+    Spans go to the collector if otlp_url is given otherwise to the JSON
+    lines file.  Tracing stays off if the file does not exist.  Returns
+    True if tracing was turned on.
+    """
+
+    if not os.path.exists ( path ):
+
+        return False
+
+    with open ( path ) as configFile:
+
+        config = json.load ( configFile )
+
+    sampleRate = float ( config.get ( "sample_rate", DEFAULT_SAMPLE_RATE ) )
+
+    if config.get ( "otlp_url" ) != None:
+
+        exporter = OTLPExporter ( config [ "otlp_url" ] )
+
+        logging.info ( "Sending traces to %s", config [ "otlp_url" ] )
+
+    elif config.get ( "jsonl_path" ) != None:
+
+        exporter = JsonLinesExporter ( config [ "jsonl_path" ] )
+
+        logging.info ( "Writing traces to %s", config [ "jsonl_path" ] )
+
+    else:
+
+        return False
+
+    TRACER.configure ( exporter, sampleRate )
+
+    return True
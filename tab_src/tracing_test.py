@@ -0,0 +1,256 @@
+#############################################################################
+# tracing_test.py
+#----------------------------------------------------------------------------
+# Tests the tracing of steps and the export of spans.
+#############################################################################
+
+import os, json, asyncio, threading
+
+import tab
+import tracing
+import fake_dfrotz
+
+from tracing import *
+from fake_collector import FakeCollector
+from fake_twitter import FakeTwitter
+from frotz_runner import FrotzRunner
+from twitter_connection import TwitterConnection
+from session_manager import GameSession
+from command_votes import CommandTally
+
+KEYS = { "consumer_key"        : "key",
+         "consumer_secret"     : "secret",
+         "access_token"        : "token",
+         "access_token_secret" : "token secret" }
+
+#----------------------------------------------------------------------------
+
+class ListExporter:
+
+    def __init__ ( self ):
+
+        self.spans = []
+
+    def export ( self, span ):
+
+        self.spans.append ( span )
+
+    def close ( self ):
+
+        pass
+
+#----------------------------------------------------------------------------
+
+def test_spans ():
+
+    exporter = ListExporter ()
+
+    tracer = Tracer ( exporter, sampleRate = 1 )
+
+    #steps that are only part of a larger step are not traced alone
+    assert ( tracer.span ( "child", root = False ) is NOOP_SPAN )
+
+    with tracer.span ( "root", a = 1 ) as root:
+
+        with tracer.span ( "child", root = False ) as child:
+
+            child.set ( "b", 2 )
+
+        #a context handed to another thread joins the trace
+        def work ():
+
+            with tracer.activate ( root.context ):
+
+                with tracer.span ( "worker", root = False ):
+
+                    pass
+
+        thread = threading.Thread ( target = work )
+        thread.start ()
+        thread.join ()
+
+    assert ( tracer.current () == None )
+
+    assert ( [ s.name for s in exporter.spans ] == 
+             [ "child", "worker", "root" ] )
+
+    for span in exporter.spans:
+
+        assert ( span.context.traceID == root.context.traceID )
+
+    assert ( root.parentID == None )
+    assert ( exporter.spans [ 0 ].parentID == root.context.spanID )
+    assert ( exporter.spans [ 1 ].parentID == root.context.spanID )
+
+    assert ( root.attributes == { "a" : 1 } )
+    assert ( exporter.spans [ 0 ].attributes == { "b" : 2 } )
+
+#----------------------------------------------------------------------------
+
+def test_sampling_and_errors ():
+
+    exporter = ListExporter ()
+
+    draws = [ 0.5, 0.05 ]
+
+    tracer = Tracer ( exporter, sampleRate = 0.1,
+                      random = lambda: draws.pop ( 0 ) )
+
+    #the trace is not sampled so none of its spans are exported
+    with tracer.span ( "skipped" ) as skipped:
+
+        with tracer.span ( "child" ):
+
+            pass
+
+    assert ( not skipped.context.sampled )
+    assert ( exporter.spans == [] )
+
+    try:
+
+        with tracer.span ( "failed" ):
+
+            raise ValueError ( "bad" )
+
+    except ValueError:
+
+        pass
+
+    assert ( [ s.name for s in exporter.spans ] == [ "failed" ] )
+    assert ( exporter.spans [ 0 ].error == "ValueError('bad')" )
+
+    #tracing is off without an exporter
+    assert ( Tracer ().span ( "x" ) is NOOP_SPAN )
+
+#----------------------------------------------------------------------------
+
+def test_json_lines_exporter ( tmp_path ):
+
+    path = os.path.join ( str ( tmp_path ), "traces.jsonl" )
+
+    tracer = Tracer ( JsonLinesExporter ( path ), sampleRate = 1 )
+
+    with tracer.span ( "root" ) as root:
+
+        with tracer.span ( "child", count = 3 ):
+
+            pass
+
+    tracer.close ()
+
+    with open ( path ) as f:
+
+        spans = [ json.loads ( line ) for line in f ]
+
+    assert ( [ s [ "name" ] for s in spans ] == [ "child", "root" ] )
+
+    assert ( spans [ 0 ] [ "parent_id" ] == root.context.spanID )
+    assert ( spans [ 0 ] [ "attributes" ] == { "count" : 3 } )
+    assert ( spans [ 1 ] [ "trace_id" ] == root.context.traceID )
+    assert ( spans [ 1 ] [ "duration_ms" ] >= 0 )
+
+#----------------------------------------------------------------------------
+
+def test_otlp_exporter ():
+
+    with FakeCollector () as collector:
+
+        tracer = Tracer ( OTLPExporter ( collector.url ), sampleRate = 1 )
+
+        with tracer.span ( "root", ok = True, size = 2, rate = 0.5 ) as root:
+
+            with tracer.span ( "child" ):
+
+                pass
+
+        #closing sends the spans that are waiting
+        tracer.close ()
+
+    assert ( collector.traces () == 
+             { root.context.traceID : [ "child", "root" ] } )
+
+    child, rootSpan = collector.spans
+
+    assert ( child [ "parentSpanId" ] == root.context.spanID )
+    assert ( "parentSpanId" not in rootSpan )
+
+    assert ( rootSpan [ "attributes" ] == 
+             [ { "key" : "ok",   "value" : { "boolValue"   : True } },
+               { "key" : "size", "value" : { "intValue"    : "2" } },
+               { "key" : "rate", "value" : { "doubleValue" : 0.5 } } ] )
+
+#----------------------------------------------------------------------------
+
+def test_trace_follows_command ( tmp_path, monkeypatch ):
+
+    monkeypatch.setattr ( tab, "MENTION_POLL_SLEEP", 0.01 )
+
+    exporter = ListExporter ()
+
+    tracing.TRACER.configure ( exporter, sampleRate = 1 )
+
+    statePath = os.path.join ( str ( tmp_path ), "state.db" )
+
+    interpreter = fake_dfrotz.interpreter_command ()
+
+    session = GameSession ( None )
+    session.tally = CommandTally ( window = 0 )
+
+    async def play ( fake, tc, frotz ):
+
+        tasks = [ asyncio.ensure_future ( 
+                        tab.game_loop ( frotz, tc, [], session ) ),
+                  asyncio.ensure_future ( 
+                        tab.poll_mentions ( tc, [], session ) ) ]
+
+        fake.add_mention ( "@tab_bot cmd xyzzy" )
+
+        reply = fake_dfrotz.DEFAULT_RESPONSE % "xyzzy"
+
+        try:
+
+            for i in range ( 500 ):
+
+                if any ( reply in s [ "text" ] for s in fake.statuses ):
+
+                    break
+
+                await asyncio.sleep ( 0.01 )
+
+        finally:
+
+            for task in tasks:
+
+                task.cancel ()
+
+            await asyncio.gather ( *tasks, return_exceptions = True )
+
+    try:
+
+        with FakeTwitter () as fake, \
+             TwitterConnection ( statePath, 
+                                 keys = dict ( KEYS, 
+                                               api_url = fake.url ) ) as tc, \
+             FrotzRunner ( "story.z8", interpreter = interpreter ) as frotz:
+
+            asyncio.get_event_loop ().run_until_complete ( 
+                    play ( fake, tc, frotz ) )
+
+    finally:
+
+        tracing.TRACER.close ()
+
+    turn = [ s for s in exporter.spans if s.name == "game_turn" ] [ 0 ]
+
+    assert ( turn.attributes [ "cmd" ] == "xyzzy" )
+
+    names = set ( s.name for s in exporter.spans 
+                  if s.context.traceID == turn.context.traceID )
+
+    #the trace runs from the check that found the mention to the posting
+    #of the reply
+    assert ( names >= { "check_mentions", "get_latest_mentions", 
+                        "twitter.call", "parse_mentions", "game_turn", 
+                        "frotz.write_command", "frotz.read_output",
+                        "post_chain", "pack_messages", 
+                        "outbox.post_chain" } )
@@ -8,6 +8,16 @@ import json, threading, queue, time, logging, os
 
 import tweepy
 
+import twitter_text, metrics, tracing
+
+from state_store import StateStore, STATE_PATH
+from rate_limit import RateLimitBudget
+from retry_policy import RetryPolicy, CircuitBreaker
+from outbox import Outbox, TweetRefused
+from session_pool import SessionPool, PooledAPI
+from mention import Mention
+from seen_ids import SeenIDs, SEEN_MENTIONS_SIZE
+
 #Errors thrown during Internet connection interruption:
 
 from ssl import SSLError
@@ -20,14 +30,56 @@ from urllib3.exceptions import NewConnectionError
 #Location of the twitter keys file.
 TWITTER_KEYS_PATH = os.path.join ( "config","twitter_keys.json" )
 
-#How long to sleep after a tweep error message - usually a rate limit error
+#How long to sleep after a rate limit error when the response does not
+#say when the limit resets
 TWEEP_RATE_ERROR_SLEEP = 16*60
 
-#how long to sleep after an API call encounters a connection error
-NETWORK_ERROR_SLEEP = 20*60
+#Names of the API endpoints used for rate limit tracking
+MENTIONS_ENDPOINT = "statuses/mentions_timeline"
+UPDATE_ENDPOINT = "statuses/update"
+
+#Mentions fetched with each call to the mentions timeline
+MENTION_PAGE_SIZE = 200
+
+#Most pages of mentions fetched by one call to get_latest_mentions
+MAX_MENTION_PAGES = 5
+
+#Calls each endpoint can have in progress at once.  Updates are sent one at
+#a time so the tweets of a reply chain are posted in order.
+ENDPOINT_CONCURRENCY = { MENTIONS_ENDPOINT : 1, UPDATE_ENDPOINT : 1 }
+
+#tweepy.API methods sent with the pooled sessions
+POOLED_METHODS = ( "mentions_timeline", "update_status" )
+
+#Tweets are packed to less than this weighted length
+TWEET_PACK_SIZE = twitter_text.MAX_WEIGHTED_TWEET_LENGTH
+
+#Metrics recorded by the connection
 
-#Sleep period after an unexpected error from the twitter API
-UNEXPECTED_ERROR_SLEEP = 60*60
+API_CALLS = metrics.REGISTRY.counter ( 
+        "tab_twitter_calls_total", 
+        "Attempts to call the twitter API by endpoint and outcome",
+        ( "endpoint", "outcome" ) )
+
+API_CALL_SECONDS = metrics.REGISTRY.histogram ( 
+        "tab_twitter_call_seconds", 
+        "Time taken by each attempt to call the twitter API",
+        ( "endpoint", ) )
+
+RATE_LIMIT_SLEEPS = metrics.REGISTRY.counter ( 
+        "tab_rate_limit_sleeps_total", 
+        "Times a call waited for an endpoint's rate limit to reset",
+        ( "endpoint", ) )
+
+RATE_LIMIT_SLEEP_SECONDS = metrics.REGISTRY.counter ( 
+        "tab_rate_limit_sleep_seconds_total", 
+        "Time spent waiting for rate limits to reset",
+        ( "endpoint", ) )
+
+PACKED_TWEETS = metrics.REGISTRY.histogram ( 
+        "tab_packed_tweets", 
+        "Tweets each list of messages was packed into",
+        buckets = ( 1, 2, 3, 5, 8, 13, 21, 34, 55 ) )
 
 #----------------------------------------------------------------------------
 
@@ -43,142 +95,257 @@ def load_keys ():
 
 #----------------------------------------------------------------------------
 
-def pack_messages ( msgList, size = 265 ):
+def pack_messages ( msgList, size = 265, length = len ):
     """
     Packs a list of strings into as few tweet messages as possible.
 
     Splits the msgList up into words so that words will not be split
     across tweets.
 
+    length - function used to measure the words e.g. 
+             twitter_text.weighted_length
+
     Returns a list of strings that can be sent as tweets.
     """
 
+    packed = list ( iter_pack_messages ( msgList, size, length ) )
+
+    PACKED_TWEETS.observe ( len ( packed ) )
+
+    return packed
+
+#----------------------------------------------------------------------------
+
+def iter_pack_messages ( msgList, size = 265, length = len ):
+    """
+    Generator version of pack_messages that yields each tweet as soon as
+    it is full.
+
+    The messages are scanned once so the time taken grows linearly with
+    the length of the output and only the tweet being built is held in
+    memory.
+    """
+
     assert size > 0
 
-    words = []
+    #The words of the tweet being built - Note:  Spaces are included as
+    #words to simplify the process of re-combining them
+    currentTweet = []
+    currentLen = 0
 
-    #Loop through all of the messages in order to combine them into a
-    #single list of words - Note:  Spaces are inserted into the words list
-    #as words to simplify the process of re-combining them
+    for word in _iter_words ( msgList, size, length ):
 
-    msg = " ".join ( msgList )
+        wordLen = length ( word )
+
+        #if the word fits add it - special case for first word
+        if currentLen + wordLen < size or currentLen == 0:
 
+            currentTweet.append ( word )
+            currentLen += wordLen
 
-    msgSplit = msg.split ( ' ' )
+        #not enough room for the word in current tweet
+        else:
 
-    while len ( msgSplit ) > 0:
+            tweet = "".join ( currentTweet )
 
-        word = msgSplit.pop ()
+            #skip any tweets that are just spaces
+            if tweet.strip () != '':
 
-        #call chop_text just for the rare case that the word is too
-        #long for a single tweet
-        chopped = chop_text ( word, size )
+                yield tweet
 
+            currentTweet = [ word ]
+            currentLen = wordLen
 
-        # Need to reverse the chopped list in case the word was split
-        # since the next phase expects the list in reverse order
-        words = [ *words, *reversed ( chopped ) ]
+    tweet = "".join ( currentTweet )
 
-        if len ( msgSplit ) > 0:
+    if tweet.strip () != '':
 
-            words.append ( " " )
+        yield tweet
 
-    tweets = []
+#----------------------------------------------------------------------------
 
-    currentTweet = ""
+def _iter_words ( msgList, size, length ):
+    """
+    Yields the words of the messages in order with a " " between each
+    word.  The messages are treated as if they were joined by spaces.
+    """
 
-    while len ( words ) > 0:
+    firstWord = True
 
-        #Since the list is in reverse order pop is used to process the items
-        word = words.pop ()
+    for msg in msgList:
 
-        #if the word fits add it - special case for first word
-        if len ( currentTweet ) + len ( word ) < size or \
-           currentTweet == "":
+        start = 0
 
-            currentTweet += word
+        while start >= 0:
 
-        #not enough room for the word in current tweet
-        else:
+            end = msg.find ( ' ', start )
 
-            tweets.append ( currentTweet )
+            if end < 0:
 
-            currentTweet = word
+                word = msg [ start : ]
 
-        #last word in the list append the word so far
-        if len ( words ) == 0:
+                start = -1
 
-            tweets.append ( currentTweet )
+            else:
 
-    #remove any tweets that are just spaces
+                word = msg [ start : end ]
 
-    tweets = [ x for x in tweets if x.strip () != '' ]
+                start = end + 1
 
-    return tweets
+            if not firstWord:
 
+                yield " "
 
+            firstWord = False
+
+            #call chop_text just for the rare case that the word is too
+            #long for a single tweet
+            yield from chop_text ( word, size, length )
 
 #----------------------------------------------------------------------------
 
-def chop_text ( txt, n = 265 ):
+def chop_text ( txt, n = 265, length = len ):
 
     """
     Chops a string into a list of strings of n length.
+
+    length - function used to measure the text.  When it is not len the
+             text is chopped into pieces whose length is at most n.
     """
 
     assert ( n > 0 )
 
-    #thanks stack overflow...
+    if length is len:
+
+        #thanks stack overflow...
+
+        return [ txt [ i : i + n ] for i in range ( 0, len ( txt ), n ) ]
+
+    if length ( txt ) <= n:
+
+        return [ txt ] if len ( txt ) > 0 else []
+
+    chunks = []
+
+    start = 0
+    chunkLen = 0
 
-    return [ txt [ i : i + n ] for i in range ( 0, len ( txt ), n ) ]
+    for i, c in enumerate ( txt ):
+
+        charLen = length ( c )
+
+        if chunkLen + charLen > n and i > start:
+
+            chunks.append ( txt [ start : i ] )
+
+            start = i
+            chunkLen = 0
+
+        chunkLen += charLen
+
+    chunks.append ( txt [ start : ] )
+
+    return chunks
 
 #----------------------------------------------------------------------------
 
-class CursorIterWrapper:
+def response_headers ( source ):
+    """
+    Returns the headers of the last response received by a tweepy api
+    object or pooled session or None if there has not been a response.
+    """
 
-    def __init__ ( self, twitterConnection, cursor ):
+    response = getattr ( source, "last_response", None )
 
-        self.tc = twitterConnection
-        self.cursor = cursor
+    if response == None:
 
-    def __iter__ ( self ):
+        return None
 
-        return self
+    return response.headers
 
-    def __next__ ( self ):
+#----------------------------------------------------------------------------
 
-        api_call = lambda api=None: next ( self.cursor )
+def is_rate_limit_response ( response ):
+    """
+    Returns True if a response was refused because of a rate limit.
+    """
 
-        mention = None
+    return response != None and response.status_code in ( 420, 429 )
 
-        try:
+#----------------------------------------------------------------------------
 
-            mention = self.tc.call_twitter_api ( api_call )
-        
-        except StopIteration:
+def is_retryable_error ( error ):
+    """
+    Returns True if a TweepError may work if the call is made again i.e.
+    the request did not reach twitter or twitter had a server error.
+    """
 
-            raise StopIteration
+    return error.response == None or error.response.status_code >= 500
 
-        return mention
+#----------------------------------------------------------------------------
 
-    def first ( self ):
+def record_outcome ( span, endpoint, outcome ):
+    """
+    Records the outcome of an attempt to call the API.
+    """
 
-        try:
+    API_CALLS.labels ( endpoint, outcome ).inc ()
 
-            return self.__next__ ()
-        
-        except StopIteration:
+    span.set ( "outcome", outcome )
 
-            return None
+#----------------------------------------------------------------------------
 
+def record_rate_limit_sleep ( endpoint, wait ):
+
+    RATE_LIMIT_SLEEPS.labels ( endpoint ).inc ()
+    RATE_LIMIT_SLEEP_SECONDS.labels ( endpoint ).inc ( wait )
+
+#----------------------------------------------------------------------------
+
+def mention_batch ( statuses ):
+    """
+    Turns a page of tweepy statuses into a list of Mentions.
+    """
+
+    return [ Mention.from_status ( status ) for status in statuses ]
 
 #----------------------------------------------------------------------------
 
 class TwitterConnection:
 
+    def __init__ ( self, statePath = STATE_PATH, 
+                   seenMentionsSize = SEEN_MENTIONS_SIZE, keys = None ):
+        """
+        statePath        - file used to remember the mentions that have 
+                           been processed so the bot carries on where it
+                           stopped
+
+        seenMentionsSize - how many mention IDs are remembered so that a
+                           mention is never returned twice
+
+        keys             - dict of twitter keys.  Loaded from the keys
+                           file if not given.  An "api_url" entry sends
+                           the API calls to that URL instead of twitter
+                           e.g. to use fake_twitter.py
+        """
+
+        self.statePath = statePath
+        self.seenMentionsSize = seenMentionsSize
+        self.keys = keys
+
+    #------------------------------------------------------------------------
+
     def __enter__ ( self ):
 
-        keys = load_keys ()
+        self.state = StateStore ( self.statePath )
+
+        keys = self.keys if self.keys != None else load_keys ()
+
+        apiURL = keys.get ( "api_url" )
+
+        if apiURL != None:
+
+            logging.info ( "Using twitter API at %s", apiURL )
 
         auth = tweepy.OAuthHandler ( 
                 keys [ "consumer_key" ],
@@ -188,14 +355,52 @@ class TwitterConnection:
                 keys [ "access_token" ],
                 keys [ "access_token_secret" ] )
 
-        self._api = tweepy.API ( auth )
+        # Calls to each endpoint use their own keep-alive sessions so
+        # endpoints do not wait for each other
+        self._sessions = SessionPool ( ENDPOINT_CONCURRENCY, 
+                                       baseURL = apiURL )
+
+        self._api = PooledAPI ( tweepy.API ( auth ), self._sessions,
+                                POOLED_METHODS )
 
-        # Used to ensure only one thread accesses the api object at a time
-        self._apiLock = threading.Lock ()
+        # Calls left before each endpoint's rate limit resets
+        self.rateLimits = RateLimitBudget ()
+
+        # How failed calls are retried
+        self.retryPolicy = RetryPolicy ()
+
+        # endpoint -> CircuitBreaker
+        self._circuits = {}
+        self._circuitsLock = threading.Lock ()
 
         #the get_latest_mentions method will return status id's greater
-        #than this value
-        self.latestMention = self._init_latest_mention ()
+        #than this value.  Mentions that were fetched but not processed
+        #before the bot stopped are fetched again.
+
+        #IDs of the mentions returned by get_latest_mentions recently
+        self.seenMentions = SeenIDs ( self.seenMentionsSize,
+                                      self.state.get ( "seen_mentions", [] ) )
+
+        self.latestMention = self.state.get ( "processed_mention" )
+
+        if self.latestMention == None:
+
+            self.latestMention = self._init_latest_mention ()
+
+            self.mark_mentions_processed ()
+
+        logging.info ( "Checking mentions after %s", self.latestMention )
+
+        #newest mention fetched so far and where to carry on reading a
+        #backlog that was too long for one call
+        self._newestMention = self.latestMention
+        self._backlogMaxID = None
+
+        #chains left over from the last run are posted first
+        self.outbox = Outbox ( self.statePath, self._send_tweet, 
+                               lambda: self.retry_after ( UPDATE_ENDPOINT ) )
+
+        self.outbox.start ()
 
         return self
 
@@ -203,11 +408,39 @@ class TwitterConnection:
 
     def __exit__ ( self, *args ):
 
-        pass
+        self.outbox.close ()
+
+        self.state.close ()
+
+        self._sessions.close ()
+
+    #------------------------------------------------------------------------
+
+    def mark_mentions_processed ( self ):
+        """
+        Records that every mention returned by get_latest_mentions so far
+        has been handled.  After a restart mentions are checked from this
+        point so none are missed.
+        """
+
+        values = { "processed_mention" : self.latestMention,
+                   "latest_mention"    : self.latestMention }
+
+        #saved with the watermark so the mentions fetched again after a
+        #restart are recognised
+
+        if self.seenMentions.changed:
+
+            values [ "seen_mentions" ] = self.seenMentions.to_list ()
+
+            self.seenMentions.changed = False
+
+        self.state.update ( values )
 
     #------------------------------------------------------------------------
 
-    def call_twitter_api ( self, api_call ):
+    def call_twitter_api ( self, api_call, endpoint = None, 
+                           raiseRefused = False ):
         """
         This function is used to encapsulate calls to the twitter function
         so that logging and error handling can be contained in one place.
@@ -215,79 +448,295 @@ class TwitterConnection:
         api_call - lambda function that can be called with the _api object
                    as a parameter to execute the desired twitter call
 
-        sleep_time - how long the function should sleep after calling the
-                     twitter API
+        endpoint - name of the endpoint the call uses.  If the endpoint's
+                   rate limit has run out the call waits until it resets.
+
+        Calls that fail because of network or server errors are retried
+        with exponential backoff.  If an endpoint keeps failing its
+        circuit opens and calls to it return None straight away until a
+        test call succeeds.
 
-        The funcion will log a message and sleep if an error occurs. 
+        The funcion will log a message and return None if the call could
+        not be made.  If raiseRefused is True a request that twitter
+        refused e.g. a duplicate status raises its TweepError instead so
+        the caller knows trying again will not help.
+
+        The time taken and outcome of each attempt are recorded in the
+        API_CALLS and API_CALL_SECONDS metrics.  If the calling thread is
+        in a trace the call is traced as a twitter.call span.
         """
 
+        label = endpoint or "unknown"
+
+        with tracing.TRACER.span ( "twitter.call", root = False, 
+                                   endpoint = label ) as span:
+
+            return self._call_twitter_api ( api_call, endpoint, label, span,
+                                            raiseRefused )
+
+    #------------------------------------------------------------------------
+
+    def _call_twitter_api ( self, api_call, endpoint, label, span, 
+                            raiseRefused ):
+
         api_return = None
 
-        try:
+        breaker = self._circuit ( endpoint )
 
-            with self._apiLock:
+        for attempt in range ( self.retryPolicy.maxAttempts ):
 
-                api_return = api_call ( self._api )
+            span.set ( "attempts", attempt + 1 )
 
-        except tweepy.RateLimitError as e:
+            if not breaker.allow ():
 
-            logging.warning ( "Rate-limit Error:  %s", e )
+                logging.warning ( "Circuit for %s is open - call skipped", 
+                                  endpoint )
 
-            time.sleep ( TWEEP_RATE_ERROR_SLEEP )
+                record_outcome ( span, label, "circuit_open" )
 
-        #Most likely thrown during network error
-        except tweepy.TweepError as e:
+                return None
 
-            logging.warning ( "Tweepy Error: %s  ", e )
+            #wait for the rate limit before taking a session so calls to
+            #the endpoint that are allowed can carry on
 
-            time.sleep ( NETWORK_ERROR_SLEEP )
+            wait = self.rateLimits.delay ( endpoint )
 
-        except ( SSLError, Timeout, ConnectionError, NewConnectionError ):
+            if wait > 0:
 
-            logging.warning ( "Network Error:  ", exc_info=True )
+                logging.info ( "Rate limit for %s used up - waiting %ds",
+                               endpoint, wait )
 
-            time.sleep ( NETWORK_ERROR_SLEEP )
+                record_rate_limit_sleep ( label, wait )
 
-        #special case for tweepy cursor calls when no more items
-        except StopIteration:
+                span.set ( "rate_limit_wait", wait )
 
-            raise StopIteration
+                time.sleep ( wait )
 
-        except Exception:
-            
-            logging.critical ( "Unexpected Error during twitter API call:  ",
-                               exc_info=True )
+            try:
+
+                with self._sessions.session ( endpoint ) as session:
+
+                    start = time.perf_counter ()
+
+                    try:
+
+                        api_return = api_call ( self._api )
+
+                    finally:
+
+                        API_CALL_SECONDS.labels ( label ).observe ( 
+                                time.perf_counter () - start )
+
+                    self.rateLimits.update ( endpoint, 
+                                             response_headers ( session ) )
 
-            time.sleep ( UNEXPECTED_ERROR_SLEEP )
+            except tweepy.RateLimitError as e:
 
-        return api_return 
+                record_outcome ( span, label, "rate_limited" )
+
+                breaker.record_success ()
+
+                self._rate_limit_sleep ( endpoint, e )
+
+                return None
+
+            except tweepy.TweepError as e:
+
+                if is_rate_limit_response ( e.response ):
+
+                    record_outcome ( span, label, "rate_limited" )
+
+                    breaker.record_success ()
+
+                    self._rate_limit_sleep ( endpoint, e )
+
+                    return None
+
+                #twitter refused the request e.g. a duplicate status so
+                #there is no point retrying
+
+                if not is_retryable_error ( e ):
+
+                    record_outcome ( span, label, "refused" )
+
+                    breaker.record_success ()
+
+                    logging.warning ( "Tweepy Error: %s  ", e )
+
+                    if raiseRefused:
+
+                        raise
+
+                    return None
+
+                #Most likely thrown during network error
+                logging.warning ( "Tweepy Error: %s  ", e )
+
+            except ( SSLError, Timeout, ConnectionError, NewConnectionError ):
+
+                logging.warning ( "Network Error:  ", exc_info=True )
+
+            except Exception:
+                
+                logging.critical ( "Unexpected Error during twitter API "
+                                   "call:  ", exc_info=True )
+
+            else:
+
+                record_outcome ( span, label, "ok" )
+
+                breaker.record_success ()
+
+                return api_return
+
+            record_outcome ( span, label, "error" )
+
+            breaker.record_failure ()
+
+            if attempt + 1 < self.retryPolicy.maxAttempts:
+
+                time.sleep ( self.retryPolicy.delay ( attempt ) )
+
+        logging.warning ( "Giving up on call to %s", endpoint )
+
+        return None
+
+    #------------------------------------------------------------------------
+
+    def healthy ( self ):
+        """
+        Returns False while the circuit of any endpoint is open i.e. calls
+        to twitter keep failing.
+        """
+
+        with self._circuitsLock:
+
+            circuits = list ( self._circuits.values () )
+
+        return all ( c.state != CircuitBreaker.OPEN for c in circuits )
+
+    #------------------------------------------------------------------------
+
+    def _circuit ( self, endpoint ):
+        """
+        Returns the circuit breaker for an endpoint.
+        """
+
+        with self._circuitsLock:
+
+            breaker = self._circuits.get ( endpoint )
+
+            if breaker == None:
+
+                breaker = CircuitBreaker ( endpoint )
+
+                self._circuits [ endpoint ] = breaker
+
+            return breaker
+
+    #------------------------------------------------------------------------
+
+    def retry_after ( self, endpoint ):
+        """
+        Returns how long to wait before trying an endpoint again after a
+        call to it returned None.
+        """
+
+        return max ( self._circuit ( endpoint ).retry_after (), 
+                     self.retryPolicy.baseDelay )
+
+    #------------------------------------------------------------------------
+
+    def _rate_limit_sleep ( self, endpoint, error ):
+        """
+        Sleeps until the endpoint's rate limit resets after a call was
+        refused.
+        """
+
+        response = error.response
+
+        headers = response.headers if response != None else None
+
+        retryAfter = None
+
+        if headers != None and headers.get ( "retry-after" ) != None:
+
+            retryAfter = float ( headers [ "retry-after" ] )
+
+        reset = self.rateLimits.exhausted ( endpoint, headers, retryAfter )
+
+        if reset == None:
+
+            wait = TWEEP_RATE_ERROR_SLEEP
+
+        else:
+
+            wait = max ( 0, self.rateLimits.delay ( endpoint ) )
+
+        logging.warning ( "Rate-limit Error: %s - waiting %ds", error, wait )
+
+        record_rate_limit_sleep ( endpoint or "unknown", wait )
+
+        time.sleep ( wait )
+
+    #------------------------------------------------------------------------
+
+    def post_message_chain ( self, msgList, replyID = None, thread = None,
+                             follow = False, trace = None ):
+        """
+        Packs the messages into tweets and queues them to be posted as a
+        chain by the outbox's sender thread.
+
+        See Outbox.put for the parameters.  Returns a Future that gives the
+        list of status IDs posted.
+        """
+
+        with tracing.TRACER.span ( "pack_messages", trace, 
+                                   root = False ) as span:
+
+            packedMsgList = pack_messages ( msgList, TWEET_PACK_SIZE,
+                                            twitter_text.weighted_length )
+
+            span.set ( "tweets", len ( packedMsgList ) )
+
+        return self.outbox.put ( packedMsgList, replyID, thread, follow, 
+                                 trace )
 
     #------------------------------------------------------------------------
 
     def send_message_chain ( self, msgList, replyID = None ):
+        """
+        Posts the messages as a chain of tweets and returns the list of
+        status IDs once the chain has been posted.
+        """
 
-        msgIDs = []
+        return self.post_message_chain ( msgList, replyID ).result ()
 
-        packedMsgList = pack_messages ( msgList )
+    #------------------------------------------------------------------------
 
-        for msg in packedMsgList:
+    def _send_tweet ( self, text, replyID ):
+        """
+        Posts a single tweet for the outbox.  Returns the status ID or None 
+        if it could not be posted.  Raises TweetRefused if twitter refused
+        the tweet.
+        """
 
-            status = None
+        api_call = lambda api:  api.update_status ( text, replyID )
 
-            logging.info ( "Sending Message: "+msg )
+        try:
 
-            #Use a loop to send message in order to retry on rate limit
-            while status == None:
+            status = self.call_twitter_api ( api_call, UPDATE_ENDPOINT,
+                                             raiseRefused = True )
 
-                api_call = lambda api:  api.update_status ( msg, replyID )
+        except tweepy.TweepError as e:
 
-                status = self.call_twitter_api ( api_call )
+            raise TweetRefused ( str ( e ) )
 
-            replyID = status.id
+        if status == None:
 
-            msgIDs.append ( replyID )
+            return None
 
-        return msgIDs
+        return status.id
 
     #------------------------------------------------------------------------
 
@@ -299,76 +748,106 @@ class TwitterConnection:
         occurred before the system started.
         """
 
-        #get an iterator for all mentions using tweepy.Cursor
+        api_call = lambda api: api.mentions_timeline ( count = 1 )
 
-        api_call = lambda api: tweepy.Cursor ( 
-                api.mentions_timeline,
-                since_id  = None 
-            ).items ()
+        mentions = self.call_twitter_api ( api_call, MENTIONS_ENDPOINT )
 
-        cursor = self.call_twitter_api ( api_call )
-
-        wrappedIterator = CursorIterWrapper ( self, cursor )
-
-        #try and get the id of the first item in the mentions iterator
-
-        latestMention = wrappedIterator.first ()
-
-        if latestMention is None:
+        if mentions == None or len ( mentions ) == 0:
 
             return 0
 
         else:
             
-            return latestMention.id
+            return mentions [ 0 ].id
             
-
     #------------------------------------------------------------------------
 
     def get_latest_mentions ( self ):
         """
-        This function is run by a thread in order to periodically check
-        twitter for mentions.
+        Returns the mentions posted since the last call as a list of
+        Mentions with newest first.
 
-        The mentions will be put on a queue so that they can be checked
-        using get_latest_mentions
+        Mentions are fetched a page at a time.  At most MAX_MENTION_PAGES
+        are fetched in one call so a large backlog is returned over several
+        calls instead of holding up the caller.  latestMention only moves
+        forward once the backlog has been read so no mentions are skipped.
         """
 
         logging.info ( "Checking mentions." )
 
+        with tracing.TRACER.span ( "get_latest_mentions", 
+                                   root = False ) as span:
+
+            returnList = self._get_latest_mentions ()
+
+            span.set ( "mentions", len ( returnList ) )
+
+        return returnList
+
+    #------------------------------------------------------------------------
+
+    def _get_latest_mentions ( self ):
+
         returnList = []
 
-        api_call = lambda api: tweepy.Cursor ( 
-                api.mentions_timeline,
-                since_id  = self.latestMention 
-            ).items ()
+        #older pages are fetched by asking for mentions up to max_id
+        maxID = self._backlogMaxID
+
+        for page in range ( MAX_MENTION_PAGES ):
+
+            params = { "count" : MENTION_PAGE_SIZE }
+
+            #nothing has been seen on a fresh start
+            if self.latestMention:
 
-        cursor = self.call_twitter_api ( api_call )
+                params [ "since_id" ] = self.latestMention
 
-        wrappedIterator = CursorIterWrapper ( self, cursor )
+            if maxID != None:
 
-        for mention in wrappedIterator:
+                params [ "max_id" ] = maxID
 
-            #API return can be None if there is a connection error
-            if mention is None:
+            api_call = lambda api: api.mentions_timeline ( **params )
+
+            mentions = self.call_twitter_api ( api_call, MENTIONS_ENDPOINT )
+
+            #API return can be None if there is a connection error - the
+            #rest of the mentions are fetched on the next call
+            if mentions == None:
 
                 break
 
-            #update the latestMention field
+            if len ( mentions ) == 0:
 
-            if mention.id > self.latestMention:
+                maxID = None
 
-                self.latestMention = mention.id
+                break
 
-            #Create a dict containing only the desired data
-            mentionData = \
-                {
-                    "text"     : mention.text,
-                    "id"       : mention.id,
-                    "username" : mention.user.screen_name
-                }
+            #drop mentions that were returned before e.g. a page fetched
+            #again after a restart
+            returnList.extend ( m for m in mention_batch ( mentions )
+                                if self.seenMentions.add ( m.id ) )
 
-            returnList.append ( mentionData )
+            self._newestMention = max ( self._newestMention, mentions [ 0 ].id )
 
-        return returnList
+            maxID = mentions [ -1 ].id - 1
+
+            #a short page is the last one so there is no need to ask for
+            #an empty page to find the end
+            if len ( mentions ) < MENTION_PAGE_SIZE:
+
+                maxID = None
+
+                break
 
+        self._backlogMaxID = maxID
+
+        if maxID != None:
+
+            logging.info ( "Mention backlog - continuing before %d", maxID )
+
+        else:
+
+            self.latestMention = max ( self.latestMention, 
+                                       self._newestMention )
+
+        return returnList
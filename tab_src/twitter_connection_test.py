@@ -4,6 +4,8 @@
 # Unit tests for the twitter connection.
 #############################################################################
 
+import twitter_text, twitter_connection
+
 from twitter_connection import *
 
 def test_chop_text ():
@@ -101,6 +103,30 @@ def test_pack_messages ():
             "txt" : [ "abc.  def" ],
             "out" : [ "abc.", "def"],
             "n"   : 4
+        },
+
+        {
+            "txt" : [ "abc ", " def" ],
+            "out" : [ "abc   def" ],
+            "n"   : 45
+        },
+
+        {
+            "txt" : [ "abcdefgh ij" ],
+            "out" : [ "abcd", "efgh", " ij" ],
+            "n"   : 4
+        },
+
+        {
+            "txt" : [ "ab\n", "cd" ],
+            "out" : [ "ab\n", " cd" ],
+            "n"   : 4
+        },
+
+        {
+            "txt" : [ "", "" ],
+            "out" : [],
+            "n"   : 4
         }
 
     ]
@@ -115,3 +141,166 @@ def test_pack_messages ():
 
             assert ( out [ i ] == tc [ "out" ] [ i ] ), ( tc, out )
 
+
+#----------------------------------------------------------------------------
+
+def test_iter_pack_messages_is_lazy ():
+
+    #a generator of messages is only read as far as the first tweet needs
+
+    def messages ():
+
+        yield "abc def"
+
+        raise AssertionError ( "read too far" )
+
+    tweets = iter_pack_messages ( messages (), 4 )
+
+    assert ( next ( tweets ) == "abc" )
+
+#----------------------------------------------------------------------------
+
+def test_pack_messages_weighted ():
+
+    testCases = \
+    [
+        {
+            "txt" : [ "日本 日本" ],
+            "out" : [ "日本 ", "日本" ],
+            "n"   : 6
+        },
+
+        {
+            "txt" : [ "日本日本" ],
+            "out" : [ "日本", "日本" ],
+            "n"   : 5
+        },
+
+        {
+            "txt" : [ "ab cd" ],
+            "out" : [ "ab cd" ],
+            "n"   : 6
+        }
+    ]
+
+    for tc in testCases:
+
+        out = pack_messages ( tc [ "txt" ], tc [ "n" ], 
+                              twitter_text.weighted_length )
+
+        assert ( out == tc [ "out" ] ), ( tc, out )
+
+#----------------------------------------------------------------------------
+
+class FakeStatus:
+
+    def __init__ ( self, statusID ):
+
+        self.id = statusID
+        self.text = "@bot look"
+        self.in_reply_to_status_id = None
+
+        self.user = FakeUser ()
+
+class FakeUser:
+
+    screen_name = "player"
+
+class FakeMentionsAPI:
+    """
+    Mentions timeline with ids 1 to n that records the calls made.
+    """
+
+    def __init__ ( self, n ):
+
+        self.statuses = [ FakeStatus ( i ) for i in range ( n, 0, -1 ) ]
+
+        self.calls = 0
+
+        #since_id of each call
+        self.sinceIDs = []
+
+    def mentions_timeline ( self, since_id = None, max_id = None, 
+                            count = 20 ):
+
+        self.calls += 1
+
+        self.sinceIDs.append ( since_id )
+
+        page = [ s for s in self.statuses 
+                 if ( since_id == None or s.id > since_id ) and 
+                    ( max_id == None or s.id <= max_id ) ]
+
+        return page [ : count ]
+
+def fake_connection ( api ):
+
+    tc = TwitterConnection ()
+
+    tc.latestMention = 0
+    tc._newestMention = 0
+    tc._backlogMaxID = None
+
+    tc.seenMentions = SeenIDs ()
+
+    tc.call_twitter_api = lambda api_call, endpoint = None: api_call ( api )
+
+    return tc
+
+#----------------------------------------------------------------------------
+
+def test_get_latest_mentions_pages ( monkeypatch ):
+
+    monkeypatch.setattr ( twitter_connection, "MENTION_PAGE_SIZE", 2 )
+    monkeypatch.setattr ( twitter_connection, "MAX_MENTION_PAGES", 2 )
+
+    api = FakeMentionsAPI ( 5 )
+
+    tc = fake_connection ( api )
+
+    #the backlog is longer than two pages so it is read over two calls
+    #and the latest mention does not move until it has all been read
+
+    ids = [ m.id for m in tc.get_latest_mentions () ]
+
+    assert ( ids == [ 5, 4, 3, 2 ] )
+    assert ( tc.latestMention == 0 )
+
+    ids = [ m.id for m in tc.get_latest_mentions () ]
+
+    assert ( ids == [ 1 ] )
+    assert ( tc.latestMention == 5 )
+
+    #the short page ends the backlog without asking for an empty page
+    assert ( api.calls == 3 )
+
+    #nothing had been seen so since_id was left out
+    assert ( api.sinceIDs == [ None, None, None ] )
+
+    assert ( tc.get_latest_mentions () == [] )
+
+    api.statuses.insert ( 0, FakeStatus ( 6 ) )
+
+    mentions = tc.get_latest_mentions ()
+
+    assert ( mentions == [ Mention ( "@bot look", 6, "player" ) ] )
+
+    assert ( tc.latestMention == 6 )
+
+#----------------------------------------------------------------------------
+
+def test_get_latest_mentions_dedup ():
+
+    api = FakeMentionsAPI ( 3 )
+
+    tc = fake_connection ( api )
+
+    assert ( len ( tc.get_latest_mentions () ) == 3 )
+
+    #as if the watermark was lost - the same mentions are not returned
+    tc.latestMention = 0
+    tc._newestMention = 0
+
+    api.statuses.insert ( 0, FakeStatus ( 4 ) )
+
+    assert ( [ m.id for m in tc.get_latest_mentions () ] == [ 4 ] )
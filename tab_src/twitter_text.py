@@ -0,0 +1,151 @@
+#############################################################################
+# twitter_text.py
+#----------------------------------------------------------------------------
+# Counts the length of a tweet the way Twitter does.
+#############################################################################
+
+import re, unicodedata
+
+#----------------------------------------------------------------------------
+
+#Values from the twitter-text v3 configuration.  Lengths are measured in
+#weighted units where most latin characters count as one unit and other
+#characters e.g. CJK and emoji count as two.
+
+MAX_WEIGHTED_TWEET_LENGTH = 280
+
+SCALE = 100
+
+DEFAULT_WEIGHT = 200
+
+#( first code point, last code point, weight )
+WEIGHTED_RANGES = \
+[
+    ( 0,    4351, 100 ),
+    ( 8192, 8205, 100 ),
+    ( 8208, 8223, 100 ),
+    ( 8242, 8247, 100 )
+]
+
+#Every URL counts as this length whatever its real length
+TRANSFORMED_URL_LENGTH = 23
+
+#----------------------------------------------------------------------------
+
+#Anything that looks like a link.  This matches more than twitter-text
+#does e.g. 'north.You' so url_weight decides how each match is counted.
+URL_REGEX = re.compile ( r"(?i)(?:[a-z][\w+.-]*://)?(?:[\w-]+\.)+[a-z]{2,}"
+                         r"(?:[/?#:][^\s]*)?" )
+
+#Links with these schemes are always shortened by Twitter
+URL_SCHEME_REGEX = re.compile ( r"(?i)https?://" )
+
+#Generic top level domains from the twitter-text list.  A link to one of
+#these domains is shortened even without a scheme.
+GENERIC_TLDS = frozenset ( [ "com", "net", "org", "edu", "gov", "mil", 
+                             "aero", "asia", "biz", "cat", "coop", "info", 
+                             "int", "jobs", "mobi", "museum", "name", 
+                             "post", "pro", "tel", "travel", "xxx" ] )
+
+NON_ASCII_REGEX = re.compile ( r"[^\x00-\x7f]" )
+
+#----------------------------------------------------------------------------
+
+def char_weight ( c ):
+    """
+    Returns the weighted length of a single character.
+    """
+
+    point = ord ( c )
+
+    for first, last, weight in WEIGHTED_RANGES:
+
+        if first <= point <= last:
+
+            return weight // SCALE
+
+    return DEFAULT_WEIGHT // SCALE
+
+#----------------------------------------------------------------------------
+
+def _text_weight ( text ):
+    """
+    Weighted length of text ignoring URLs.
+    """
+
+    if NON_ASCII_REGEX.search ( text ) == None:
+
+        return len ( text )
+
+    return sum ( char_weight ( c ) for c in text )
+
+#----------------------------------------------------------------------------
+
+def is_url ( token ):
+    """
+    Returns True if Twitter is sure to shorten the token to a link i.e.
+    it has an http scheme or a generic top level domain.
+    """
+
+    if URL_SCHEME_REGEX.match ( token ):
+
+        return True
+
+    if "://" in token:
+
+        return False
+
+    host = re.split ( r"[/?#:]", token, 1 ) [ 0 ]
+
+    return host.rsplit ( ".", 1 ) [ -1 ].lower () in GENERIC_TLDS
+
+#----------------------------------------------------------------------------
+
+def url_weight ( token ):
+    """
+    Returns the length to count for a token that looks like a link.
+
+    Links Twitter is sure to shorten count as TRANSFORMED_URL_LENGTH.
+    Other tokens e.g. a word ending in '.zz' or a country domain may or
+    may not be shortened so they count as whichever is longer, the link
+    length or the token itself.  The count is never less than Twitter's
+    so long tokens are still split by chop_text.
+    """
+
+    if is_url ( token ):
+
+        return TRANSFORMED_URL_LENGTH
+
+    return max ( TRANSFORMED_URL_LENGTH, _text_weight ( token ) )
+
+#----------------------------------------------------------------------------
+
+def weighted_length ( text ):
+    """
+    Returns the length Twitter counts for a piece of text.
+
+    Plain ASCII without anything that could be a URL is counted with
+    len.  Emoji made of several code points are counted per code point
+    so they may be counted as longer than Twitter would count them.
+    """
+
+    #fast path - the usual case for game output
+
+    if "." not in text and ":" not in text and \
+       NON_ASCII_REGEX.search ( text ) == None:
+
+        return len ( text )
+
+    text = unicodedata.normalize ( "NFC", text )
+
+    length = 0
+    start = 0
+
+    for match in URL_REGEX.finditer ( text ):
+
+        length += _text_weight ( text [ start : match.start () ] )
+        length += url_weight ( match.group () )
+
+        start = match.end ()
+
+    return length + _text_weight ( text [ start : ] )
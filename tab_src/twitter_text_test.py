@@ -0,0 +1,52 @@
+#############################################################################
+# twitter_text_test.py
+#----------------------------------------------------------------------------
+# Unit tests for counting tweet lengths.
+#############################################################################
+
+from twitter_text import *
+from twitter_connection import pack_messages
+
+def test_weighted_length ():
+
+    testCases = \
+    [
+        { "txt" : "",                                   "out" : 0  },
+        { "txt" : "You are in a maze.",                 "out" : 18 },
+        { "txt" : "café",                          "out" : 4  },
+        { "txt" : "café",                         "out" : 4  },
+        { "txt" : "日本",                       "out" : 4  },
+        { "txt" : "\U0001f600",                         "out" : 2  },
+        { "txt" : "a — b",                         "out" : 5  },
+        { "txt" : "see http://www.goshdarngames.com",   "out" : 27 },
+        { "txt" : "see goshdarngames.com now",          "out" : 31 },
+        { "txt" : "e.g. the end.",                      "out" : 13 },
+        { "txt" : "supercalifragilisticexpialidocious.zz",
+                                                        "out" : 37 },
+        { "txt" : "see http://" + "a" * 40 + ".zz",      "out" : 27 },
+        { "txt" : "north.You",                          "out" : 23 },
+    ]
+
+    for tc in testCases:
+
+        out = weighted_length ( tc [ "txt" ] )
+
+        assert ( out == tc [ "out" ] ), ( tc, out )
+
+#----------------------------------------------------------------------------
+
+def test_long_token_is_split ():
+
+    #a long word that only looks like a link is not counted as one so it
+    #is split across tweets
+
+    text = "x " * 10 + "a" * 300 + ".zz"
+
+    packed = pack_messages ( [ text ], 280, weighted_length )
+
+    assert ( len ( packed ) > 1 )
+
+    for tweet in packed:
+
+        assert ( weighted_length ( tweet ) <= 280 ), tweet
+        assert ( len ( tweet ) <= 280 ), tweet
@@ -0,0 +1,94 @@
+#############################################################################
+# user_throttle.py
+#----------------------------------------------------------------------------
+# Limits how often each player can send mentions to the bot.
+#############################################################################
+
+import time
+
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------
+
+#Mentions a player can send in a burst
+THROTTLE_BURST = 5
+
+#Mentions per second added back to each player's allowance
+THROTTLE_RATE = 1 / 20
+
+#How many players are tracked.  The player who sent a mention longest ago
+#is forgotten first.
+MAX_THROTTLED_USERS = 10000
+
+#----------------------------------------------------------------------------
+
+class UserThrottle:
+    """
+    Token bucket for each player.  A player's bucket holds up to burst
+    tokens and refills at rate tokens per second.  Each mention uses a
+    token and mentions sent when the bucket is empty are dropped.
+
+    Buckets are kept in least recently used order so memory stays fixed
+    and checking a mention takes the same time however many players
+    there are.  A player who is forgotten starts again with a full bucket
+    which is what they would have had after being idle.
+    """
+
+    def __init__ ( self, burst = THROTTLE_BURST, rate = THROTTLE_RATE,
+                   maxUsers = MAX_THROTTLED_USERS, clock = time.monotonic ):
+
+        assert burst >= 1 and maxUsers > 0
+
+        self.burst = burst
+        self.rate = rate
+        self.maxUsers = maxUsers
+
+        self._clock = clock
+
+        #username -> [ tokens, time of last refill ]
+        self._buckets = OrderedDict ()
+
+    #------------------------------------------------------------------------
+
+    def allow ( self, username ):
+        """
+        Returns True if the player's mention should be handled and uses up
+        one of their tokens.
+        """
+
+        now = self._clock ()
+
+        bucket = self._buckets.get ( username )
+
+        if bucket == None:
+
+            if len ( self._buckets ) >= self.maxUsers:
+
+                self._buckets.popitem ( last = False )
+
+            bucket = [ self.burst, now ]
+
+            self._buckets [ username ] = bucket
+
+        else:
+
+            self._buckets.move_to_end ( username )
+
+            tokens, last = bucket
+
+            bucket [ 0 ] = min ( self.burst, tokens + ( now - last ) * self.rate )
+            bucket [ 1 ] = now
+
+        if bucket [ 0 ] < 1:
+
+            return False
+
+        bucket [ 0 ] -= 1
+
+        return True
+
+    #------------------------------------------------------------------------
+
+    def __len__ ( self ):
+
+        return len ( self._buckets )
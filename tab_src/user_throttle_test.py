@@ -0,0 +1,52 @@
+#############################################################################
+# user_throttle_test.py
+#----------------------------------------------------------------------------
+# Unit tests for the per player throttle.
+#############################################################################
+
+from user_throttle import *
+
+def test_user_throttle ():
+
+    now = [ 0 ]
+
+    throttle = UserThrottle ( burst = 2, rate = 0.5, 
+                              clock = lambda: now [ 0 ] )
+
+    testCases = \
+    [
+        { "time" : 0, "user" : "a", "out" : True  },
+        { "time" : 0, "user" : "a", "out" : True  },
+        { "time" : 0, "user" : "a", "out" : False },
+        { "time" : 0, "user" : "b", "out" : True  },
+        { "time" : 1, "user" : "a", "out" : False },
+        { "time" : 2, "user" : "a", "out" : True  },
+        { "time" : 2, "user" : "a", "out" : False },
+        { "time" : 9, "user" : "a", "out" : True  },
+        { "time" : 9, "user" : "a", "out" : True  },
+        { "time" : 9, "user" : "a", "out" : False }
+    ]
+
+    for tc in testCases:
+
+        now [ 0 ] = tc [ "time" ]
+
+        assert ( throttle.allow ( tc [ "user" ] ) == tc [ "out" ] ), tc
+
+#----------------------------------------------------------------------------
+
+def test_user_throttle_evicts ():
+
+    throttle = UserThrottle ( burst = 1, rate = 0, maxUsers = 2,
+                              clock = lambda: 0 )
+
+    assert ( throttle.allow ( "a" ) )
+    assert ( throttle.allow ( "b" ) )
+    assert ( not throttle.allow ( "a" ) )
+
+    #b was seen longest ago so it is forgotten
+    assert ( throttle.allow ( "c" ) )
+    assert ( len ( throttle ) == 2 )
+
+    assert ( not throttle.allow ( "a" ) )
+    assert ( throttle.allow ( "b" ) )